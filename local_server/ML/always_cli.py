@@ -1,37 +1,58 @@
+import time
+STARTED = time.perf_counter()  # --startup-profile times are from here, so they include the imports below
 import os
 import sys
-import time
 import struct
 import argparse
 import numpy as np
-import pandas as pd
-import tensorflow as tf
-from collections import deque
-from typing import NamedTuple
-from datetime import datetime
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
 import signal
-import errno
+import select
+import selectors
+import threading
+from packet_ring import PacketRing, copy_headers, PAYLOAD_SIZE
+from featurizer import Featurizer
+from feature_transform import load_feature_transform, transform_path_for
+from latency import DEFAULT_BUCKETS
+from numpy_model import load_numpy_model, numpy_model_path_for, NUMPY_MODEL_SUFFIX
+from tflite_model import load_tflite_model, tflite_model_path_for, TFLITE_MODEL_SUFFIX
+from batcher import MicroBatcher, MAX_BATCH_DELAY, MAX_BATCH_SIZE
+from pipe_endpoints import InputPipe, OutputPipe
+from pipeline import Stage, StageQueue, StageCounters, DROP_POLICIES, print_pipeline_report
+from workers import WorkerPool
+from verdict_cache import VerdictCache, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+from emission import VerdictFilter, SETTINGS_PATH, DEFAULT_SAMPLE_RATE
+from flow_table import FlowTable, FlowFeaturizer, DEFAULT_MAX_FLOWS, DEFAULT_IDLE_TIMEOUT
+from shm_ring import SharedPacketRing, RING_PATH
+from pipeline_stats import StatsWriter, SequenceTracker, STATS_DIR
+from model_swap import ModelSwapper
+from startup import StartupProfile, BackgroundLoad, FIRST_VERDICT, FIRST_VERDICT_TARGET
 
 INPUT_PIPE_NAME = "/shared/packet_log_pipe"
 OUTPUT_PIPE_NAME = "/shared/analysis_pipe"
-BATCH_SIZE = 100
-MAX_WAIT_TIME = 30
+TRANSPORTS = ("auto", "fifo", "shm")
 RECONNECT_DELAY = 0.1
-ERROR_CHECK_INTERVAL = 0.01
-MAX_EMPTY_READS = 500
 CONNECTION_TIMEOUT = 5.0
+RING_CAPACITY = 4096
+LATENCY_REPORT_INTERVAL = 60.0
+QUEUE_DEPTH = 8  # batches waiting between two stages
+DEFAULT_DROP_POLICY = "block"
+OUTPUT_POLL_INTERVAL = 0.01
+STAGE_JOIN_TIMEOUT = 1.0
+STARTUP_POLL_INTERVAL = 0.01  # how often the analyzer looks whether the model has loaded
+VERBOSE = False  # print every verdict, set by --verbose
+VERDICT_FILTER = None  # emission.VerdictFilter unless --emit-all
+STARTUP_PROFILE = None  # startup.StartupProfile with --startup-profile
 
 # Binary format for output: src_ip (4 bytes) + dest_ip (4 bytes) + confidence (4 bytes float)
 OUTPUT_FORMAT = "=4s4sf"
+OUTPUT_RECORD_SIZE = struct.calcsize(OUTPUT_FORMAT)
+VERDICT_DTYPE = np.dtype([
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("confidence", "=f4"),
+])
 
-class PacketData(NamedTuple):
-    timestamp: int
-    source_ip: bytes
-    dest_ip: bytes
-    packet_size: int
-    protocol: int
-    data: bytes
+assert VERDICT_DTYPE.itemsize == OUTPUT_RECORD_SIZE
 
 def cleanup():
     try:
@@ -46,58 +67,10 @@ def signal_handler(sig, frame):
     cleanup()
     sys.exit(0)
 
-def read_packet(pipe_fd):
-    fmt = "=L4s4sHB1500s"
-    packet_size = struct.calcsize(fmt)
-
-    try:
-        raw_data = os.read(pipe_fd, packet_size)
-        if not raw_data:
-            return None
-
-        unpacked = struct.unpack(fmt, raw_data)
-
-        return PacketData(
-            timestamp=unpacked[0],
-            source_ip=unpacked[1],
-            dest_ip=unpacked[2],
-            packet_size=unpacked[3],
-            protocol=unpacked[4],
-            data=unpacked[5]
-        )
-    except BlockingIOError:
-        return None
-    except OSError as e:
-        if e.errno in (errno.EINTR, errno.EAGAIN):
-            return None
-        raise
-    except Exception as e:
-        print(f"Error reading packet: {e}")
-        return None
-
-def wait_for_pipe(pipe_name, timeout=MAX_WAIT_TIME):
-    start_time = time.time()
-    while not os.path.exists(pipe_name):
-        if time.time() - start_time > timeout:
-            return False
-        time.sleep(RECONNECT_DELAY)
-    return True
-
-def connect_to_pipe(pipe_name, mode, retries=3):
-    for attempt in range(retries):
-        try:
-            if not wait_for_pipe(pipe_name):
-                print(f"Timeout waiting for {pipe_name}")
-                return None
-
-            fd = os.open(pipe_name, mode)
-            return fd
-        except Exception as e:
-            print(f"Connection attempt {attempt + 1} failed: {e}")
-            if attempt < retries - 1:
-                time.sleep(RECONNECT_DELAY)
-            continue
-    return None
+def startup_step(step):
+    """Note that startup got to step, for --startup-profile."""
+    if STARTUP_PROFILE is not None:
+        STARTUP_PROFILE.mark(step)
 
 def create_output_pipe():
     try:
@@ -108,55 +81,69 @@ def create_output_pipe():
         print(f"Error creating output pipe: {e}")
         return False
 
-def write_packet_data(output_fd, source_ip, dest_ip, confidence):
+def print_verdicts(verdicts):
+    for verdict in verdicts:
+        print("Confidence in Write packet: ", verdict["confidence"])
+
+def write_verdict_records(output, data):
+    """
+    Queue packed verdict records on the output pipe, keeping only those at
+    or above the mlCaution threshold. With --verbose, every verdict is printed.
+    """
     try:
-        print("Confidence in Write packet: ", confidence)
-        binary_data = struct.pack(OUTPUT_FORMAT, source_ip, dest_ip, float(confidence))
-        bytes_written = os.write(output_fd, binary_data)
-        return bytes_written > 0
-    except BlockingIOError:
-        time.sleep(ERROR_CHECK_INTERVAL)
-        return False
-    except OSError as e:
-        if e.errno in (errno.EINTR, errno.EAGAIN):
-            time.sleep(ERROR_CHECK_INTERVAL)
-            return False
-        raise
+        startup_step(FIRST_VERDICT)
+        if VERBOSE:
+            print_verdicts(np.frombuffer(data, dtype=VERDICT_DTYPE))
+        if VERDICT_FILTER is not None:
+            verdicts = VERDICT_FILTER.apply(np.frombuffer(data, dtype=VERDICT_DTYPE))
+            if not len(verdicts):
+                return True
+            data = verdicts.tobytes()
+        # Drops while the reader is away are counted by the pipe and reported periodically
+        return output.write(data)
     except Exception as e:
         print(f"Error writing to output pipe: {e}")
         return False
 
+# Reference implementation of the feature pipeline. The live path uses
+# featurizer.Featurizer, which must produce the same matrix.
 def packet_to_dataframe(packets):
+    import pandas as pd
+
     rows = []
     for packet in packets:
-        src_ip = '.'.join(str(b) for b in packet.source_ip)
-        dst_ip = '.'.join(str(b) for b in packet.dest_ip)
+        src_ip = '.'.join(str(b) for b in packet['source_ip'])
+        dst_ip = '.'.join(str(b) for b in packet['dest_ip'])
+        packet_size = int(packet['packet_size'])
 
         row = [
-            packet.timestamp,
+            int(packet['timestamp']),
             None,
             src_ip,
             None,
             dst_ip,
             None,
-            packet.protocol,
+            int(packet['protocol']),
             None,
-            packet.packet_size,
-            packet.packet_size,
-            len(packet.data),
+            packet_size,
+            packet_size,
+            PAYLOAD_SIZE,
             "UNKNOWN",
             None,
             None,
-            packet.packet_size / 1500.0,
+            packet_size / 1500.0,
             None,
-            packet.packet_size,
-            packet.packet_size
+            packet_size,
+            packet_size
         ]
         rows.append(row)
 
     return pd.DataFrame(rows)
 
 def preprocess_data(data):
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
     categorical_columns = [6, 11]
     numerical_columns = [8, 9, 10, 14, 16, 17]
 
@@ -201,114 +188,755 @@ def preprocess_data(data):
     return processed_data
 
 def load_model(model_path):
+    import tensorflow as tf
+    startup_step("tensorflow imported")
     return tf.keras.models.load_model(model_path)
 
-def process_batch(model, packet_buffer, output_fd):
-    try:
-        data = packet_to_dataframe(packet_buffer)
-        preprocessed_data = preprocess_data(data)
-        predictions = model.predict(preprocessed_data, verbose=0)
+def engine_path(args):
+    """The file load_engine() loads the model from."""
+    if args.runtime == "numpy":
+        return args.numpy_model or numpy_model_path_for(args.model)
+    if args.runtime == "int8":
+        return args.int8_model or tflite_model_path_for(args.model)
+    return args.model
+
+def load_engine(args, model_path=None):
+    model_path = model_path or engine_path(args)
+    if args.runtime == "numpy":
+        return load_numpy_model(model_path, DEFAULT_BUCKETS)
+    if args.runtime == "int8":
+        return load_tflite_model(model_path, DEFAULT_BUCKETS)
+
+    from inference import InferenceEngine
+    model = load_model(model_path)
+    return InferenceEngine(model, model.input_shape[-1], DEFAULT_BUCKETS, jit_compile=args.jit)
+
+def load_transform(transform_path):
+    if not os.path.exists(transform_path):
+        print(f"No feature transform at {transform_path}, falling back to per-batch scaling")
+        return None
+    return load_feature_transform(transform_path)
+
+def load_scoring(args):
+    """
+    Load the model and its transform, warm up inference and, with --model-dir,
+    set up the ModelSwapper. Returns (engine, transform, models).
+    """
+    print(f"Loading model ({args.runtime} runtime)...")
+    engine = load_engine(args)
+    transform = load_transform(args.transform or transform_path_for(args.model))
+    startup_step("model loaded")
+
+    print(f"Warmed up inference for batch buckets {engine.buckets} in {engine.warm_up():.2f} s")
+    startup_step("warmed up")
 
-        confidences = predictions.squeeze()
-        confidences = np.clip(confidences, 0, 1)
+    models = None
+    if args.model_dir:
+        suffix = {"numpy": NUMPY_MODEL_SUFFIX, "int8": TFLITE_MODEL_SUFFIX}.get(args.runtime, ".keras")
+        budget = args.latency_budget_ms / 1000 if args.latency_budget_ms is not None else None
+        models = ModelSwapper(args.model_dir, suffix, lambda path: load_engine(args, path),
+                              lambda path: load_transform(transform_path_for(path)),
+                              engine, transform, engine_path(args), budget)
+        print(f"Watching {args.model_dir} for new *{suffix} models")
+    return engine, transform, models
 
-        epsilon = 1e-7
-        confidences = (1 - 2*epsilon) * confidences + epsilon
+def score(engine, features):
+    confidences = engine.predict(features)
+    confidences = np.clip(confidences, 0, 1)
 
-        if confidences.ndim == 0:
-            confidences = np.array([confidences])
-        elif confidences.ndim > 1:
-            confidences = confidences.flatten()
+    epsilon = 1e-7
+    return (1 - 2*epsilon) * confidences + epsilon
 
-        for i, packet in enumerate(packet_buffer):
-            if not write_packet_data(output_fd, packet.source_ip, packet.dest_ip, confidences[i]):
-                print(f"Failed to write packet data for packet {i}")
-                continue  # Continue processing other packets
+def pack_verdicts(packets, confidences):
+    """Output records for a whole batch, as bytes."""
+    verdicts = np.empty(len(packets), dtype=VERDICT_DTYPE)
+    verdicts["source_ip"] = packets["source_ip"]
+    verdicts["dest_ip"] = packets["dest_ip"]
+    verdicts["confidence"] = confidences
+    return verdicts.tobytes()
 
+def write_verdicts(output, packets, confidences):
+    """Write a whole batch of verdicts as one buffer."""
+    return write_verdict_records(output, pack_verdicts(packets, confidences))
+
+def analyzer_stats(sequences, batcher, output_pipe, skipped_bytes=0, dropped_queue_full=0,
+                   dropped_worker_restart=0, failed_batches=0):
+    """Counters for the ml stats file; see pipeline_stats.py."""
+    filtered = VERDICT_FILTER.verdicts - VERDICT_FILTER.emitted if VERDICT_FILTER is not None else 0
+    return {
+        "consumed": sequences.received,
+        "missing": sequences.missing,
+        "forwarder_restarts": sequences.resets,
+        "skipped_bytes": skipped_bytes,
+        "dropped_queue_full": dropped_queue_full,
+        "dropped_worker_restart": dropped_worker_restart,
+        "failed_batches": failed_batches,
+        "filtered": filtered,
+        "emitted": output_pipe.accepted_bytes // OUTPUT_RECORD_SIZE,
+        "dropped_output": output_pipe.dropped_bytes // OUTPUT_RECORD_SIZE,
+        "output_queued": output_pipe.queued_bytes // OUTPUT_RECORD_SIZE,
+        "queue_high_water": batcher.max_pending,
+        "output_high_water": output_pipe.high_water_bytes // OUTPUT_RECORD_SIZE,
+    }
+
+def load_cache(args, transform=None):
+    """
+    The VerdictCache for args, or None. Unless --cache-size is given, the
+    cache is only used with a fitted transform: without one, features are
+    scaled per batch and a cached verdict is only an approximation.
+    """
+    size = args.cache_size
+    if size is None:
+        size = DEFAULT_CACHE_SIZE if transform is not None else 0
+    if size <= 0:
+        return None
+    return VerdictCache(size, args.cache_ttl)
+
+def score_packets(engine, featurizer, packets, cache=None):
+    """Confidence per packet, running the model only for packets the cache cannot answer."""
+    if cache is None:
+        return score(engine, featurizer(packets))
+    confidences, missing, keys = cache.lookup(packets)
+    if len(missing):
+        scores = score(engine, featurizer(packets[missing]))
+        confidences[missing] = scores
+        cache.store(keys, missing, scores)
+    return confidences
+
+def process_batch(engine, featurizer, packets, output, cache=None):
+    try:
+        write_verdicts(output, packets, score_packets(engine, featurizer, packets, cache))
         return True
-    except tf.errors.InvalidArgumentError as e:
-        print(f"TensorFlow error: {e}")
-        return False
     except Exception as e:
         print(f"Error processing batch: {e}")
         return False
 
-def analyze_packets_stream(model):
+def open_input(transport, input_pipe, shared_ring):
+    """
+    Attach to the forwarder's shared-memory ring or open its FIFO, whichever
+    transport allows and the forwarder has created, the ring first. Returns
+    the one opened, or None.
+    """
+    if transport != "fifo" and shared_ring.open():
+        print(f"\nReading packets from shared-memory ring {RING_PATH}")
+        return shared_ring
+    if transport != "shm" and input_pipe.open():
+        print(f"\nListening on {INPUT_PIPE_NAME}")
+        return input_pipe
+    return None
+
+def analyze_packets_stream(loading, batcher=None, make_cache=None, flows=None, transport="auto"):
+    """
+    Score packets as they arrive, or with a FlowTable, score each flow once
+    per window and emit one verdict for its endpoints.
+
+    Packets come from the forwarder's shared-memory ring or its FIFO, as
+    set by transport; "auto" attaches to whichever the forwarder created.
+
+    loading is a BackgroundLoad of load_scoring(). The pipes are opened
+    right away and packets are buffered in the ring until it is done. With
+    a ModelSwapper among its results, that scores instead of the engine and
+    may switch to a new model version between batches. make_cache is called
+    with the transform of the model taken into use and returns the
+    VerdictCache to use with it, or None.
+    """
     print("Initializing packet analysis...")
 
     if not create_output_pipe():
         return
+    startup_step("output pipe created")
 
-    packet_buffer = deque(maxlen=BATCH_SIZE)
+    batcher = batcher or MicroBatcher()
+    ring = PacketRing(RING_CAPACITY)
+    input_pipe = InputPipe(INPUT_PIPE_NAME)
+    shared_ring = SharedPacketRing(RING_PATH)
+    source = ring  # where batches are taken from: ring, filled from input_pipe, or shared_ring
+    output_pipe = OutputPipe(OUTPUT_PIPE_NAME)
+    selector = selectors.DefaultSelector()
     packets_processed = 0
-    running = True
-
-    while running:
-        try:
-            print("\nConnecting to pipes...")
-            input_fd = connect_to_pipe(INPUT_PIPE_NAME, os.O_RDONLY | os.O_NONBLOCK)
-            if input_fd is None:
-                print("Failed to connect to input pipe. Retrying...")
-                time.sleep(RECONNECT_DELAY)
+    last_report_time = time.time()
+    last_packet_time = time.monotonic()
+    watched_output = None
+    next_reconnect_time = 0.0
+    next_flow_time = 0.0
+    engine = featurizer = flow_featurizer = models = cache = None
+    sequences = SequenceTracker()
+    failed_batches = 0
+
+    def collect_stats():
+        counters = analyzer_stats(sequences, batcher, output_pipe, ring.skipped_bytes, failed_batches=failed_batches)
+        if models is not None:
+            counters.update(models.stats())
+        return counters
+
+    stats = StatsWriter("ml", collect_stats, STATS_DIR)
+    stats.start()
+
+    def start_scoring():
+        """Take the loaded model into use, waiting for it if need be."""
+        nonlocal loading, engine, featurizer, flow_featurizer, models, cache
+        engine, transform, models = loading.result()
+        loading = None
+        if make_cache is not None:
+            cache = make_cache(transform)
+        featurizer = Featurizer(batcher.max_batch, transform=transform)
+        if flows is not None:
+            flow_featurizer = FlowFeaturizer(batcher.max_batch, transform=transform)
+        if models is not None:
+            engine = models
+            featurizer = models.featurizer(batcher.max_batch)
+            if flows is not None:
+                flow_featurizer = models.featurizer(batcher.max_batch, FlowFeaturizer)
+            if make_cache is not None:
+                models.on_switch = switch_cache
+        if input_open() and len(source):
+            print(f"\nScoring {len(source)} packets buffered while the model loaded")
+
+    def switch_cache():
+        """Cached verdicts came from the model being replaced; start over with the new one's transform."""
+        nonlocal cache
+        cache = make_cache(models.active.transform)
+
+    def flush(count):
+        nonlocal packets_processed, last_report_time, failed_batches
+        packets = source.take(count)
+        sequences.update(packets)
+        oldest = batcher.take(count)
+        if models is not None:
+            models.observe(packets)
+        if flows is not None:
+            flows.add(packets, time.monotonic())
+            packets_processed += len(packets)
+        elif process_batch(engine, featurizer, packets, output_pipe, cache):
+            packets_processed += len(packets)
+            print(f"\rProcessed {packets_processed} packets", end="", flush=True)
+        else:
+            failed_batches += 1
+        source.release(packets)
+        batcher.done(count, oldest)
+
+        if time.time() - last_report_time > LATENCY_REPORT_INTERVAL:
+            engine.latency.print_report()
+            batcher.print_report()
+            if cache is not None:
+                cache.print_report()
+            if flows is not None:
+                flows.print_report()
+            if VERDICT_FILTER is not None:
+                VERDICT_FILTER.print_report()
+            if output_pipe.dropped_bytes:
+                print(f"Dropped {output_pipe.dropped_bytes // OUTPUT_RECORD_SIZE} verdicts while the reader was away")
+            if shared_ring.is_open() and shared_ring.dropped:
+                print(f"The forwarder dropped {shared_ring.dropped} packets on a full ring")
+            last_report_time = time.time()
+
+    def input_open():
+        return shared_ring.is_open() or input_pipe.is_open()
+
+    def reopen_input():
+        nonlocal source
+        # Score what is queued first: the next source may be a different one
+        if batcher.pending and loading is not None:
+            start_scoring()
+        while batcher.pending:
+            flush(batcher.pending)
+        # Whatever comes next is numbered from the start again
+        sequences.reset()
+        if shared_ring.is_open():
+            shared_ring.close()
+        if input_pipe.is_open():
+            selector.unregister(input_pipe.fd)
+            input_pipe.close()
+            ring.discard_partial()
+        opened = open_input(transport, input_pipe, shared_ring)
+        if opened is input_pipe:
+            selector.register(input_pipe.fd, selectors.EVENT_READ, "input")
+        if opened is not None:
+            source = shared_ring if opened is shared_ring else ring
+            startup_step("input open")
+
+    def update_output():
+        """Watch the output pipe for writability only while verdicts are queued."""
+        nonlocal watched_output
+        wanted = output_pipe.fd if output_pipe.wants_write() else None
+        if watched_output is not None and watched_output != wanted:
+            selector.unregister(watched_output)
+            watched_output = None
+        if wanted is not None and watched_output is None:
+            selector.register(wanted, selectors.EVENT_WRITE, "output")
+            watched_output = wanted
+
+    try:
+        while True:
+            # Reconnect whichever endpoint is missing; queued records and
+            # verdicts are kept while it is away
+            if time.monotonic() >= next_reconnect_time:
+                if not input_open():
+                    reopen_input()
+                if not output_pipe.is_open() and output_pipe.open():
+                    print(f"\nWriting verdicts to {OUTPUT_PIPE_NAME}")
+                    startup_step("output open")
+                next_reconnect_time = time.monotonic() + RECONNECT_DELAY
+            update_output()
+            if loading is not None and loading.done():
+                start_scoring()
+
+            timeout = batcher.timeout()
+            if not (input_open() and output_pipe.is_open()):
+                timeout = RECONNECT_DELAY if timeout is None else min(timeout, RECONNECT_DELAY)
+            elif timeout is None:
+                timeout = CONNECTION_TIMEOUT
+            if flows is not None:
+                timeout = min(timeout, max(0.0, next_flow_time - time.monotonic()))
+            if loading is not None:
+                # Nothing is scored yet, so batch deadlines do not matter
+                timeout = STARTUP_POLL_INTERVAL
+
+            if shared_ring.is_open() and loading is None:
+                # The ring has no fd; sleep on its futex until the first packet, then
+                # until a full batch or the batch deadline, waking up to drain queued output
+                if watched_output is not None:
+                    timeout = min(timeout, OUTPUT_POLL_INTERVAL)
+                shared_ring.wait(timeout, batcher.batch_size if batcher.pending else 1)
+                if len(shared_ring) > batcher.pending:
+                    last_packet_time = time.monotonic()
+                    batcher.add(len(shared_ring) - batcher.pending, last_packet_time)
+                    startup_step("first packet")
+                timeout = 0
+            elif shared_ring.is_open() and len(shared_ring):
+                startup_step("first packet")
+
+            if loading is not None and ring.is_full():
+                # The pipe stays readable, but there is no room for more until scoring starts
+                ready = []
+                time.sleep(timeout)
+            else:
+                ready = selector.select(timeout)
+            for key, events in ready:
+                if key.data == "input":
+                    received = ring.fill(input_pipe.fd)
+                    if received == 0:
+                        reopen_input()
+                    elif received:
+                        last_packet_time = time.monotonic()
+                        batcher.add(len(ring) - batcher.pending, last_packet_time)
+                        startup_step("first packet")
+                elif key.data == "output":
+                    output_pipe.flush()
+
+            if loading is not None:
                 continue
+            if models is not None:
+                models.poll()
+
+            count = batcher.next_batch_size()
+            while count:
+                flush(count)
+                count = batcher.next_batch_size()
+
+            if flows is not None and time.monotonic() >= next_flow_time:
+                due = flows.collect(time.monotonic())
+                if len(due):
+                    write_verdicts(output_pipe, due, score(engine, flow_featurizer(due)))
+                    print(f"\rProcessed {packets_processed} packets as {flows.flows_scored} flow verdicts",
+                          end="", flush=True)
+                next_flow_time = time.monotonic() + flows.timeout()
+
+            # The forwarder recreates the FIFO or ring when it restarts; follow it
+            if input_open() and time.monotonic() - last_packet_time > CONNECTION_TIMEOUT:
+                last_packet_time = time.monotonic()
+                current = shared_ring if shared_ring.is_open() else input_pipe
+                if current.replaced():
+                    print(f"\n{current.path} was replaced. Reconnecting...")
+                    reopen_input()
+
+    except KeyboardInterrupt:
+        print("\nShutting down gracefully...")
+    finally:
+        stats.stop()
+        selector.close()
+        input_pipe.close()
+        shared_ring.close()
+        output_pipe.close()
+
+def analyze_packets_threaded(engine, transform=None, batcher=None, drop_policy=DEFAULT_DROP_POLICY,
+                             queue_depth=QUEUE_DEPTH, cache=None, transport="auto"):
+    """
+    Same job as analyze_packets_stream(), split into reader, featurizer,
+    inference and writer stages connected by bounded queues, so the input
+    keeps draining while a batch is being scored. Packets come from the
+    forwarder's ring or FIFO as set by transport.
+
+    The reader (this thread) copies the packet headers out of the ring and
+    hands the ring space straight back. What happens when the featurizer
+    falls behind is set by drop_policy; the later queues always block, so
+    a slow model or verdict reader pushes back on the featurizer queue.
+    """
+    print("Initializing packet analysis...")
+
+    if not create_output_pipe():
+        return
+    startup_step("output pipe created")
+
+    batcher = batcher or MicroBatcher()
+    ring = PacketRing(RING_CAPACITY)
+    featurizer = Featurizer(batcher.max_batch, transform=transform)
+    input_pipe = InputPipe(INPUT_PIPE_NAME)
+    shared_ring = SharedPacketRing(RING_PATH)
+    source = ring  # where batches are taken from: ring, filled from input_pipe, or shared_ring
+    output_pipe = OutputPipe(OUTPUT_PIPE_NAME)
+    selector = selectors.DefaultSelector()
+    stop = threading.Event()
+    last_packet_time = time.monotonic()
+    next_reconnect_time = 0.0
+    next_output_reconnect_time = 0.0
+    last_report_time = time.time()
+    packets_processed = 0
+
+    features_queue = StageQueue("featurize", queue_depth, drop_policy)
+    inference_queue = StageQueue("inference", queue_depth)
+    output_queue = StageQueue("write", queue_depth)
+    reader = StageCounters("read")
+    sequences = SequenceTracker()
+
+    def featurize(item):
+        packets, oldest = item
+        cached = None
+        if cache is not None:
+            # Only cache misses are featurized and scored
+            cached = cache.lookup(packets)
+            packets_to_score = packets[cached[1]]
+        else:
+            packets_to_score = packets
+        # Copied because the featurizer reuses its buffer for the next batch
+        return packets, featurizer(packets_to_score).copy(), oldest, cached
+
+    def infer(item):
+        packets, features, oldest, cached = item
+        if cached is None:
+            return packets, score(engine, features), oldest
+        confidences, missing, keys = cached
+        if len(missing):
+            scores = score(engine, features)
+            confidences[missing] = scores
+            cache.store(keys, missing, scores)
+        return packets, confidences, oldest
+
+    def connect_output():
+        nonlocal next_output_reconnect_time
+        if output_pipe.is_open() or time.monotonic() < next_output_reconnect_time:
+            return
+        if output_pipe.open():
+            print(f"\nWriting verdicts to {OUTPUT_PIPE_NAME}")
+            startup_step("output open")
+        next_output_reconnect_time = time.monotonic() + RECONNECT_DELAY
+
+    def write(item):
+        nonlocal packets_processed, last_report_time
+        packets, confidences, oldest = item
+        connect_output()
+        write_verdicts(output_pipe, packets, confidences)
+        # Only adapts batch_size, a plain attribute the reader reads
+        batcher.done(len(packets), oldest)
+        packets_processed += len(packets)
+        print(f"\rProcessed {packets_processed} packets", end="", flush=True)
+
+        if time.time() - last_report_time > LATENCY_REPORT_INTERVAL:
+            engine.latency.print_report()
+            batcher.print_report()
+            print_pipeline_report([reader] + [stage.counters for stage in stages],
+                                  [features_queue, inference_queue, output_queue])
+            if cache is not None:
+                cache.print_report()
+            if VERDICT_FILTER is not None:
+                VERDICT_FILTER.print_report()
+            if output_pipe.dropped_bytes:
+                print(f"Dropped {output_pipe.dropped_bytes // OUTPUT_RECORD_SIZE} verdicts while the reader was away")
+            last_report_time = time.time()
+
+    def drain_output():
+        """Writer idle work: reconnect and push out verdicts still queued for the pipe."""
+        connect_output()
+        if output_pipe.wants_write():
+            select.select([], [output_pipe.fd], [], OUTPUT_POLL_INTERVAL)
+            output_pipe.flush()
+
+    stages = [
+        Stage("featurize", featurize, features_queue, inference_queue, stop),
+        Stage("inference", infer, inference_queue, output_queue, stop),
+        Stage("write", write, output_queue, None, stop, idle_work=drain_output,
+              idle_timeout=OUTPUT_POLL_INTERVAL),
+    ]
+
+    def flush(count):
+        start = time.monotonic()
+        packets = source.take(count)
+        sequences.update(packets)
+        headers = copy_headers(packets)
+        source.release(packets)
+        oldest = batcher.take(count)
+        reader.batches += 1
+        reader.records += count
+        reader.busy_time += time.monotonic() - start
+
+        start = time.monotonic()
+        features_queue.put((headers, oldest), stop)
+        reader.blocked_time += time.monotonic() - start
+
+    def input_open():
+        return shared_ring.is_open() or input_pipe.is_open()
+
+    def reopen_input():
+        nonlocal source
+        # Hand on what is queued first: the next source may be a different one
+        while batcher.pending:
+            flush(batcher.pending)
+        if shared_ring.is_open():
+            shared_ring.close()
+        if input_pipe.is_open():
+            selector.unregister(input_pipe.fd)
+            input_pipe.close()
+            ring.discard_partial()
+        sequences.reset()
+        opened = open_input(transport, input_pipe, shared_ring)
+        if opened is input_pipe:
+            selector.register(input_pipe.fd, selectors.EVENT_READ)
+        if opened is not None:
+            source = shared_ring if opened is shared_ring else ring
+            startup_step("input open")
+
+    def collect_stats():
+        queues = [features_queue, inference_queue, output_queue]
+        counters = analyzer_stats(sequences, batcher, output_pipe, ring.skipped_bytes,
+                                  dropped_queue_full=sum(stage_queue.dropped_records for stage_queue in queues),
+                                  failed_batches=sum(stage.counters.errors for stage in stages))
+        for stage_queue in queues:
+            counters[f"{stage_queue.name}_queue_high_water"] = stage_queue.high_water
+        return counters
+
+    for stage in stages:
+        stage.start()
+    stats = StatsWriter("ml", collect_stats, STATS_DIR)
+    stats.start()
+
+    try:
+        while True:
+            if not input_open() and time.monotonic() >= next_reconnect_time:
+                reopen_input()
+                next_reconnect_time = time.monotonic() + RECONNECT_DELAY
+
+            timeout = batcher.timeout()
+            if not input_open():
+                timeout = RECONNECT_DELAY if timeout is None else min(timeout, RECONNECT_DELAY)
+            elif timeout is None:
+                timeout = CONNECTION_TIMEOUT
+
+            if shared_ring.is_open():
+                # The ring has no fd; sleep on its futex until a full batch or the batch deadline
+                shared_ring.wait(timeout, batcher.batch_size if batcher.pending else 1)
+                if len(shared_ring) > batcher.pending:
+                    last_packet_time = time.monotonic()
+                    batcher.add(len(shared_ring) - batcher.pending, last_packet_time)
+            elif selector.select(timeout):
+                start = time.monotonic()
+                received = ring.fill(input_pipe.fd)
+                if received == 0:
+                    reopen_input()
+                elif received:
+                    last_packet_time = time.monotonic()
+                    batcher.add(len(ring) - batcher.pending, last_packet_time)
+                reader.busy_time += time.monotonic() - start
+
+            count = batcher.next_batch_size()
+            while count:
+                flush(count)
+                count = batcher.next_batch_size()
+
+            # The forwarder recreates the FIFO or ring when it restarts; follow it
+            if input_open() and time.monotonic() - last_packet_time > CONNECTION_TIMEOUT:
+                last_packet_time = time.monotonic()
+                current = shared_ring if shared_ring.is_open() else input_pipe
+                if current.replaced():
+                    print(f"\n{current.path} was replaced. Reconnecting...")
+                    reopen_input()
+
+    except KeyboardInterrupt:
+        print("\nShutting down gracefully...")
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join(STAGE_JOIN_TIMEOUT)
+        stats.stop()
+        selector.close()
+        input_pipe.close()
+        shared_ring.close()
+        output_pipe.close()
+
+def analyze_packets_workers(pool, batcher=None, transport="auto"):
+    """
+    Supervisor loop for --workers: read the forwarder's ring or FIFO, as set
+    by transport, shard every batch across the inference worker processes
+    and merge their verdicts into the output FIFO.
+    """
+    print("Initializing packet analysis...")
+
+    if not create_output_pipe():
+        return
+    startup_step("output pipe created")
+
+    batcher = batcher or MicroBatcher()
+    ring = PacketRing(RING_CAPACITY)
+    input_pipe = InputPipe(INPUT_PIPE_NAME)
+    shared_ring = SharedPacketRing(RING_PATH)
+    source = ring  # where batches are taken from: ring, filled from input_pipe, or shared_ring
+    output_pipe = OutputPipe(OUTPUT_PIPE_NAME)
+    selector = selectors.DefaultSelector()
+    last_report_time = time.time()
+    last_packet_time = time.monotonic()
+    watched_output = None
+    watched_workers = {}  # worker -> (reply connection, fd) registered with the selector
+    next_reconnect_time = 0.0
+    sequences = SequenceTracker()
+    stats = StatsWriter("ml", lambda: analyzer_stats(sequences, batcher, output_pipe, ring.skipped_bytes,
+                                                     dropped_worker_restart=pool.lost_records), STATS_DIR)
+    stats.start()
+
+    def flush(count):
+        nonlocal last_report_time
+        packets = source.take(count)
+        sequences.update(packets)
+        headers = copy_headers(packets)
+        source.release(packets)
+        oldest = batcher.take(count)
+        pool.dispatch(headers, oldest)
+        # The batch is off our hands once dispatched; pool.print_report()
+        # has the latency up to the verdict
+        batcher.done(count, oldest)
 
-            output_fd = connect_to_pipe(OUTPUT_PIPE_NAME, os.O_WRONLY | os.O_NONBLOCK)
-            if output_fd is None:
-                os.close(input_fd)
-                print("Failed to connect to output pipe. Retrying...")
-                time.sleep(RECONNECT_DELAY)
+        if time.time() - last_report_time > LATENCY_REPORT_INTERVAL:
+            batcher.print_report()
+            pool.print_report()
+            if VERDICT_FILTER is not None:
+                VERDICT_FILTER.print_report()
+            if output_pipe.dropped_bytes:
+                print(f"Dropped {output_pipe.dropped_bytes // OUTPUT_RECORD_SIZE} verdicts while the reader was away")
+            last_report_time = time.time()
+
+    def input_open():
+        return shared_ring.is_open() or input_pipe.is_open()
+
+    def reopen_input():
+        nonlocal source
+        # Hand on what is queued first: the next source may be a different one
+        while batcher.pending:
+            flush(batcher.pending)
+        if shared_ring.is_open():
+            shared_ring.close()
+        if input_pipe.is_open():
+            selector.unregister(input_pipe.fd)
+            input_pipe.close()
+            ring.discard_partial()
+        sequences.reset()
+        opened = open_input(transport, input_pipe, shared_ring)
+        if opened is input_pipe:
+            selector.register(input_pipe.fd, selectors.EVENT_READ, "input")
+        if opened is not None:
+            source = shared_ring if opened is shared_ring else ring
+            startup_step("input open")
+
+    def update_output():
+        """Watch the output pipe for writability only while verdicts are queued."""
+        nonlocal watched_output
+        wanted = output_pipe.fd if output_pipe.wants_write() else None
+        if watched_output is not None and watched_output != wanted:
+            selector.unregister(watched_output)
+            watched_output = None
+        if wanted is not None and watched_output is None:
+            selector.register(wanted, selectors.EVENT_WRITE, "output")
+            watched_output = wanted
+
+    def update_workers():
+        """Follow the reply pipes of restarted workers."""
+        for worker, connection in pool.connections():
+            watched = watched_workers.get(worker)
+            if watched is not None and watched[0] is connection:
                 continue
+            if watched is not None:
+                # The fd number may already belong to the new pipe
+                selector.unregister(watched[1])
+            selector.register(connection.fileno(), selectors.EVENT_READ, worker)
+            watched_workers[worker] = (connection, connection.fileno())
 
-            print("Connected to pipes. Processing packets...")
-            empty_reads = 0
-            last_packet_time = time.time()
-
-            while True:
-                packet = read_packet(input_fd)
-
-                if packet is None:
-                    empty_reads += 1
-                    current_time = time.time()
-
-                    if empty_reads >= MAX_EMPTY_READS and (current_time - last_packet_time) > CONNECTION_TIMEOUT:
-                        print("\nNo packets received for too long. Reconnecting...")
-                        break
-
-                    if empty_reads >= MAX_EMPTY_READS and packet_buffer:
-                        if process_batch(model, packet_buffer, output_fd):
-                            packets_processed += len(packet_buffer)
-                            print(f"\rProcessed {packets_processed} packets", end="", flush=True)
-                        packet_buffer.clear()
-
-                    time.sleep(ERROR_CHECK_INTERVAL)
-                    continue
-
-                empty_reads = 0
-                last_packet_time = time.time()
-                packet_buffer.append(packet)
-
-                if len(packet_buffer) >= BATCH_SIZE:
-                    if process_batch(model, packet_buffer, output_fd):
-                        packets_processed += len(packet_buffer)
-                        print(f"\rProcessed {packets_processed} packets", end="", flush=True)
-                    packet_buffer.clear()
-
-        except KeyboardInterrupt:
-            print("\nShutting down gracefully...")
-            running = False
-        except Exception as e:
-            print(f"\nError in main processing loop: {e}")
-            time.sleep(RECONNECT_DELAY)
-        finally:
-            try:
-                if 'input_fd' in locals():
-                    os.close(input_fd)
-                if 'output_fd' in locals():
-                    os.close(output_fd)
-            except:
-                pass
+    pool.on_verdicts = lambda data: write_verdict_records(output_pipe, data)
+
+    try:
+        while True:
+            if time.monotonic() >= next_reconnect_time:
+                if not input_open():
+                    reopen_input()
+                if not output_pipe.is_open() and output_pipe.open():
+                    print(f"\nWriting verdicts to {OUTPUT_PIPE_NAME}")
+                    startup_step("output open")
+                next_reconnect_time = time.monotonic() + RECONNECT_DELAY
+            update_output()
+            update_workers()
+
+            timeout = batcher.timeout()
+            if not (input_open() and output_pipe.is_open()):
+                timeout = RECONNECT_DELAY if timeout is None else min(timeout, RECONNECT_DELAY)
+            elif timeout is None:
+                timeout = CONNECTION_TIMEOUT
+
+            if shared_ring.is_open():
+                # The ring has no fd; sleep on its futex until a full batch or the batch
+                # deadline, waking up to collect verdicts and drain queued output
+                if watched_output is not None or pool.in_flight():
+                    timeout = min(timeout, OUTPUT_POLL_INTERVAL)
+                shared_ring.wait(timeout, batcher.batch_size if batcher.pending else 1)
+                if len(shared_ring) > batcher.pending:
+                    last_packet_time = time.monotonic()
+                    batcher.add(len(shared_ring) - batcher.pending, last_packet_time)
+                timeout = 0
+
+            for key, events in selector.select(timeout):
+                if key.data == "input":
+                    received = ring.fill(input_pipe.fd)
+                    if received == 0:
+                        reopen_input()
+                    elif received:
+                        last_packet_time = time.monotonic()
+                        batcher.add(len(ring) - batcher.pending, last_packet_time)
+                elif key.data == "output":
+                    output_pipe.flush()
+                else:
+                    pool.receive(key.data)
+
+            count = batcher.next_batch_size()
+            while count:
+                flush(count)
+                count = batcher.next_batch_size()
+
+            # The forwarder recreates the FIFO or ring when it restarts; follow it
+            if input_open() and time.monotonic() - last_packet_time > CONNECTION_TIMEOUT:
+                last_packet_time = time.monotonic()
+                current = shared_ring if shared_ring.is_open() else input_pipe
+                if current.replaced():
+                    print(f"\n{current.path} was replaced. Reconnecting...")
+                    reopen_input()
+
+    except KeyboardInterrupt:
+        print("\nShutting down gracefully...")
+    finally:
+        print("\nStopping inference workers...")
+        pool.stop()
+        stats.stop()
+        selector.close()
+        input_pipe.close()
+        shared_ring.close()
+        output_pipe.close()
 
 def main():
+    global VERBOSE, VERDICT_FILTER, STARTUP_PROFILE, INPUT_PIPE_NAME, OUTPUT_PIPE_NAME
     parser = argparse.ArgumentParser(
         description="Analyze network packets in real-time using a pre-trained Keras model."
     )
@@ -317,17 +945,198 @@ def main():
         type=str,
         help="Path to the trained Keras model file."
     )
+    parser.add_argument(
+        "--transform",
+        type=str,
+        help="Path to the fitted feature transform (default: next to the model)."
+    )
+    parser.add_argument(
+        "--jit",
+        action="store_true",
+        help="Compile the model with XLA."
+    )
+    parser.add_argument(
+        "--max-delay-ms",
+        type=float,
+        default=MAX_BATCH_DELAY * 1000,
+        help=f"Longest a packet waits for its batch to fill (default: {MAX_BATCH_DELAY * 1000:.0f} ms)."
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help=f"Largest batch the adaptive batcher grows to (default: {MAX_BATCH_SIZE})."
+    )
+    parser.add_argument(
+        "--runtime",
+        choices=["keras", "numpy", "int8"],
+        default="keras",
+        help="Run the model with TensorFlow, with NumPy from weights exported by export_numpy.py, "
+             "or as the int8 TFLite model written by quantize_model.py."
+    )
+    parser.add_argument(
+        "--numpy-model",
+        type=str,
+        help="Path to the exported .npz weights for --runtime numpy (default: next to the model)."
+    )
+    parser.add_argument(
+        "--int8-model",
+        type=str,
+        help="Path to the quantized .tflite model for --runtime int8 (default: next to the model)."
+    )
+    parser.add_argument(
+        "--threaded",
+        action="store_true",
+        help="Read, featurize, score and write in separate threads connected by bounded queues."
+    )
+    parser.add_argument(
+        "--drop-policy",
+        choices=DROP_POLICIES,
+        default=DEFAULT_DROP_POLICY,
+        help=f"With --threaded, what to do when the featurizer falls behind (default: {DEFAULT_DROP_POLICY}). "
+             "'block' stops reading the input pipe instead of dropping batches; the drop policies keep it draining."
+    )
+
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Print every verdict. Costs more than scoring under load."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        help=f"Verdicts remembered per flow and size bucket, 0 to score every packet "
+             f"(default: {DEFAULT_CACHE_SIZE} with a fitted feature transform, 0 without one)."
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds a cached verdict is reused before the flow is scored again (default: {DEFAULT_CACHE_TTL:.0f})."
+    )
+    parser.add_argument(
+        "--flow-window",
+        type=float,
+        default=0,
+        help="Score flows instead of packets: each flow at most once per this many seconds "
+             "(default: 0, score every packet)."
+    )
+    parser.add_argument(
+        "--max-flows",
+        type=int,
+        default=DEFAULT_MAX_FLOWS,
+        help=f"Flows tracked at once with --flow-window (default: {DEFAULT_MAX_FLOWS})."
+    )
+    parser.add_argument(
+        "--settings",
+        type=str,
+        default=SETTINGS_PATH,
+        help=f"Settings file kept by pyscript; its mlCaution threshold is followed live (default: {SETTINGS_PATH})."
+    )
+    parser.add_argument(
+        "--emit-all",
+        action="store_true",
+        help="Write every verdict to the analysis pipe, not just those at or above mlCaution."
+    )
+    parser.add_argument(
+        "--all-verdicts-pipe",
+        type=str,
+        help="FIFO that receives a sample of all verdicts, kept or not, for debugging."
+    )
+    parser.add_argument(
+        "--all-verdicts-sample",
+        type=float,
+        default=DEFAULT_SAMPLE_RATE,
+        help=f"Fraction of verdicts sent to --all-verdicts-pipe (default: {DEFAULT_SAMPLE_RATE})."
+    )
+    parser.add_argument(
+        "--input-pipe",
+        type=str,
+        default=INPUT_PIPE_NAME,
+        help=f"FIFO the forwarder writes packet records to (default: {INPUT_PIPE_NAME})."
+    )
+    parser.add_argument(
+        "--output-pipe",
+        type=str,
+        default=OUTPUT_PIPE_NAME,
+        help=f"FIFO verdicts are written to (default: {OUTPUT_PIPE_NAME})."
+    )
+    parser.add_argument(
+        "--transport",
+        choices=TRANSPORTS,
+        default="auto",
+        help=f"Read packets from the forwarder's shared-memory ring ({RING_PATH}) or its FIFO "
+             f"({INPUT_PIPE_NAME}); auto uses whichever exists (default: auto)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Score in this many worker processes, each with its own model, sharding packets by address pair "
+             "(default: 0, score in this process)."
+    )
+    parser.add_argument(
+        "--model-dir",
+        type=str,
+        help="Directory to watch for new model versions (.keras files, .npz with --runtime numpy, .tflite with --runtime int8); "
+             "the newest is validated and switched to without a restart."
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Print when each startup step is reached, from imports to the first verdict."
+    )
+    parser.add_argument(
+        "--latency-budget-ms",
+        type=float,
+        help="With --model-dir, reject or roll back a new model whose p99 batch latency exceeds this."
+    )
 
     args = parser.parse_args()
+    if args.flow_window > 0 and (args.threaded or args.workers > 0):
+        parser.error("--flow-window runs in the single-threaded analyzer only")
+    if args.model_dir and (args.threaded or args.workers > 0):
+        parser.error("--model-dir runs in the single-threaded analyzer only")
+
+    VERBOSE = args.verbose
+    INPUT_PIPE_NAME, OUTPUT_PIPE_NAME = args.input_pipe, args.output_pipe
+    if args.startup_profile:
+        STARTUP_PROFILE = StartupProfile(STARTED, FIRST_VERDICT_TARGET[args.runtime])
+        startup_step("imports done")
+    if not args.emit_all:
+        VERDICT_FILTER = VerdictFilter(args.settings, side_channel_path=args.all_verdicts_pipe,
+                                       sample_rate=args.all_verdicts_sample)
 
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
     #cleanup()
 
-    print("Loading model...")
-    model = load_model(args.model)
+    if args.workers > 0:
+        print(f"Starting {args.workers} inference workers ({args.runtime} runtime)...")
+        pool = WorkerPool(args.workers, args, on_verdicts=None)
+        pool.start()
+        print("Starting packet analysis...")
+        batcher = MicroBatcher(max_delay=args.max_delay_ms / 1000, max_batch=args.max_batch)
+        analyze_packets_workers(pool, batcher, args.transport)
+        return
+
+    batcher = MicroBatcher(max_delay=args.max_delay_ms / 1000, max_batch=args.max_batch)
+    if args.threaded:
+        engine, transform, _ = load_scoring(args)
+        print("Starting packet analysis...")
+        analyze_packets_threaded(engine, transform, batcher, args.drop_policy,
+                                 cache=load_cache(args, transform), transport=args.transport)
+        return
 
+    # The pipes open and packets queue up while the model loads
+    loading = BackgroundLoad(lambda: load_scoring(args))
     print("Starting packet analysis...")
-    analyze_packets_stream(model)
+    if args.flow_window > 0:
+        flows = FlowTable(args.flow_window, max(DEFAULT_IDLE_TIMEOUT, args.flow_window), args.max_flows)
+        analyze_packets_stream(loading, batcher, flows=flows, transport=args.transport)
+    else:
+        analyze_packets_stream(loading, batcher, lambda transform: load_cache(args, transform),
+                               transport=args.transport)
 
 if __name__ == "__main__":
     main()
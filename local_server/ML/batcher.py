@@ -0,0 +1,114 @@
+import time
+from collections import deque
+import numpy as np
+
+MAX_BATCH_DELAY = 0.02
+MAX_BATCH_SIZE = 128
+MIN_BATCH_SIZE = 8
+LATENCY_WINDOW = 1000
+
+
+class MicroBatcher:
+    """
+    Decide when queued records are scored, bounded by delay and batch size.
+
+    A batch is due as soon as batch_size records are queued or the oldest
+    queued record has waited max_delay seconds. batch_size doubles (up to
+    max_batch) while inference falls behind and records pile up, and halves
+    (down to min_batch) when deadline flushes find the queue mostly empty.
+
+    The batcher only counts records; the records themselves stay in the
+    PacketRing, which hands them out in the same order.
+    """
+
+    def __init__(self, max_delay=MAX_BATCH_DELAY, max_batch=MAX_BATCH_SIZE, min_batch=MIN_BATCH_SIZE):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.min_batch = min(min_batch, max_batch)
+        self.batch_size = self.min_batch
+        self.pending = 0
+        self.max_pending = 0
+        self._arrivals = deque()  # [record count, arrival time] per read
+        self._verdict_latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, count, now=None):
+        """Note that count records arrived."""
+        if count <= 0:
+            return
+        self._arrivals.append([count, time.monotonic() if now is None else now])
+        self.pending += count
+        self.max_pending = max(self.max_pending, self.pending)
+
+    def deadline(self):
+        """Time by which the oldest queued record must be scored, or None if nothing is queued."""
+        if not self._arrivals:
+            return None
+        return self._arrivals[0][1] + self.max_delay
+
+    def timeout(self, now=None):
+        """Seconds until the next batch is due, or None if nothing is queued."""
+        deadline = self.deadline()
+        if deadline is None:
+            return None
+        if self.pending >= self.batch_size:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, deadline - now)
+
+    def next_batch_size(self, now=None):
+        """Number of records to score now, 0 if no batch is due yet."""
+        if self.pending >= self.batch_size:
+            return self.batch_size
+        deadline = self.deadline()
+        now = time.monotonic() if now is None else now
+        if deadline is not None and now >= deadline:
+            return self.pending
+        return 0
+
+    def take(self, count):
+        """Remove count records from the queue and return the arrival time of the oldest."""
+        oldest = self._arrivals[0][1]
+        remaining = count
+        while remaining:
+            segment = self._arrivals[0]
+            used = min(remaining, segment[0])
+            segment[0] -= used
+            remaining -= used
+            if segment[0] == 0:
+                self._arrivals.popleft()
+        self.pending -= count
+        return oldest
+
+    def done(self, count, oldest, now=None):
+        """Record a finished batch and adapt the batch size to the backlog."""
+        now = time.monotonic() if now is None else now
+        self._verdict_latencies.append(now - oldest)
+        self._batch_sizes.append(count)
+
+        if self.pending >= self.batch_size:
+            self.batch_size = min(self.batch_size * 2, self.max_batch)
+        elif count < self.batch_size // 2 and not self.pending:
+            self.batch_size = max(self.batch_size // 2, self.min_batch)
+
+    def stats(self):
+        """Queue depth, batch sizes and verdict latency in milliseconds."""
+        stats = {
+            "queue_depth": self.pending,
+            "queue_high_water": self.max_pending,
+            "batch_size_target": self.batch_size,
+            "batch_size_mean": float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+        }
+        if self._verdict_latencies:
+            p50, p99 = np.percentile(self._verdict_latencies, [50, 99]) * 1000
+            stats.update(verdict_latency_p50_ms=float(p50), verdict_latency_p99_ms=float(p99))
+        return stats
+
+    def print_report(self):
+        stats = self.stats()
+        print(f"\nQueue depth {stats['queue_depth']} (high water {stats['queue_high_water']}), "
+              f"batch size {stats['batch_size_target']} (mean {stats['batch_size_mean']:.1f})", end="")
+        if "verdict_latency_p50_ms" in stats:
+            print(f", verdict latency p50 {stats['verdict_latency_p50_ms']:.1f} ms "
+                  f"p99 {stats['verdict_latency_p99_ms']:.1f} ms", end="")
+        print()
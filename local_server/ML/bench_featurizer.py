@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Check that Featurizer matches the pandas reference pipeline in always_cli.py
+and compare their per-batch latency.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+
+from packet_ring import PACKET_DTYPE
+from featurizer import Featurizer
+from feature_transform import PROTOCOL_NAMES, fit_feature_transform
+from always_cli import packet_to_dataframe, preprocess_data
+
+
+def random_records(count, protocols=(1, 6, 17), rng=None):
+    """Build count packet records with random addresses, sizes and protocols."""
+    rng = rng or np.random.default_rng(0)
+    records = np.zeros(count, dtype=PACKET_DTYPE)
+    records["timestamp"] = int(time.time())
+    records["source_ip"] = rng.integers(0, 256, size=(count, 4))
+    records["dest_ip"] = rng.integers(0, 256, size=(count, 4))
+    records["packet_size"] = rng.integers(40, 1501, size=count)
+    records["protocol"] = rng.choice(protocols, size=count)
+    return records
+
+
+def reference(records):
+    return preprocess_data(packet_to_dataframe(records)).to_numpy(dtype=np.float32)
+
+
+def check_parity():
+    """Compare both paths on batches chosen to hit the edge cases."""
+    rng = np.random.default_rng(42)
+    cases = {
+        "single packet": random_records(1, rng=rng),
+        "two packets": random_records(2, rng=rng),
+        "full batch": random_records(100, rng=rng),
+        "one protocol": random_records(50, protocols=(6,), rng=rng),
+        "constant size": random_records(30, rng=rng),
+        "many protocols": random_records(200, protocols=tuple(range(20)), rng=rng),
+    }
+    cases["constant size"]["packet_size"] = 512
+
+    featurizer = Featurizer()
+    failures = 0
+    for name, records in cases.items():
+        expected = reference(records)
+        actual = featurizer(records)
+        ok = expected.shape == actual.shape and np.allclose(expected, actual, atol=1e-5)
+        failures += not ok
+        print(f"{name:>16}: {'ok' if ok else 'MISMATCH'} {actual.shape}")
+    return failures == 0
+
+
+def conn_log_frame(records):
+    """packet_to_dataframe() with the protocol spelled the way conn.log spells it."""
+    data = packet_to_dataframe(records)
+    data[6] = data[6].map(lambda p: PROTOCOL_NAMES.get(p, str(p)))
+    return data
+
+
+def check_transform_parity():
+    """Compare Featurizer with a fitted transform against transform_frame()."""
+    rng = np.random.default_rng(7)
+    transform = fit_feature_transform(conn_log_frame(random_records(1000, rng=rng)))
+    featurizer = Featurizer(transform=transform)
+
+    records = random_records(100, protocols=(1, 6, 17, 47), rng=rng)
+    expected = transform.transform_frame(conn_log_frame(records))
+    ok = np.allclose(expected, featurizer(records), atol=1e-5)
+
+    # A pre-fitted transform makes a packet's features independent of its batch
+    alone = featurizer(records[:1]).copy()
+    ok_alone = np.allclose(alone, featurizer(records)[:1])
+    print(f"{'fitted transform':>16}: {'ok' if ok else 'MISMATCH'}")
+    print(f"{'batch of one':>16}: {'ok' if ok_alone else 'MISMATCH'}")
+    return ok and ok_alone
+
+
+def time_per_batch(func, batches):
+    start = time.perf_counter()
+    for records in batches:
+        func(records)
+    return (time.perf_counter() - start) / len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and latency benchmark for Featurizer.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Records per batch (default: 100)")
+    parser.add_argument("--batches", type=int, default=200, help="Batches to time (default: 200)")
+    args = parser.parse_args()
+
+    print("Parity against packet_to_dataframe + preprocess_data:")
+    if not check_parity() or not check_transform_parity():
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    batches = [random_records(args.batch_size, rng=rng) for _ in range(args.batches)]
+    featurizer = Featurizer(args.batch_size)
+    fitted = Featurizer(args.batch_size, transform=fit_feature_transform(conn_log_frame(batches[0])))
+
+    pandas_time = time_per_batch(reference, batches)
+    numpy_time = time_per_batch(featurizer, batches)
+    fitted_time = time_per_batch(fitted, batches)
+    print(f"\nPer batch of {args.batch_size}:")
+    print(f"  pandas reference: {pandas_time * 1e6:10.1f} us")
+    print(f"  Featurizer:       {numpy_time * 1e6:10.1f} us  ({pandas_time / numpy_time:.0f}x faster)")
+    print(f"  with transform:   {fitted_time * 1e6:10.1f} us  ({pandas_time / fitted_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
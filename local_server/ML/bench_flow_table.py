@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Check that FlowTable keeps every flow's statistics to itself when it is
+full and has to evict, and time add() and collect() under that pressure.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+
+from packet_ring import HEADER_DTYPE
+from flow_table import FlowTable
+
+SERVER_IP = (192, 168, 1, 1)
+
+
+def client_packets(clients):
+    """
+    One packet from each client to the server. Every client sends packets of
+    its own size, 100 + its index, so any byte credited to the wrong flow shows.
+    """
+    packets = np.zeros(len(clients), dtype=HEADER_DTYPE)
+    packets["source_ip"] = np.stack([np.full(len(clients), 10), np.zeros(len(clients)),
+                                     clients // 256, clients % 256], axis=1)
+    packets["dest_ip"] = SERVER_IP
+    packets["source_port"] = 40000
+    packets["dest_port"] = 443
+    packets["protocol"] = 6
+    packets["packet_size"] = 100 + clients
+    return packets
+
+
+def misattributed(flows):
+    """Flows whose counts include packets of another flow."""
+    clients = flows["source_ip"][:, 2].astype(np.int64) * 256 + flows["source_ip"][:, 3]
+    wrong = (flows["resp_pkts"] != 0) | (flows["orig_bytes"] != flows["orig_pkts"] * (100 + clients))
+    return int(wrong.sum())
+
+
+def check_capacity_pressure(max_flows=8, clients=40, batches=500, batch_size=12):
+    """Random batches mixing flows already in the table with new ones, far more than it holds."""
+    rng = np.random.default_rng(12)
+    table = FlowTable(window=1.0, idle_timeout=1e9, max_flows=max_flows)
+    wrong = 0
+    for step in range(batches):
+        table.add(client_packets(rng.integers(0, clients, batch_size)), float(step))
+        wrong += misattributed(table.collect(float(step)))
+    wrong += misattributed(table._flows[table._in_use])
+    ok = wrong == 0 and table.overflow_evictions > 0
+    print(f"{'capacity pressure':>18}: {'ok' if ok else 'MISMATCH'} ({table.overflow_evictions} overflow evictions, "
+          f"{wrong} flows with another flow's packets)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eviction check and benchmark for FlowTable.")
+    parser.add_argument("--max-flows", type=int, default=16384, help="Table size to time (default: 16384)")
+    parser.add_argument("--flows", type=int, default=65536, help="Distinct flows in the traffic (default: 65536)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Packets per batch (default: 100)")
+    parser.add_argument("--batches", type=int, default=2000, help="Batches to time (default: 2000)")
+    args = parser.parse_args()
+
+    if not check_capacity_pressure():
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    batches = [client_packets(rng.integers(0, args.flows, args.batch_size)) for _ in range(args.batches)]
+    table = FlowTable(max_flows=args.max_flows)
+    start = time.perf_counter()
+    for step, packets in enumerate(batches):
+        table.add(packets, step * 0.01)
+        table.collect(step * 0.01)
+    elapsed = time.perf_counter() - start
+    print(f"\n{args.batches * args.batch_size / elapsed:,.0f} packets/s over {args.flows} flows "
+          f"in a {args.max_flows}-flow table, {table.overflow_evictions} overflow evictions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare packet ingestion from a named pipe: the old one-read-per-record path
+against PacketRing, with 1515-byte version 1 records, and PacketRing with
+version 2 compact records. Each path runs in its own process so the reported
+peak RSS belongs to that path alone.
+"""
+import os
+import sys
+import time
+import struct
+import argparse
+import resource
+import tempfile
+import subprocess
+from collections import deque
+from typing import NamedTuple
+
+from packet_ring import (PacketRing, PACKET_FORMAT, RECORD_SIZE, COMPACT_FORMAT, COMPACT_SIZE, RECORD_MAGIC,
+                         RECORD_VERSION, FLAG_PORTS)
+
+BATCH_SIZE = 100
+WRITE_CHUNK = 64
+
+
+class PacketData(NamedTuple):
+    timestamp: int
+    source_ip: bytes
+    dest_ip: bytes
+    packet_size: int
+    protocol: int
+    data: bytes
+
+
+def synthetic_records(count, compact=False):
+    """Build count packet records with varying addresses and sizes."""
+    records = bytearray()
+    for i in range(count):
+        src_ip, dst_ip = bytes([10, 0, i >> 8 & 255, i & 255]), bytes([192, 168, 1, i % 250])
+        if compact:
+            records += struct.pack(COMPACT_FORMAT, RECORD_MAGIC, RECORD_VERSION, FLAG_PORTS, int(time.time()),
+                                   src_ip, dst_ip, 64 + i % 1400, (6, 17)[i % 2], 0, 1024 + i, 443)
+        else:
+            records += struct.pack(PACKET_FORMAT, int(time.time()), src_ip, dst_ip, 64 + i % 1400,
+                                   (6, 17)[i % 2], bytes(1500))
+    return bytes(records)
+
+
+def feed(pipe_path, total, compact=False):
+    """Write total records into the pipe in WRITE_CHUNK sized writes."""
+    chunk = synthetic_records(WRITE_CHUNK, compact)
+    with open(pipe_path, "wb", buffering=0) as pipe:
+        for _ in range(total // WRITE_CHUNK):
+            pipe.write(chunk)
+
+
+def consume_legacy(fd):
+    """The original read_packet() loop: one os.read and struct.unpack per record."""
+    packet_buffer = deque(maxlen=BATCH_SIZE)
+    count = 0
+    while True:
+        raw_data = os.read(fd, RECORD_SIZE)
+        if not raw_data:
+            break
+        while len(raw_data) < RECORD_SIZE:
+            raw_data += os.read(fd, RECORD_SIZE - len(raw_data))
+        packet_buffer.append(PacketData(*struct.unpack(PACKET_FORMAT, raw_data)))
+        if len(packet_buffer) >= BATCH_SIZE:
+            count += len(packet_buffer)
+            packet_buffer.clear()
+    return count + len(packet_buffer)
+
+
+def consume_ring(fd):
+    """Drain the pipe through PacketRing, handing out batches as views."""
+    ring = PacketRing()
+    count = 0
+    while ring.fill(fd):
+        while len(ring) >= BATCH_SIZE:
+            packets = ring.take(BATCH_SIZE)
+            count += len(packets)
+            ring.release(packets)
+    packets = ring.take()
+    ring.release(packets)
+    return count + len(packets)
+
+
+def run_consumer(mode, pipe_path, total):
+    """Child process: consume total records and print the measurements."""
+    fd = os.open(pipe_path, os.O_RDONLY)
+    start = time.perf_counter()
+    count = consume_legacy(fd) if mode == "legacy" else consume_ring(fd)
+    elapsed = time.perf_counter() - start
+    os.close(fd)
+
+    if count != total:
+        print(f"{mode}: expected {total} records, got {count}", file=sys.stderr)
+        sys.exit(1)
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:>8}: {count / elapsed:12,.0f} records/s  {elapsed:7.3f} s  peak RSS {rss_mb:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark packet ingestion from a named pipe.")
+    parser.add_argument("--records", type=int, default=200_000, help="Records to push through the pipe")
+    parser.add_argument("--consumer", choices=["legacy", "ring", "compact"], help=argparse.SUPPRESS)
+    parser.add_argument("--pipe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    total = args.records - args.records % WRITE_CHUNK
+
+    if args.consumer:
+        run_consumer(args.consumer, args.pipe, total)
+        return
+
+    print(f"Pushing {total:,} records of {RECORD_SIZE} bytes (legacy, ring) "
+          f"or {COMPACT_SIZE} bytes (compact) through a FIFO")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("legacy", "ring", "compact"):
+            pipe_path = os.path.join(tmp, f"{mode}_pipe")
+            os.mkfifo(pipe_path)
+            consumer = subprocess.Popen([sys.executable, __file__, "--records", str(total),
+                                         "--consumer", mode, "--pipe", pipe_path])
+            feed(pipe_path, total, mode == "compact")
+            consumer.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compare verdict output into a named pipe: the old per-packet print,
+struct.pack and os.write against one packed buffer per batch. Each path
+runs in its own process and reports write syscalls (from /proc/self/io)
+and microseconds per verdict.
+"""
+import os
+import sys
+import time
+import errno
+import struct
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from always_cli import OUTPUT_FORMAT, OUTPUT_RECORD_SIZE, write_verdicts
+from packet_ring import HEADER_DTYPE
+from pipe_endpoints import OutputPipe
+
+BATCH_SIZE = 128
+ERROR_CHECK_INTERVAL = 0.01
+
+
+def write_syscalls():
+    with open("/proc/self/io") as io:
+        for line in io:
+            if line.startswith("syscw:"):
+                return int(line.split()[1])
+    return 0
+
+
+def synthetic_batch(count, rng):
+    packets = np.zeros(count, dtype=HEADER_DTYPE)
+    packets["source_ip"] = rng.integers(0, 256, size=(count, 4))
+    packets["dest_ip"] = rng.integers(0, 256, size=(count, 4))
+    return packets, rng.random(count, dtype=np.float32)
+
+
+def write_legacy(output_fd, packets, confidences):
+    """The original write_packet_data() loop: print, pack and write per verdict."""
+    for i, packet in enumerate(packets):
+        try:
+            print("Confidence in Write packet: ", confidences[i])
+            os.write(output_fd, struct.pack(OUTPUT_FORMAT, packet['source_ip'].tobytes(),
+                                            packet['dest_ip'].tobytes(), float(confidences[i])))
+        except BlockingIOError:
+            time.sleep(ERROR_CHECK_INTERVAL)
+        except OSError as e:
+            if e.errno not in (errno.EINTR, errno.EAGAIN):
+                raise
+            time.sleep(ERROR_CHECK_INTERVAL)
+
+
+def run(path, pipe_path, total):
+    """Child process: write total verdicts in BATCH_SIZE batches; stdout is the log."""
+    batch = synthetic_batch(BATCH_SIZE, np.random.default_rng(0))
+    output = OutputPipe(pipe_path)
+    while not output.open():
+        time.sleep(ERROR_CHECK_INTERVAL)
+    if path == "legacy":
+        write = lambda: write_legacy(output.fd, *batch)
+    else:
+        write = lambda: write_verdicts(output, *batch)
+
+    syscalls = write_syscalls()
+    start = time.perf_counter()
+    for _ in range(total // BATCH_SIZE):
+        write()
+    while output.wants_write():
+        output.flush()
+    sys.stdout.flush()
+    elapsed = time.perf_counter() - start
+    syscalls = write_syscalls() - syscalls
+
+    verdicts = total // BATCH_SIZE * BATCH_SIZE
+    print(f"{path:>8}: {verdicts / elapsed:>12,.0f} verdicts/s  {elapsed / verdicts * 1e6:7.2f} µs/verdict  "
+          f"{syscalls / verdicts:6.3f} write syscalls/verdict", file=sys.stderr)
+
+
+def drain(pipe_path):
+    """Read the pipe to the end and return the number of bytes seen."""
+    received = 0
+    with open(pipe_path, "rb", buffering=0) as pipe:
+        while True:
+            chunk = pipe.read(65536)
+            if not chunk:
+                return received
+            received += len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-packet against batched verdict output.")
+    parser.add_argument("--verdicts", type=int, default=200_000, help="Verdicts written per path (default: 200000)")
+    parser.add_argument("--path", choices=["legacy", "batched"], help=argparse.SUPPRESS)
+    parser.add_argument("--pipe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.path:
+        run(args.path, args.pipe, args.verdicts)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        pipe_path = os.path.join(directory, "analysis_pipe")
+        os.mkfifo(pipe_path)
+        for path in ("legacy", "batched"):
+            # The log is block buffered, as it is under docker
+            with tempfile.TemporaryFile() as log:
+                child = subprocess.Popen([sys.executable, __file__, "--path", path, "--pipe", pipe_path,
+                                          "--verdicts", str(args.verdicts)], stdout=log)
+                received = drain(pipe_path)
+                child.wait()
+                print(f"{'':>10}{received // OUTPUT_RECORD_SIZE} verdicts received, "
+                      f"{log.tell():,} bytes of log")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Compare the bulk pcap reader with the per-packet pyshark loop test.py
+used to label captures: packets per second for pyshark, for
+pcap_reader.read_pcap() in this process and in parallel chunks, and for
+featurizing the packets as the analyzer does.
+
+pyshark spawns tshark and builds an object per packet, so it only gets
+the first --pyshark-packets packets; it is skipped if pyshark or tshark
+is missing. Without a capture, a synthetic one of --synthetic packets is
+written first.
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from pcap_reader import read_pcap, PCAP_HEADER_SIZE, MICROSECOND_MAGIC, LINKTYPE_ETHERNET, ETHERTYPE_IPV4
+from pcap_features import packet_features
+
+SYNTHETIC_PACKETS = 1000000
+PYSHARK_PACKETS = 5000
+
+# One Ethernet/IPv4 frame with a 20-byte TCP header, or a UDP header and
+# padding, captured with a snap length that cuts it off there
+SYNTHETIC_FRAME_DTYPE = np.dtype([
+    ("seconds", "<u4"), ("microseconds", "<u4"), ("captured_length", "<u4"), ("original_length", "<u4"),
+    ("ethernet", "u1", (12,)), ("ethertype", ">u2"),
+    ("version_ihl", "u1"), ("tos", "u1"), ("total_length", ">u2"), ("ip_id", ">u2"), ("fragment", ">u2"),
+    ("ttl", "u1"), ("protocol", "u1"), ("checksum", ">u2"), ("source_ip", "u1", (4,)), ("dest_ip", "u1", (4,)),
+    ("source_port", ">u2"), ("dest_port", ">u2"), ("tcp", "u1", (9,)), ("tcp_flags", "u1"), ("tcp_rest", "u1", (6,)),
+])
+
+
+def write_synthetic_pcap(path, packets, seed=0):
+    """A classic pcap of TCP and UDP packets between random hosts, written in one go."""
+    rng = np.random.default_rng(seed)
+    frames = np.zeros(packets, dtype=SYNTHETIC_FRAME_DTYPE)
+    frames["seconds"] = 1700000000 + np.arange(packets) // 1000
+    frames["microseconds"] = np.arange(packets) % 1000 * 1000
+    frames["captured_length"] = SYNTHETIC_FRAME_DTYPE.itemsize - 16
+    frames["original_length"] = rng.integers(60, 1515, packets)
+    frames["ethertype"] = ETHERTYPE_IPV4
+    frames["version_ihl"] = 0x45
+    frames["total_length"] = frames["original_length"] - 14
+    frames["ttl"] = 64
+    frames["protocol"] = rng.choice([6, 17], packets, p=[0.8, 0.2])
+    frames["source_ip"] = np.stack([np.full(packets, 10), np.zeros(packets), rng.integers(0, 256, packets),
+                                    rng.integers(1, 255, packets)], axis=1)
+    frames["dest_ip"] = rng.integers(1, 255, (packets, 4))
+    frames["source_port"] = rng.integers(1024, 65536, packets)
+    frames["dest_port"] = rng.choice([53, 80, 443, 8080], packets)
+    frames["tcp_flags"] = np.where(frames["protocol"] == 6, rng.choice([0x02, 0x10, 0x18], packets), 0)
+    header = np.array([MICROSECOND_MAGIC, 0x00040002, 0, 0, 65535, LINKTYPE_ETHERNET], dtype="<u4")
+    assert header.nbytes == PCAP_HEADER_SIZE
+    with open(path, "wb") as capture:
+        header.tofile(capture)
+        frames.tofile(capture)
+
+
+def pyshark_rate(path, limit):
+    """Packets per second for test.py's old pyshark loop over the first limit packets."""
+    try:
+        import pyshark
+    except ImportError:
+        return None, "pyshark is not installed"
+
+    capture = pyshark.FileCapture(path)
+    packet_data = []
+    start = time.perf_counter()
+    try:
+        for packet in capture:
+            try:
+                packet_data.append({
+                    'duration': float(packet.sniff_time.timestamp()),
+                    'protocol_type': packet.highest_layer,
+                    'service': packet.transport_layer if hasattr(packet, 'transport_layer') else 'unknown',
+                    'flag': packet.tcp.flags if hasattr(packet, 'tcp') else 0,
+                    'src_bytes': int(packet.length),
+                    'dst_bytes': 0,
+                    'land': 1 if packet.ip.src == packet.ip.dst else 0,
+                })
+            except AttributeError:
+                pass
+            if len(packet_data) >= limit:
+                break
+    except Exception as e:  # tshark missing or failing
+        return None, str(e)
+    finally:
+        capture.close()
+    return len(packet_data) / (time.perf_counter() - start), None
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the bulk pcap reader with pyshark.")
+    parser.add_argument("capture", type=str, nargs="?", help="Classic pcap capture to read (default: synthetic).")
+    parser.add_argument("--synthetic", type=int, default=SYNTHETIC_PACKETS,
+                        help=f"Packets in the synthetic capture (default: {SYNTHETIC_PACKETS}).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes for the parallel read (default: one per CPU).")
+    parser.add_argument("--pyshark-packets", type=int, default=PYSHARK_PACKETS,
+                        help=f"Packets pyshark reads; 0 skips it (default: {PYSHARK_PACKETS}).")
+    parser.add_argument("--json", type=str, help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.capture
+        if path is None:
+            path = os.path.join(tmp, "synthetic.pcap")
+            write_synthetic_pcap(path, args.synthetic)
+        size_mb = os.path.getsize(path) / 2**20
+
+        # Once untimed, so every run below finds the file in the page cache
+        packets, frames = read_pcap(path)
+        results = {"capture": args.capture or "synthetic", "size_mb": size_mb, "frames": frames,
+                   "packets": len(packets), "cpus": os.cpu_count()}
+        _, seconds = timed(read_pcap, path)
+        results["read_pps"] = len(packets) / seconds
+        if args.workers > 1:
+            (parallel, _), seconds = timed(read_pcap, path, args.workers)
+            assert np.array_equal(parallel, packets)
+            results["parallel_read_pps"] = len(packets) / seconds
+        _, seconds = timed(packet_features, packets)
+        results["featurize_pps"] = len(packets) / seconds
+
+        results["pyshark_pps"], skipped = (None, "skipped") if not args.pyshark_packets else \
+            pyshark_rate(path, args.pyshark_packets)
+
+    print(f"{results['capture']}: {size_mb:,.1f} MB, {len(packets):,} IPv4 packets in {frames:,} frames, "
+          f"{results['cpus']} CPUs")
+    print(f"  read_pcap:                {results['read_pps']:>12,.0f} packets/s")
+    if "parallel_read_pps" in results:
+        print(f"  read_pcap, {args.workers} workers:     {results['parallel_read_pps']:>12,.0f} packets/s")
+    print(f"  featurize:                {results['featurize_pps']:>12,.0f} packets/s")
+    if results["pyshark_pps"] is None:
+        print(f"  pyshark:                  not run ({skipped})")
+    else:
+        print(f"  pyshark:                  {results['pyshark_pps']:>12,.0f} packets/s "
+              f"(read_pcap is {results['read_pps'] / results['pyshark_pps']:,.0f}x faster)")
+    if args.json:
+        with open(args.json, "w") as report:
+            json.dump(results, report, indent=2)
+
+
+if __name__ == "__main__":
+    main()
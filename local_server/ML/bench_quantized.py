@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Compare the int8 model from quantize_model.py with the float NumPy model it
+was quantized from: accuracy and AUC on labeled conn.log samples, how often
+the two agree, throughput per batch bucket, cold start time, peak RSS and
+model size. Each runtime is measured in a fresh process.
+
+Without --data the features are random, so only agreement, speed and
+memory are reported.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+START = time.perf_counter()
+
+import numpy as np
+
+from latency import DEFAULT_BUCKETS
+
+RUNTIMES = ("numpy", "int8")
+EVALUATION_SAMPLES = 20000
+
+
+def prepare(data_path, model_path, transform_path, samples, features_path):
+    """Child process: featurize the labeled samples, so the runtimes' processes never load pandas."""
+    from quantize_model import load_samples
+    from feature_transform import load_feature_transform, transform_path_for
+
+    transform_path = transform_path or transform_path_for(model_path)
+    transform = load_feature_transform(transform_path) if os.path.exists(transform_path) else None
+    features, labels = load_samples(data_path, transform, samples, seed=1)
+    np.savez(features_path, features=features, labels=labels)
+
+
+def load(runtime, model_path):
+    if runtime == "int8":
+        from tflite_model import load_tflite_model
+        return load_tflite_model(model_path)
+    from numpy_model import load_numpy_model
+    return load_numpy_model(model_path)
+
+
+def run_benchmark(runtime, model_path, features_path, predictions_path, seconds):
+    """Child process: score every sample, then time each batch bucket."""
+    engine = load(runtime, model_path)
+    with np.load(features_path) as samples:
+        features = samples["features"]
+    engine.predict(features[:1])
+    cold_start = time.perf_counter() - START
+
+    np.save(predictions_path, engine.predict(features))
+
+    throughput = []
+    for batch_size in DEFAULT_BUCKETS:
+        batch = np.ascontiguousarray(features[:batch_size])
+        rows = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            engine.predict(batch)
+            rows += batch_size
+        throughput.append(rows / (time.perf_counter() - start))
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    size_kb = os.path.getsize(model_path) / 1024
+    rates = "  ".join(f"batch {b}: {r:>10,.0f} rows/s" for b, r in zip(DEFAULT_BUCKETS, throughput))
+    print(f"{runtime:>6}: model {size_kb:6.1f} KB  cold start {cold_start:6.2f} s  peak RSS {rss_mb:7.1f} MB  {rates}")
+
+
+def print_quality(predictions, labels, threshold):
+    """Accuracy and AUC per runtime, and how far int8 is from the float model."""
+    float_scores, int8_scores = predictions["numpy"], predictions["int8"]
+    if labels is not None:
+        from sklearn.metrics import roc_auc_score
+        for runtime in RUNTIMES:
+            scores = predictions[runtime]
+            accuracy = np.mean((scores >= threshold) == labels)
+            auc = roc_auc_score(labels, scores) if 0 < labels.sum() < len(labels) else float("nan")
+            print(f"{runtime:>6}: accuracy {accuracy:.4f} at {threshold}  AUC {auc:.4f}")
+
+    difference = np.abs(int8_scores - float_scores)
+    agreement = np.mean((int8_scores >= threshold) == (float_scores >= threshold))
+    print(f"int8 vs float over {len(float_scores):,} samples: same verdict at {threshold} for {agreement:.2%}, "
+          f"confidence difference mean {difference.mean():.4f}, max {difference.max():.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the int8 model with the float NumPy model.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("--data", type=str, help="Headerless labeled conn.log CSV to evaluate on.")
+    parser.add_argument("--samples", type=int, default=EVALUATION_SAMPLES,
+                        help=f"Random rows of --data to evaluate on (default: {EVALUATION_SAMPLES}).")
+    parser.add_argument("--numpy-model", type=str, help="Path to the float .npz (default: next to the model).")
+    parser.add_argument("--int8-model", type=str, help="Path to the int8 .tflite (default: next to the model).")
+    parser.add_argument("--transform", type=str, help="Path to the fitted feature transform (default: next to the model).")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Confidence at which a verdict counts as malicious.")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per batch size (default: 2)")
+    parser.add_argument("--runtime", choices=RUNTIMES, help=argparse.SUPPRESS)
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--features", help=argparse.SUPPRESS)
+    parser.add_argument("--predictions", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from numpy_model import numpy_model_path_for
+    from tflite_model import tflite_model_path_for
+    paths = {
+        "numpy": args.numpy_model or numpy_model_path_for(args.model),
+        "int8": args.int8_model or tflite_model_path_for(args.model),
+    }
+
+    if args.prepare:
+        prepare(args.data, args.model, args.transform, args.samples, args.features)
+        return
+    if args.runtime:
+        run_benchmark(args.runtime, paths[args.runtime], args.features, args.predictions, args.seconds)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        features_path = os.path.join(tmp, "features.npz")
+        if args.data:
+            # pandas stays out of this process: peak RSS survives exec, so the children would report it
+            subprocess.run([sys.executable, __file__, args.model, "--prepare", "--data", args.data,
+                            "--samples", str(args.samples), "--features", features_path]
+                           + (["--transform", args.transform] if args.transform else []), check=True)
+        else:
+            from numpy_model import load_weights
+            kernels, _, _ = load_weights(paths["numpy"])
+            features = np.random.default_rng(0).normal(size=(args.samples, kernels[0].shape[0])).astype(np.float32)
+            np.savez(features_path, features=features, labels=np.zeros(0, dtype=np.int32))
+
+        predictions = {}
+        for runtime in RUNTIMES:
+            predictions_path = os.path.join(tmp, f"{runtime}.npy")
+            subprocess.run([sys.executable, __file__, args.model, "--runtime", runtime, "--features", features_path,
+                            "--predictions", predictions_path, "--seconds", str(args.seconds),
+                            "--numpy-model", paths["numpy"], "--int8-model", paths["int8"]], check=True)
+            predictions[runtime] = np.load(predictions_path)
+
+        with np.load(features_path) as samples:
+            labels = samples["labels"] if args.data else None
+    print_quality(predictions, labels, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
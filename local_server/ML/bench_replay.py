@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+End-to-end replay benchmark: feeder.py writes packet records into
+always_cli.py, whose verdicts reader.py receives, all over temporary FIFOs.
+
+The feeder replays a conn.log CSV, a pcap capture or synthetic traffic at
+increasing rates. Every record is timestamped when the feeder writes it and
+again when the reader receives its verdict, so each step reports the rate
+reached, loss, verdict latency percentiles and the CPU use and RSS of each
+process.
+The highest rate the feeder kept up with, with nothing lost, is the maximum
+sustainable rate. The results go to a JSON and a CSV report, so versions
+can be compared.
+
+CPU and RSS are read from /proc, so this runs on Linux only.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shlex
+import signal
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from feeder import SEND_LOG_DTYPE
+from reader import RECEIVE_LOG_DTYPE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RATES = "500,1000,2000,5000,10000,20000"
+STEP_SECONDS = 5.0
+SYNTHETIC_ROWS = 20000
+WARMUP_RECORDS = 200
+STARTUP_TIMEOUT = 120.0  # the keras runtime imports TensorFlow before its first verdict
+DRAIN_TIMEOUT = 2.0      # verdicts still missing this long after the last one count as lost
+POLL_INTERVAL = 0.05
+KEPT_UP = 0.95           # fraction of the requested rate the feeder has to reach
+LOSS_TOLERANCE = 0.001
+PROCESSES = ("feeder", "analyzer", "reader")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def write_synthetic_csv(path, rows, seed=0):
+    """A headerless conn.log-shaped CSV with a different address pair on every row."""
+    rng = np.random.default_rng(seed)
+    index = np.arange(rows)
+    data = pd.DataFrame({
+        0: 0.0,
+        1: "C" + pd.Series(index).astype(str),
+        2: [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in index],
+        3: rng.integers(1024, 65536, size=rows),
+        4: [f"192.168.{a}.{b}" for a, b in rng.integers(0, 256, size=(rows, 2))],
+        5: rng.choice([53, 80, 443, 8080], size=rows),
+        6: rng.choice([6, 17], size=rows),
+        7: "-",
+        8: rng.integers(40, 1500, size=rows),
+    })
+    data.to_csv(path, header=False, index=False)
+
+
+def process_tree(pid):
+    """pid and its children, e.g. the analyzer's inference workers."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [pid] + [int(child) for child in children.read().split()]
+    except OSError:
+        return [pid]
+
+
+def cpu_seconds(pid):
+    """User and system CPU time used so far by pid and its children."""
+    total = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        total += int(fields[11]) + int(fields[12])  # utime and stime
+    return total / CLOCK_TICKS
+
+
+def memory_mb(pid):
+    """Current and peak RSS of pid and its children, in MB."""
+    current = peak = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        current += int(line.split()[1])
+                    elif line.startswith("VmHWM:"):
+                        peak += int(line.split()[1])
+        except OSError:
+            continue
+    return current / 1024, peak / 1024
+
+
+def log_entries(path, dtype, start=0):
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    return np.fromfile(path, dtype=dtype, offset=start * dtype.itemsize)
+
+
+def log_length(path, dtype):
+    return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+
+def pair_keys(entries):
+    source = np.ascontiguousarray(entries["source_ip"]).view(">u4").ravel().astype(np.uint64)
+    dest = np.ascontiguousarray(entries["dest_ip"]).view(">u4").ravel().astype(np.uint64)
+    return source << np.uint64(32) | dest
+
+
+def latencies(sent, received):
+    """
+    Seconds from each record being written to its verdict arriving. Verdicts
+    carry no sequence number, so the n-th verdict for an address pair is
+    matched to the n-th record sent with it.
+    """
+    sent = pd.DataFrame({"key": pair_keys(sent), "sent": sent["time"]})
+    received = pd.DataFrame({"key": pair_keys(received), "received": received["time"]})
+    sent["n"] = sent.groupby("key").cumcount()
+    received["n"] = received.groupby("key").cumcount()
+    matched = sent.merge(received, on=["key", "n"])
+    return (matched["received"] - matched["sent"]).to_numpy()
+
+
+def start(script, arguments, output):
+    return subprocess.Popen([sys.executable, os.path.join(HERE, script), *arguments],
+                            stdout=output, stderr=subprocess.STDOUT, cwd=HERE)
+
+
+def stop(process, timeout=5.0):
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def wait_for_verdicts(path, count, timeout):
+    """Wait until path holds count verdicts, or none has arrived for timeout seconds. Returns how many it holds."""
+    received = log_length(path, RECEIVE_LOG_DTYPE)
+    last_progress = time.monotonic()
+    while received < count and time.monotonic() - last_progress < timeout:
+        time.sleep(POLL_INTERVAL)
+        now_received = log_length(path, RECEIVE_LOG_DTYPE)
+        if now_received != received:
+            received, last_progress = now_received, time.monotonic()
+    return received
+
+
+def run_step(rate, seconds, data_path, pipes, logs, analyzer, reader):
+    """Feed rate records/s for seconds and measure what comes out the other end."""
+    limit = max(1, int(rate * seconds))
+    sent_before = log_length(logs["sent"], SEND_LOG_DTYPE)
+    received_before = log_length(logs["received"], RECEIVE_LOG_DTYPE)
+
+    feeder = start("feeder.py", [data_path, "--pipe", pipes["input"], "--pps", str(rate), "--loop",
+                                 "--limit", str(limit), "--timestamp-log", logs["sent"]], subprocess.DEVNULL)
+    # Measure from the first record on, leaving out the feeder's own startup
+    while log_length(logs["sent"], SEND_LOG_DTYPE) == sent_before and feeder.poll() is None:
+        time.sleep(POLL_INTERVAL / 10)
+    started = time.monotonic()
+    feeder_before = cpu_seconds(feeder.pid)
+    before = {"analyzer": cpu_seconds(analyzer.pid), "reader": cpu_seconds(reader.pid)}
+
+    _, status, usage = os.wait4(feeder.pid, 0)
+    feeder.returncode = os.waitstatus_to_exitcode(status)
+    sent = log_entries(logs["sent"], SEND_LOG_DTYPE, sent_before)
+    wait_for_verdicts(logs["received"], received_before + len(sent), DRAIN_TIMEOUT)
+    elapsed = time.monotonic() - started
+    received = log_entries(logs["received"], RECEIVE_LOG_DTYPE, received_before)
+
+    cpu = {
+        "feeder": usage.ru_utime + usage.ru_stime - feeder_before,
+        "analyzer": cpu_seconds(analyzer.pid) - before["analyzer"],
+        "reader": cpu_seconds(reader.pid) - before["reader"],
+    }
+    memory = {
+        "feeder": (usage.ru_maxrss / 1024, usage.ru_maxrss / 1024),
+        "analyzer": memory_mb(analyzer.pid),
+        "reader": memory_mb(reader.pid),
+    }
+
+    sending_time = sent["time"][-1] - sent["time"][0] if len(sent) > 1 else 0.0
+    achieved = (len(sent) - 1) / sending_time if sending_time > 0 else 0.0
+    latency_ms = latencies(sent, received) * 1000
+    lost = max(0, len(sent) - len(latency_ms))
+
+    result = {
+        "rate": rate,
+        "sent": len(sent),
+        "achieved_pps": round(achieved, 1),
+        "received": len(received),
+        "lost": lost,
+        "loss": round(lost / len(sent), 6) if len(sent) else 0.0,
+    }
+    for percentile in (50, 95, 99):
+        result[f"p{percentile}_ms"] = round(float(np.percentile(latency_ms, percentile)), 3) if len(latency_ms) else None
+    result["max_ms"] = round(float(latency_ms.max()), 3) if len(latency_ms) else None
+    for name in PROCESSES:
+        result[f"{name}_cpu_percent"] = round(100 * cpu[name] / elapsed, 1)
+        result[f"{name}_rss_mb"] = round(memory[name][0], 1)
+        result[f"{name}_peak_rss_mb"] = round(memory[name][1], 1)
+    return result
+
+
+def sustained(result, latency_slo_ms):
+    if result["achieved_pps"] < KEPT_UP * result["rate"] or result["loss"] > LOSS_TOLERANCE:
+        return False
+    return latency_slo_ms is None or (result["p99_ms"] is not None and result["p99_ms"] <= latency_slo_ms)
+
+
+def print_step(result):
+    latency = "  ".join(f"p{p} {result[f'p{p}_ms'] or 0:7.2f} ms" for p in (50, 95, 99))
+    cpu = "  ".join(f"{name} {result[f'{name}_cpu_percent']:5.1f}%/{result[f'{name}_rss_mb']:.0f} MB"
+                    for name in PROCESSES)
+    verdict = "ok" if result["sustained"] else "NOT SUSTAINED"
+    print(f"{result['rate']:>8,} pps: sent {result['achieved_pps']:>10,.0f} pps  lost {result['loss']:7.2%}  "
+          f"{latency}  {cpu}  {verdict}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic through feeder, analyzer and reader at increasing rates.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("--data", type=str, help="Headerless conn.log CSV or pcap capture to replay (default: synthetic traffic).")
+    parser.add_argument("--rates", type=str, default=DEFAULT_RATES,
+                        help=f"Comma-separated packet rates to step through (default: {DEFAULT_RATES}).")
+    parser.add_argument("--seconds", type=float, default=STEP_SECONDS,
+                        help=f"Time spent at each rate (default: {STEP_SECONDS:.0f}).")
+    parser.add_argument("--analyzer-args", type=str, default="--runtime numpy",
+                        help="Extra always_cli.py options, e.g. \"--runtime keras\" (default: \"--runtime numpy\").")
+    parser.add_argument("--latency-slo-ms", type=float,
+                        help="Also count a rate as not sustained when its p99 latency exceeds this.")
+    parser.add_argument("--keep-going", action="store_true", help="Keep stepping up after a rate is not sustained.")
+    parser.add_argument("--json", type=str, default="replay_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--csv", type=str, default="replay_report.csv", help="Where to write the CSV report.")
+    args = parser.parse_args()
+    rates = [int(rate) for rate in args.rates.split(",")]
+    analyzer_args = shlex.split(args.analyzer_args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pipes = {"input": os.path.join(tmp, "packet_pipe"), "output": os.path.join(tmp, "analysis_pipe")}
+        logs = {"sent": os.path.join(tmp, "sent.log"), "received": os.path.join(tmp, "received.log")}
+        data_path = args.data
+        if data_path is None:
+            data_path = os.path.join(tmp, "synthetic.csv")
+            write_synthetic_csv(data_path, SYNTHETIC_ROWS)
+        os.mkfifo(pipes["input"])
+
+        analyzer_log = open(os.path.join(tmp, "analyzer.log"), "w")
+        analyzer = start("always_cli.py", [os.path.abspath(args.model), *analyzer_args, "--emit-all",
+                                           "--transport", "fifo", "--input-pipe", pipes["input"],
+                                           "--output-pipe", pipes["output"]], analyzer_log)
+        while not os.path.exists(pipes["output"]) and analyzer.poll() is None:
+            time.sleep(POLL_INTERVAL)
+        reader = start("reader.py", ["--pipe", pipes["output"], "--quiet", "--timestamp-log", logs["received"]],
+                       subprocess.DEVNULL)
+
+        results = []
+        try:
+            # Leave the model load out of the first step
+            feeder = start("feeder.py", [data_path, "--pipe", pipes["input"], "--pps", "1000",
+                                         "--limit", str(WARMUP_RECORDS)], subprocess.DEVNULL)
+            feeder.wait()
+            if wait_for_verdicts(logs["received"], WARMUP_RECORDS, STARTUP_TIMEOUT) < WARMUP_RECORDS:
+                analyzer_log.flush()
+                with open(analyzer_log.name) as output:
+                    print(output.read()[-2000:])
+                sys.exit("The analyzer did not return verdicts for the warm-up records")
+
+            print(f"{os.cpu_count()} CPUs, analyzer {' '.join(analyzer_args)}, "
+                  f"{'synthetic traffic' if args.data is None else args.data}, {args.seconds:.0f} s per rate")
+            for rate in rates:
+                result = run_step(rate, args.seconds, data_path, pipes, logs, analyzer, reader)
+                result["sustained"] = sustained(result, args.latency_slo_ms)
+                results.append(result)
+                print_step(result)
+                if not result["sustained"] and not args.keep_going:
+                    break
+        finally:
+            stop(reader)
+            stop(analyzer)
+            analyzer_log.close()
+
+    kept_up = [result["achieved_pps"] for result in results if result["sustained"]]
+    report = {
+        "revision": git_revision(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpus": os.cpu_count(),
+        "analyzer_args": analyzer_args,
+        "data": args.data or "synthetic",
+        "seconds_per_rate": args.seconds,
+        "latency_slo_ms": args.latency_slo_ms,
+        "max_sustainable_pps": max(kept_up) if kept_up else 0.0,
+        "steps": results,
+    }
+    with open(args.json, "w") as output:
+        json.dump(report, output, indent=2)
+    if results:
+        with open(args.csv, "w", newline="") as output:
+            writer = csv.DictWriter(output, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    print(f"Max sustainable rate: {report['max_sustainable_pps']:,.0f} pps. Wrote {args.json} and {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
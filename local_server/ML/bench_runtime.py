@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Check that the NumPy runtime matches Keras and compare the two on cold start
+time, peak RSS and rows/s. Each runtime is measured in a fresh process.
+"""
+import sys
+import time
+import argparse
+import resource
+import subprocess
+
+START = time.perf_counter()
+
+import numpy as np
+
+BATCH_SIZES = (1, 100, 1024)
+
+
+def load(runtime, model_path, numpy_path):
+    if runtime == "numpy":
+        from numpy_model import load_numpy_model
+        return load_numpy_model(numpy_path)
+
+    import tensorflow as tf
+    from inference import InferenceEngine
+    model = tf.keras.models.load_model(model_path)
+    return InferenceEngine(model, model.input_shape[-1])
+
+
+def check_equivalence(model_path, numpy_path, rows=4096, tolerance=1e-4):
+    """Compare NumPy outputs with model.predict() on random and extreme inputs."""
+    import tensorflow as tf
+    from numpy_model import load_numpy_model
+
+    model = tf.keras.models.load_model(model_path)
+    numpy_model = load_numpy_model(numpy_path)
+
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(rows, model.input_shape[-1])).astype(np.float32)
+    features[:64] *= 100
+
+    expected = model.predict(features, verbose=0).reshape(-1)
+    actual = numpy_model.predict(features)
+    error = np.abs(expected - actual).max()
+    print(f"Max abs difference over {rows} rows: {error:.2e} (tolerance {tolerance:.0e})")
+    return error <= tolerance
+
+
+def run_benchmark(runtime, model_path, numpy_path, seconds):
+    """Child process: time the first prediction and then steady-state throughput."""
+    engine = load(runtime, model_path, numpy_path)
+    features = np.random.default_rng(0).normal(size=(max(BATCH_SIZES), engine.n_features)).astype(np.float32)
+    engine.predict(features[:1])
+    cold_start = time.perf_counter() - START
+
+    throughput = []
+    for batch_size in BATCH_SIZES:
+        rows = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            engine.predict(features[:batch_size])
+            rows += batch_size
+        throughput.append(rows / (time.perf_counter() - start))
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rates = "  ".join(f"batch {b}: {r:>10,.0f} rows/s" for b, r in zip(BATCH_SIZES, throughput))
+    print(f"{runtime:>6}: cold start {cold_start:6.2f} s  peak RSS {rss_mb:7.1f} MB  {rates}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Keras and NumPy inference runtimes.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("numpy_model", type=str, nargs="?", help="Path to the exported .npz (default: next to the model).")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per batch size (default: 2)")
+    parser.add_argument("--runtime", choices=["keras", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from numpy_model import numpy_model_path_for
+    numpy_path = args.numpy_model or numpy_model_path_for(args.model)
+
+    if args.runtime:
+        run_benchmark(args.runtime, args.model, numpy_path, args.seconds)
+        return
+
+    # Benchmark before loading TensorFlow here: peak RSS survives exec, so
+    # children started afterwards would report the parent's peak
+    for runtime in ("keras", "numpy"):
+        subprocess.run([sys.executable, __file__, args.model, numpy_path,
+                        "--seconds", str(args.seconds), "--runtime", runtime], check=True)
+
+    if not check_equivalence(args.model, numpy_path):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Compare the two packet transports from the forwarder: the FIFO drained
+through PacketRing against the shared-memory ring. This process produces
+the records, by default one per write like the forwarder does, and a child
+process consumes them. Both sides report their time per record.
+
+The producer is Python, so with --chunk 1 its own per-call overhead is most
+of the ring's producer time; in the forwarder a push is one memcpy.
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+from packet_ring import PacketRing, COMPACT_DTYPE, COMPACT_SIZE, RECORD_MAGIC, RECORD_VERSION, FLAG_PORTS
+from shm_ring import SharedPacketRing, SharedRingWriter, DEFAULT_SLOTS
+
+BATCH_SIZE = 100
+WAIT_TIMEOUT = 1.0
+
+
+def synthetic_records(count):
+    """Build count packet records with varying addresses and sizes."""
+    records = np.zeros(count, dtype=COMPACT_DTYPE)
+    index = np.arange(count)
+    records["magic"] = RECORD_MAGIC
+    records["version"] = RECORD_VERSION
+    records["flags"] = FLAG_PORTS
+    records["timestamp"] = int(time.time())
+    records["source_ip"] = np.stack([np.full(count, 10), np.zeros(count), index >> 8 & 255, index & 255], axis=1)
+    records["dest_ip"] = np.stack([np.full(count, 192), np.full(count, 168), np.ones(count), index % 250], axis=1)
+    records["packet_size"] = 64 + index % 1400
+    records["protocol"] = np.where(index % 2, 17, 6)
+    records["source_port"] = 1024 + index % 60000
+    records["dest_port"] = 443
+    return records
+
+
+def feed_fifo(path, total, chunk_size):
+    chunk = synthetic_records(chunk_size).tobytes()
+    fd = os.open(path, os.O_WRONLY)
+    for _ in range(total // chunk_size):
+        os.write(fd, chunk)
+    os.close(fd)
+
+
+def feed_shm(writer, total, chunk_size):
+    """Push total records, retrying what does not fit. Returns how often the ring was full."""
+    chunk = synthetic_records(chunk_size)
+    full = 0
+    for _ in range(total // chunk_size):
+        pushed = writer.push(chunk)
+        while pushed < chunk_size:
+            full += 1
+            time.sleep(0)
+            pushed += writer.push(chunk[pushed:])
+    return full
+
+
+def report_producer(transport, total, elapsed, extra=""):
+    print(f"{'':>7}producer {elapsed / total * 1e6:6.2f} µs/record{extra}")
+
+
+def consume_fifo(path, total):
+    fd = os.open(path, os.O_RDONLY)
+    ring = PacketRing()
+    count = 0
+    while count < total and ring.fill(fd):
+        while len(ring):
+            packets = ring.take(BATCH_SIZE)
+            count += len(packets)
+            ring.release(packets)
+    os.close(fd)
+    return count
+
+
+def consume_shm(path, total):
+    ring = SharedPacketRing(path)
+    if not ring.open():
+        sys.exit(1)
+    count = 0
+    while count < total:
+        # Sleep until a batch is ready, as the analyzer does
+        ring.wait(WAIT_TIMEOUT, min(BATCH_SIZE, total - count))
+        if not len(ring):
+            break
+        while len(ring):
+            packets = ring.take(BATCH_SIZE)
+            count += len(packets)
+            ring.release(packets)
+    ring.close()
+    return count
+
+
+def run_consumer(transport, path, total):
+    """Child process: consume total records and print the measurements."""
+    start = time.perf_counter()
+    count = consume_shm(path, total) if transport == "shm" else consume_fifo(path, total)
+    elapsed = time.perf_counter() - start
+    if count != total:
+        print(f"{transport}: expected {total} records, got {count}", file=sys.stderr)
+        sys.exit(1)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = usage.ru_utime + usage.ru_stime
+    print(f"{transport:>5}: {count / elapsed:12,.0f} records/s  {elapsed:7.3f} s  "
+          f"{cpu / count * 1e6:6.2f} µs CPU/record in the consumer")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FIFO against the shared-memory packet ring.")
+    parser.add_argument("--records", type=int, default=200_000, help="Records to push through each transport")
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="Slots in the shared-memory ring")
+    parser.add_argument("--chunk", type=int, default=1, help="Records per write or push (default: 1)")
+    parser.add_argument("--consumer", choices=["fifo", "shm"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    total = args.records - args.records % args.chunk
+
+    if args.consumer:
+        run_consumer(args.consumer, args.path, total)
+        return
+
+    print(f"Pushing {total:,} records of {COMPACT_SIZE} bytes through each transport")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "packet_log_pipe")
+        os.mkfifo(path)
+        consumer = subprocess.Popen([sys.executable, __file__, "--records", str(total),
+                                     "--consumer", "fifo", "--path", path])
+        start = time.perf_counter()
+        feed_fifo(path, total, args.chunk)
+        elapsed = time.perf_counter() - start
+        consumer.wait()
+        report_producer("fifo", total, elapsed)
+
+        path = os.path.join(tmp, "packet_ring")
+        writer = SharedRingWriter(path, args.slots)
+        consumer = subprocess.Popen([sys.executable, __file__, "--records", str(total),
+                                     "--consumer", "shm", "--path", path])
+        start = time.perf_counter()
+        full = feed_shm(writer, total, args.chunk)
+        elapsed = time.perf_counter() - start
+        consumer.wait()
+        writer.close()
+        report_producer("shm", total, elapsed, f", ring of {args.slots} slots was full {full:,} times")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure how verdict throughput scales with the number of inference worker
+processes. Batches of synthetic packet headers are dispatched through a
+WorkerPool exactly as always_cli.py --workers does, minus the FIFOs.
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+
+from packet_ring import HEADER_DTYPE
+from workers import WorkerPool
+from batcher import MAX_BATCH_SIZE
+from always_cli import OUTPUT_RECORD_SIZE
+
+
+def synthetic_headers(count, rng):
+    headers = np.zeros(count, dtype=HEADER_DTYPE)
+    headers["source_ip"] = rng.integers(0, 256, size=(count, 4))
+    headers["dest_ip"] = rng.integers(0, 256, size=(count, 4))
+    headers["packet_size"] = rng.integers(40, 1500, size=count)
+    headers["protocol"] = rng.choice([1, 6, 17], size=count)
+    return headers
+
+
+def run(workers, options, batch_size, seconds):
+    verdicts = 0
+
+    def on_verdicts(data):
+        nonlocal verdicts
+        verdicts += len(data) // OUTPUT_RECORD_SIZE
+
+    pool = WorkerPool(workers, options, on_verdicts)
+    pool.start()
+    batches = [synthetic_headers(batch_size, np.random.default_rng(i)) for i in range(16)]
+    try:
+        dispatched = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            pool.dispatch(batches[dispatched % len(batches)], time.monotonic())
+            dispatched += 1
+            for worker in pool.workers:
+                pool.receive(worker)
+        # Collect what is still in flight
+        while any(worker.in_flight for worker in pool.workers):
+            for worker in pool.workers:
+                pool.receive(worker, timeout=0.01)
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.stop()
+    return verdicts / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput at 1 to N inference workers.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("--runtime", choices=["keras", "numpy"], default="numpy")
+    parser.add_argument("--numpy-model", type=str, help="Path to the exported .npz weights (default: next to the model).")
+    parser.add_argument("--transform", type=str, help="Path to the fitted feature transform (default: next to the model).")
+    parser.add_argument("--cache-size", type=int, default=0, help="Verdict cache entries per worker (default: 0, score everything)")
+    parser.add_argument("--max-workers", type=int, default=4, help="Largest pool size to measure (default: 4)")
+    parser.add_argument("--batch", type=int, default=MAX_BATCH_SIZE, help=f"Records per dispatched batch (default: {MAX_BATCH_SIZE})")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Time spent per pool size (default: 5)")
+    args = parser.parse_args()
+    args.jit = False
+    args.cache_ttl = 30.0
+    args.max_batch = args.batch
+
+    print(f"{os.cpu_count()} CPUs, {args.runtime} runtime, batches of {args.batch}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rate = run(workers, args, args.batch, args.seconds)
+        baseline = baseline or rate
+        print(f"{workers} workers: {rate:>12,.0f} verdicts/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
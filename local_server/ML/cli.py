@@ -1,15 +1,30 @@
 import argparse
+import json
+import queue
+import resource
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import tensorflow as tf
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
+import os
+from feature_transform import load_feature_transform, transform_path_for
+from numpy_model import load_numpy_model, numpy_model_path_for
+
+PREDICT_BATCH = 1024
+PREFETCH_CHUNKS = 2  # chunks parsed and featurized ahead of the one being scored
+CHUNKS_PER_WORKER = 2  # chunks in flight per pool worker
+COLUMNAR_FORMATS = (".parquet", ".arrow")
+CHECKPOINT_SUFFIX = ".checkpoint.json"
 
 def preprocess_data(data):
     """
     Preprocess the packet data for the model. Ensures the output shape matches the model's input.
     """
-    print("Available columns in data:", data.columns)
-
     # Define columns based on the notebook and total expected features
     categorical_columns = [6, 11]  # Example: protocol and connection state
     numerical_columns = [8, 9, 10, 14, 16, 17]  # Example: duration, bytes
@@ -62,52 +77,291 @@ def load_model(model_path):
     """
     Loads the trained Keras model.
     """
+    import tensorflow as tf
     return tf.keras.models.load_model(model_path)
 
-def analyze_packets(input_file, model, output_file):
+def load_scorer(model_path, runtime="keras", numpy_model=None):
+    """
+    Loads the model as a function from features to a 1-D array of confidences.
+    """
+    if runtime == "numpy":
+        engine = load_numpy_model(numpy_model or numpy_model_path_for(model_path))
+        return lambda features: engine.predict(np.asarray(features, dtype=np.float32))
+    model = load_model(model_path)
+    return lambda features: model.predict(features, batch_size=PREDICT_BATCH, verbose=0).reshape(-1)
+
+def load_transform(transform_path):
+    """
+    Loads the feature transform fitted at training time, if there is one.
+    """
+    if not os.path.exists(transform_path):
+        print(f"No feature transform at {transform_path}, falling back to fitting on the input")
+        return None
+    return load_feature_transform(transform_path)
+
+def featurize(data, transform=None):
+    """
+    Model features for packet data, with the fitted transform if there is one.
+    """
+    if transform is not None:
+        return transform.transform_frame(data)
+    return preprocess_data(data)
+
+def results_frame(data, confidences):
+    """
+    The output rows for packet data: source and destination IP and confidence.
+    """
+    return pd.DataFrame({
+        "src_ip": data.iloc[:, 2].astype(str).to_numpy(),  # Column 3 (0-based index)
+        "dest_ip": data.iloc[:, 4].astype(str).to_numpy(),  # Column 5 (0-based index)
+        "confidence": np.asarray(confidences, dtype=np.float32)
+    })
+
+def analyze_packets(input_file, score, output_file, transform=None):
     """
     Analyze packets using the trained model and save the results to a CSV.
     """
     # Load packet data without headers
     data = pd.read_csv(input_file, header=None)
 
-    # Assign column positions for source and destination IPs
-    src_ips = data.iloc[:, 2]  # Column 3 (0-based index)
-    dest_ips = data.iloc[:, 4]  # Column 5 (0-based index)
-
-    # Preprocess the data for the model
-    preprocessed_data = preprocess_data(data)
-
     # Predict confidence scores
-    predictions = model.predict(preprocessed_data)
-    confidences = predictions.squeeze()  # Flatten the predictions array
-
-    # Create output DataFrame
-    output_data = pd.DataFrame({
-        "src_ip": src_ips,
-        "dest_ip": dest_ips,
-        "confidence": confidences
-    })
+    output_data = results_frame(data, score(featurize(data, transform)))
 
     # Save to CSV
     output_data.to_csv(output_file, index=False)
     print(f"Results saved to {output_file}")
 
+def prefetch(items, depth=PREFETCH_CHUNKS):
+    """
+    Iterate over items in a background thread, at most depth items ahead,
+    so producing the next item overlaps with consuming this one.
+    """
+    buffer = queue.Queue(depth)
+    finished = object()
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(e)
+        buffer.put(finished)
+
+    threading.Thread(target=produce, name="chunk reader", daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is finished:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+_worker_model = None  # (score, transform) in each pool worker
+
+def _init_worker(model_path, runtime, numpy_model, transform_path):
+    global _worker_model
+    _worker_model = (load_scorer(model_path, runtime, numpy_model), load_transform(transform_path))
+
+def _score_chunk(chunk):
+    score, transform = _worker_model
+    return results_frame(chunk, score(featurize(chunk, transform)))
+
+def scored_chunks(chunks, args, transform_path):
+    """
+    Results for every chunk, in input order. With --workers the chunks are
+    scored in a process pool; otherwise the next chunk is read and
+    featurized in a thread while this one is scored.
+    """
+    if args.workers > 0:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(args.model, args.runtime, args.numpy_model, transform_path)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_score_chunk, chunk))
+                if len(pending) >= CHUNKS_PER_WORKER * args.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return
+
+    score = load_scorer(args.model, args.runtime, args.numpy_model)
+    transform = load_transform(transform_path)
+    for chunk, features in prefetch((chunk, featurize(chunk, transform)) for chunk in chunks):
+        yield results_frame(chunk, score(features))
+
+class CsvOutput:
+    """
+    Results appended to one CSV file. On resume, whatever was written
+    after the last checkpoint is cut off first.
+    """
+
+    def __init__(self, path, resume_bytes=None):
+        self.file = open(path, "r+b" if resume_bytes is not None else "wb")
+        if resume_bytes is not None:
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+
+    def write(self, frame):
+        frame.to_csv(self.file, header=self.file.tell() == 0, index=False)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def checkpoint(self):
+        return {"output_bytes": self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+class ColumnarOutput:
+    """
+    Results as a directory with one Parquet or Arrow IPC file per chunk, so
+    a finished chunk is never rewritten. Read it back with
+    pandas.read_parquet(path) or pyarrow.dataset.dataset(path, format="arrow").
+    """
+
+    def __init__(self, path, extension, chunks_done=0):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit(f"Writing {extension} output needs pyarrow: pip install pyarrow")
+        self.pyarrow = pyarrow
+        self.path = path
+        self.extension = extension
+        self.chunks = chunks_done
+        os.makedirs(path, exist_ok=True)
+        # Parts written after the last checkpoint, or by an earlier run
+        finished = {self._name(chunk) for chunk in range(chunks_done)}
+        for name in os.listdir(path):
+            if name.startswith("part-") and name not in finished:
+                os.unlink(os.path.join(path, name))
+
+    def _name(self, chunk):
+        return f"part-{chunk:06d}{self.extension}"
+
+    def write(self, frame):
+        table = self.pyarrow.Table.from_pandas(frame, preserve_index=False)
+        part = os.path.join(self.path, self._name(self.chunks))
+        # Written under a temporary name, so a part that exists is complete
+        temporary = part + ".tmp"
+        if self.extension == ".parquet":
+            self.pyarrow.parquet.write_table(table, temporary)
+        else:
+            with self.pyarrow.OSFile(temporary, "wb") as sink, \
+                    self.pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temporary, part)
+        self.chunks += 1
+
+    def checkpoint(self):
+        return {}
+
+    def close(self):
+        pass
+
+def save_checkpoint(path, state):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(temporary, path)
+
+def load_checkpoint(path, input_file, chunk_size):
+    """
+    The checkpoint left by an earlier run on the same input with the same
+    chunk size, or None if there is none.
+    """
+    if not os.path.exists(path):
+        print(f"No checkpoint at {path}, starting from the beginning")
+        return None
+    with open(path) as checkpoint:
+        state = json.load(checkpoint)
+    if state["input"] != os.path.abspath(input_file) or state["input_size"] != os.path.getsize(input_file) \
+            or state["chunk_size"] != chunk_size:
+        raise SystemExit(f"{path} belongs to another input or chunk size; remove it or run without --resume")
+    return state
+
+def analyze_packets_streaming(input_file, output_file, args, transform_path):
+    """
+    Analyze packets chunk by chunk, so memory depends on --chunk-size, not on
+    the size of the input. Results are appended to the output as each chunk
+    is scored, and a checkpoint next to it records how far the run got.
+    """
+    checkpoint_path = output_file.rstrip(os.sep) + CHECKPOINT_SUFFIX
+    state = load_checkpoint(checkpoint_path, input_file, args.chunk_size) if args.resume else None
+    if state is not None and state["complete"]:
+        print(f"{output_file} is already complete ({state['rows']} rows)")
+        return
+    if state is None:
+        state = {"input": os.path.abspath(input_file), "input_size": os.path.getsize(input_file),
+                 "chunk_size": args.chunk_size, "chunks": 0, "rows": 0, "complete": False}
+    elif state["rows"]:
+        print(f"Resuming after {state['rows']} rows ({state['chunks']} chunks)")
+
+    extension = os.path.splitext(output_file.rstrip(os.sep))[1].lower()
+    if extension in COLUMNAR_FORMATS:
+        output = ColumnarOutput(output_file, extension, state["chunks"])
+    else:
+        output = CsvOutput(output_file, state.get("output_bytes") if state["chunks"] else None)
+
+    chunks = pd.read_csv(input_file, header=None, chunksize=args.chunk_size, skiprows=state["rows"])
+    start = time.monotonic()
+    rows = 0
+    try:
+        for results in scored_chunks(chunks, args, transform_path):
+            output.write(results)
+            rows += len(results)
+            state.update(output.checkpoint(), chunks=state["chunks"] + 1, rows=state["rows"] + len(results))
+            save_checkpoint(checkpoint_path, state)
+            print(f"\rScored {state['rows']} rows ({rows / (time.monotonic() - start):,.0f} rows/s)", end="", flush=True)
+    finally:
+        output.close()
+
+    state["complete"] = True
+    save_checkpoint(checkpoint_path, state)
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nResults saved to {output_file}, peak RSS {peak_mb:.0f} MB")
+
 
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze network packets using a pre-trained Keras model.")
     parser.add_argument("input", type=str, help="Path to the input CSV file containing packet data.")
     parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
-    parser.add_argument("output", type=str, help="Path to save the output CSV file.")
+    parser.add_argument("output", type=str,
+                        help="Path to save the output CSV file, or with --chunk-size a directory of "
+                             "Parquet (.parquet) or Arrow IPC (.arrow) files.")
+    parser.add_argument("--transform", type=str, help="Path to the fitted feature transform (default: next to the model).")
+    parser.add_argument("--runtime", choices=["keras", "numpy"], default="keras",
+                        help="Run the model with TensorFlow, or with NumPy from weights exported by export_numpy.py.")
+    parser.add_argument("--numpy-model", type=str,
+                        help="Path to the exported .npz weights for --runtime numpy (default: next to the model).")
+    parser.add_argument("--chunk-size", type=int, default=0,
+                        help="Stream the input in chunks of this many rows, so memory depends on the chunk size "
+                             "instead of the file size (default: 0, read the whole file).")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="With --chunk-size, score chunks in this many processes "
+                             "(default: 0, score in this process while the next chunk is read).")
+    parser.add_argument("--resume", action="store_true",
+                        help="With --chunk-size, continue an interrupted run from the checkpoint next to the output.")
     
     args = parser.parse_args()
-    
-    # Load model
-    model = load_model(args.model)
-    
-    # Analyze packets
-    analyze_packets(args.input, model, args.output)
+    transform_path = args.transform or transform_path_for(args.model)
+    if args.chunk_size <= 0:
+        if args.workers or args.resume:
+            parser.error("--workers and --resume need --chunk-size")
+        if os.path.splitext(args.output)[1].lower() in COLUMNAR_FORMATS:
+            parser.error("Parquet and Arrow output need --chunk-size")
+
+        # Load model and the feature transform it was trained with
+        score = load_scorer(args.model, args.runtime, args.numpy_model)
+        transform = load_transform(transform_path)
+
+        # Analyze packets
+        analyze_packets(args.input, score, args.output, transform)
+        return
+
+    analyze_packets_streaming(args.input, args.output, args, transform_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,107 @@
+import os
+import time
+import numpy as np
+from pipe_endpoints import OutputPipe
+
+SETTINGS_PATH = "/shared/settings.txt"
+THRESHOLD_SETTING = "mlCaution"
+# pyscript's ml_confidence_threshold before it has pulled any settings
+DEFAULT_THRESHOLD = 0.9
+SETTINGS_CHECK_INTERVAL = 1.0
+DEFAULT_SAMPLE_RATE = 0.01
+SIDE_CHANNEL_BUFFER_LIMIT = 256 * 1024
+
+
+def read_threshold(path):
+    """mlCaution from a key=value settings file, or None if it is missing or invalid."""
+    try:
+        with open(path) as settings:
+            for line in settings:
+                key, _, value = line.strip().partition("=")
+                if key == THRESHOLD_SETTING:
+                    return float(value)
+    except (OSError, ValueError) as e:
+        print(f"\nCould not read {THRESHOLD_SETTING} from {path}: {e}")
+    return None
+
+
+class VerdictFilter:
+    """
+    Keep only verdicts at or above the mlCaution threshold.
+
+    pyscript ignores everything below the threshold anyway, so dropping
+    those verdicts here saves writing and parsing them. The threshold is
+    read from the settings file that pyscript keeps up to date, and is
+    re-read whenever the file's mtime changes. It is checked at most once
+    every SETTINGS_CHECK_INTERVAL seconds.
+
+    With a side-channel path, a random sample_rate fraction of all
+    verdicts, kept or not, also goes to that FIFO for debugging.
+    """
+
+    def __init__(self, settings_path=SETTINGS_PATH, default_threshold=DEFAULT_THRESHOLD,
+                 side_channel_path=None, sample_rate=DEFAULT_SAMPLE_RATE):
+        self.settings_path = settings_path
+        self.threshold = default_threshold
+        self.sample_rate = sample_rate
+        self.verdicts = 0
+        self.emitted = 0
+        self.sampled = 0
+        self._mtime = None
+        self._next_check = 0.0
+        self._rng = np.random.default_rng()
+        self._side_channel = None
+        if side_channel_path is not None:
+            if not os.path.exists(side_channel_path):
+                os.mkfifo(side_channel_path)
+            self._side_channel = OutputPipe(side_channel_path, SIDE_CHANNEL_BUFFER_LIMIT)
+        self.reload()
+        if self._mtime is None:
+            print(f"No {settings_path} yet, emitting verdicts with confidence >= {self.threshold}")
+
+    def reload(self, now=None):
+        """Re-read the threshold if the settings file changed."""
+        self._next_check = (time.monotonic() if now is None else now) + SETTINGS_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self.settings_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        threshold = read_threshold(self.settings_path)
+        if threshold is not None and threshold != self.threshold:
+            print(f"\nEmitting verdicts with confidence >= {threshold} ({THRESHOLD_SETTING})")
+            self.threshold = threshold
+
+    def apply(self, verdicts):
+        """The verdicts to emit, as a VERDICT_DTYPE array."""
+        now = time.monotonic()
+        if now >= self._next_check:
+            self.reload(now)
+
+        if self._side_channel is not None:
+            self._sample(verdicts)
+
+        kept = verdicts[verdicts["confidence"] >= self.threshold]
+        self.verdicts += len(verdicts)
+        self.emitted += len(kept)
+        return kept
+
+    def _sample(self, verdicts):
+        sample = verdicts[self._rng.random(len(verdicts)) < self.sample_rate]
+        if not len(sample):
+            return
+        # Nobody needs to be listening; the pipe buffers a little, then drops
+        if not self._side_channel.is_open():
+            self._side_channel.open()
+        self._side_channel.write(sample.tobytes())
+        self.sampled += len(sample)
+
+    def print_report(self):
+        share = self.emitted / self.verdicts if self.verdicts else 0.0
+        print(f"\nEmitted {self.emitted} of {self.verdicts} verdicts ({share:.2%}) "
+              f"at threshold {self.threshold}", end="")
+        if self._side_channel is not None:
+            print(f", sampled {self.sampled} to {self._side_channel.path}", end="")
+        print()
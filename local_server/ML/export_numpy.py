@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Export a Keras Dense classifier to the .npz format read by numpy_model.py.
+
+BatchNormalization layers are folded into the Dense layer that consumes
+their output and Dropout layers are dropped, leaving a plain stack of
+Dense layers.
+"""
+import argparse
+import numpy as np
+
+from numpy_model import NUMPY_MODEL_VERSION, numpy_model_path_for
+
+
+def fold_layers(model):
+    """Return (kernels, biases, activations) for an inference-only Dense stack."""
+    kernels, biases, activations = [], [], []
+    # Per-feature affine transform x * scale + shift still to be applied to
+    # the input of the next Dense layer
+    scale, shift = None, None
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+
+        if kind in ("InputLayer", "Dropout"):
+            continue
+
+        if kind == "BatchNormalization":
+            gamma = layer.gamma.numpy() if layer.scale else 1.0
+            beta = layer.beta.numpy() if layer.center else 0.0
+            bn_scale = gamma / np.sqrt(layer.moving_variance.numpy() + layer.epsilon)
+            bn_shift = beta - layer.moving_mean.numpy() * bn_scale
+            if scale is None:
+                scale, shift = bn_scale, bn_shift
+            else:
+                scale, shift = scale * bn_scale, shift * bn_scale + bn_shift
+            continue
+
+        if kind == "Dense":
+            kernel = layer.kernel.numpy().astype(np.float64)
+            bias = layer.bias.numpy().astype(np.float64) if layer.use_bias else np.zeros(kernel.shape[1])
+            if scale is not None:
+                bias = bias + shift @ kernel
+                kernel = scale[:, None] * kernel
+                scale, shift = None, None
+            kernels.append(kernel.astype(np.float32))
+            biases.append(bias.astype(np.float32))
+            activations.append(layer.activation.__name__)
+            continue
+
+        raise ValueError(f"Unsupported layer {layer.name} ({kind})")
+
+    if scale is not None:
+        raise ValueError("BatchNormalization after the last Dense layer cannot be folded")
+
+    return kernels, biases, activations
+
+
+def export_model(model, output_path):
+    kernels, biases, activations = fold_layers(model)
+    arrays = {f"kernel_{i}": kernel for i, kernel in enumerate(kernels)}
+    arrays.update({f"bias_{i}": bias for i, bias in enumerate(biases)})
+    np.savez(output_path, version=NUMPY_MODEL_VERSION, activations=np.array(activations), **arrays)
+    return kernels, activations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Keras Dense classifier for the NumPy runtime.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("output", type=str, nargs="?", help="Path of the .npz to write (default: next to the model).")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model)
+    output_path = args.output or numpy_model_path_for(args.model)
+    kernels, activations = export_model(model, output_path)
+
+    shapes = " -> ".join(str(k.shape[0]) for k in kernels) + f" -> {kernels[-1].shape[1]}"
+    print(f"Exported {len(kernels)} Dense layers ({shapes}, {'/'.join(activations)}) to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
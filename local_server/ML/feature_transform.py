@@ -0,0 +1,147 @@
+import os
+import json
+import numpy as np
+
+TRANSFORM_VERSION = 1
+TRANSFORM_SUFFIX = ".transform.json"
+
+# Column positions in a headerless Zeek conn.log CSV, as read by cli.py
+NUMERICAL_COLUMNS = [8, 9, 10, 14, 16, 17]
+CATEGORICAL_COLUMNS = [6, 11]
+REQUIRED_FEATURES = 20
+
+# Zeek spells the proto column by name, the forwarder sends the IP protocol number
+PROTOCOL_NAMES = {1: "icmp", 6: "tcp", 17: "udp"}
+
+
+def transform_path_for(model_path):
+    """Path of the transform artifact that belongs next to a model file."""
+    return os.path.splitext(model_path)[0] + TRANSFORM_SUFFIX
+
+
+def clean_frame(data):
+    """Apply preprocess_data()'s cleaning and return (numeric, categorical) arrays."""
+    import pandas as pd
+
+    numeric = (
+        data.iloc[:, NUMERICAL_COLUMNS]
+        .replace(['-', '(empty)'], 0)
+        .apply(pd.to_numeric, errors='coerce')
+        .fillna(0)
+        .to_numpy(dtype=np.float64)
+    )
+    categorical = (
+        data.iloc[:, CATEGORICAL_COLUMNS]
+        .replace(['-', '(empty)'], 'unknown')
+        .astype(str)
+        .to_numpy()
+    )
+    return numeric, categorical
+
+
+class FeatureTransform:
+    """
+    Scaling and one-hot encoding fitted once at training time.
+
+    The output layout is the scaled numeric columns followed by one column per
+    category of each categorical column, cut or zero padded to n_features.
+    Unknown categories encode as all zeros.
+    """
+
+    def __init__(self, means, scales, categories, n_features=REQUIRED_FEATURES,
+                 numerical_columns=NUMERICAL_COLUMNS, categorical_columns=CATEGORICAL_COLUMNS):
+        self.means = np.asarray(means, dtype=np.float64)
+        self.scales = np.asarray(scales, dtype=np.float64)
+        self.categories = [list(vocabulary) for vocabulary in categories]
+        self.n_features = n_features
+        self.numerical_columns = list(numerical_columns)
+        self.categorical_columns = list(categorical_columns)
+
+    @property
+    def layout(self):
+        """Name of every output column, for humans reading the artifact."""
+        names = [f"num:{column}" for column in self.numerical_columns]
+        for column, vocabulary in zip(self.categorical_columns, self.categories):
+            names += [f"cat:{column}={value}" for value in vocabulary]
+        names += ["pad"] * (self.n_features - len(names))
+        return names[:self.n_features]
+
+    def codes(self, index, values):
+        """Map the values of the index-th categorical column to vocabulary positions, -1 if unknown."""
+        lookup = {value: code for code, value in enumerate(self.categories[index])}
+        return np.fromiter((lookup.get(value, -1) for value in values), dtype=np.int64, count=len(values))
+
+    def apply(self, numeric, codes, out=None):
+        """Write the features for raw numeric values and category codes into out."""
+        count = len(numeric)
+        if out is None:
+            out = np.empty((count, self.n_features), dtype=np.float32)
+        out = out[:count]
+        out.fill(0)
+
+        width = min(len(self.means), self.n_features)
+        out[:, :width] = ((numeric - self.means) / self.scales)[:, :width]
+
+        offset = len(self.means)
+        for column_codes, vocabulary in zip(codes, self.categories):
+            column = offset + column_codes
+            valid = (column_codes >= 0) & (column < self.n_features)
+            out[np.flatnonzero(valid), column[valid]] = 1.0
+            offset += len(vocabulary)
+
+        return out
+
+    def transform_frame(self, data, out=None):
+        """Features for a DataFrame in conn.log column layout."""
+        numeric, categorical = clean_frame(data)
+        codes = [self.codes(i, categorical[:, i]) for i in range(categorical.shape[1])]
+        return self.apply(numeric, codes, out)
+
+    def save(self, path):
+        artifact = {
+            "version": TRANSFORM_VERSION,
+            "n_features": self.n_features,
+            "numerical_columns": self.numerical_columns,
+            "categorical_columns": self.categorical_columns,
+            "means": self.means.tolist(),
+            "scales": self.scales.tolist(),
+            "categories": self.categories,
+            "layout": self.layout,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(artifact, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def load_feature_transform(path):
+    with open(path, "r") as f:
+        artifact = json.load(f)
+
+    if artifact.get("version") != TRANSFORM_VERSION:
+        raise ValueError(f"Unsupported transform version {artifact.get('version')} in {path}")
+
+    return FeatureTransform(
+        artifact["means"],
+        artifact["scales"],
+        artifact["categories"],
+        n_features=artifact["n_features"],
+        numerical_columns=artifact["numerical_columns"],
+        categorical_columns=artifact["categorical_columns"],
+    )
+
+
+def fit_feature_transform(data, n_features=REQUIRED_FEATURES):
+    """Fit the transform on training data in conn.log column layout."""
+    from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+    numeric, categorical = clean_frame(data)
+    scaler = StandardScaler().fit(numeric)
+    encoder = OneHotEncoder(handle_unknown='ignore').fit(categorical)
+
+    return FeatureTransform(
+        scaler.mean_,
+        scaler.scale_,
+        [vocabulary.tolist() for vocabulary in encoder.categories_],
+        n_features=n_features,
+    )
@@ -0,0 +1,96 @@
+import numpy as np
+from feature_transform import PROTOCOL_NAMES, REQUIRED_FEATURES
+from packet_ring import PAYLOAD_SIZE
+
+NUMERIC_FEATURES = 6
+DEFAULT_CAPACITY = 100
+
+_EPS = np.finfo(np.float64).eps
+
+
+class Featurizer:
+    """
+    Map packet records straight to the float32 feature matrix the model expects.
+
+    With a FeatureTransform the records are scaled and encoded with the
+    statistics fitted at training time. Without one, it produces the same
+    columns as packet_to_dataframe() followed by preprocess_data() in
+    always_cli.py: six standardized numeric columns, a one-hot block for the
+    protocols seen in the batch, a single column for the constant "UNKNOWN"
+    connection state, then zero padding up to REQUIRED_FEATURES.
+
+    The returned matrix is a view into a buffer that is reused on the next call.
+    """
+
+    CONN_STATE = "UNKNOWN"
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, n_features=REQUIRED_FEATURES, transform=None):
+        self.transform = transform
+        if transform is not None:
+            n_features = transform.n_features
+            # Record fields map to conn.log's proto and conn_state columns
+            self._protocol_codes = transform.codes(0, [PROTOCOL_NAMES.get(p, str(p)) for p in range(256)])
+            self._state_code = transform.codes(1, [self.CONN_STATE])[0]
+        self.n_features = n_features
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._out = np.zeros((capacity, self.n_features), dtype=np.float32)
+        self._numeric = np.empty((capacity, NUMERIC_FEATURES), dtype=np.float64)
+
+    def _numeric_columns(self, records, numeric):
+        """Fill the raw values of preprocess_data()'s numerical columns [8, 9, 10, 14, 16, 17]."""
+        packet_size = records["packet_size"]
+        numeric[:, 0] = packet_size
+        numeric[:, 1] = packet_size
+        numeric[:, 2] = PAYLOAD_SIZE
+        np.divide(packet_size, 1500.0, out=numeric[:, 3])
+        numeric[:, 4] = packet_size
+        numeric[:, 5] = packet_size
+
+    def __call__(self, records):
+        count = len(records)
+        if count > self.capacity:
+            self._allocate(count)
+
+        out = self._out[:count]
+        out.fill(0)
+        if count == 0:
+            return out
+
+        numeric = self._numeric[:count]
+        self._numeric_columns(records, numeric)
+
+        if self.transform is not None:
+            codes = [
+                self._protocol_codes[records["protocol"]],
+                np.full(count, self._state_code),
+            ]
+            return self.transform.apply(numeric, codes, out)
+
+        # StandardScaler fitted on this batch, including its handling of
+        # constant columns, which are centred but not scaled
+        mean = numeric.mean(axis=0)
+        var = numeric.var(axis=0)
+        constant = var <= count * _EPS * var + (count * mean * _EPS) ** 2
+        scale = np.sqrt(var)
+        scale[constant] = 1.0
+        numeric -= mean
+        numeric /= scale
+
+        width = min(NUMERIC_FEATURES, self.n_features)
+        out[:, :width] = numeric[:, :width]
+
+        # OneHotEncoder fitted on this batch: one column per protocol seen,
+        # in sorted order, then the connection state, which is always "UNKNOWN"
+        protocols, codes = np.unique(records["protocol"], return_inverse=True)
+        column = NUMERIC_FEATURES + codes
+        inside = column < self.n_features
+        out[np.flatnonzero(inside), column[inside]] = 1.0
+
+        state_column = NUMERIC_FEATURES + len(protocols)
+        if state_column < self.n_features:
+            out[:, state_column] = 1.0
+
+        return out
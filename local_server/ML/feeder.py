@@ -1,59 +1,186 @@
 #!/usr/bin/env python3
+"""
+Replay conn.log CSV rows or a pcap capture into the analyzer's input pipe as
+packet records.
+
+Every record is packed with NumPy before the first one is written, then
+records go out in batches paced to --pps by a token bucket, so the feeder
+can replay a capture at line rate rather than one write per packet.
+"""
 import os
 import time
-import struct
 import argparse
+import numpy as np
 import pandas as pd
-from ipaddress import ip_address
 import signal
 import sys
+from packet_ring import (PACKET_DTYPE, HEADER_DTYPE, RECORD_MAGIC, RECORD_VERSION, FLAG_PORTS, FLAG_PAYLOAD,
+                         FLAG_SEQUENCE, compact_dtype)
+from pcap_reader import is_pcap, read_pcap
 
 PIPE_NAME = "/tmp/packet_pipe"
+RECORD_FORMATS = ("compact", "legacy")
 MAX_WAIT_TIME = 30  # Maximum time to wait for analyzer in seconds
+CREATED_PIPE = False  # only a pipe the feeder created is removed on exit
+DEFAULT_PPS = 10.0
+MAX_BATCH = 4096  # records per write
+BURST_TIME = 0.01  # seconds of traffic the token bucket lets out in one write
+CSV_COLUMNS = [2, 3, 4, 5, 6, 8]  # conn.log source IP and port, dest IP and port, protocol, bytes
 
-def ip_string_to_bytes(ip_str):
-    """Convert an IP address string to 4 bytes."""
-    try:
-        return bytes(map(int, ip_str.split('.')))
-    except:
-        return bytes([0, 0, 0, 0])  # Return placeholder IP if conversion fails
+# --timestamp-log entries: the addresses of every record written and when,
+# on the monotonic clock, which is shared by all processes on the host
+SEND_LOG_DTYPE = np.dtype([
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("time", "=f8"),
+])
 
-def create_binary_packet(row):
-    """Convert a row from the CSV into binary packet format."""
-    try:
-        timestamp = int(time.time())
-        src_ip = ip_string_to_bytes(str(row[2]))
-        dst_ip = ip_string_to_bytes(str(row[4]))
+def parse_addresses(column):
+    """Dotted IPv4 strings as an (n, 4) uint8 array; anything else becomes the placeholder 0.0.0.0."""
+    parts = column.str.split(".", expand=True)
+    octets = parts.reindex(columns=range(4)).apply(pd.to_numeric, errors="coerce")
+    valid = octets.notna().all(axis=1) & octets.ge(0).all(axis=1) & octets.le(255).all(axis=1)
+    if parts.shape[1] > 4:
+        valid &= parts.iloc[:, 4:].isna().all(axis=1)
+    return np.where(valid.to_numpy()[:, None], octets.fillna(0).to_numpy(), 0).astype(np.uint8)
 
-        try:
-            packet_size = min(int(float(str(row[8]).replace('-', '0'))), 1500)
-        except:
-            packet_size = 64
+def parse_numbers(column, default):
+    """Numbers from a conn.log column, where '-' stands for 0; anything unreadable becomes default."""
+    return pd.to_numeric(column.str.replace("-", "0"), errors="coerce").fillna(default).to_numpy()
 
-        try:
-            protocol = int(str(row[6]).replace('-', '0'))
-        except:
-            protocol = 0
+def csv_headers(path, limit=None):
+    """Packet headers for the rows of a headerless conn.log CSV, and which of them have ports (all)."""
+    data = pd.read_csv(path, header=None, usecols=CSV_COLUMNS, nrows=limit, dtype=str, keep_default_na=False)
+    headers = np.zeros(len(data), dtype=HEADER_DTYPE)
+    headers["source_ip"] = parse_addresses(data[2])
+    headers["dest_ip"] = parse_addresses(data[4])
+    headers["source_port"] = parse_numbers(data[3], 0).astype(np.int64) & 0xFFFF
+    headers["dest_port"] = parse_numbers(data[5], 0).astype(np.int64) & 0xFFFF
+    headers["packet_size"] = np.clip(parse_numbers(data[8], 64), 0, 1500)
+    protocol = parse_numbers(data[6], 0)
+    headers["protocol"] = np.where((protocol >= 0) & (protocol <= 255), protocol, 0)
+    # conn.log has the ports, but no TCP flags
+    return headers, np.ones(len(data), dtype=bool)
 
-        data = bytes([0] * 1500)
+def pcap_headers(path, limit=None):
+    """Packet headers for the IPv4 packets of a pcap capture, and which of them have ports."""
+    packets, frames = read_pcap(path)
+    print(f"Read {len(packets)} IPv4 packets out of {frames} frames")
+    packets = packets[:limit]
+    headers = np.zeros(len(packets), dtype=HEADER_DTYPE)
+    for name in HEADER_DTYPE.names:
+        if name in packets.dtype.names:
+            headers[name] = packets[name]
+    return headers, packets["has_ports"]
 
-        packet = struct.pack('=L4s4sHB1500s',
-                             timestamp,
-                             src_ip,
-                             dst_ip,
-                             packet_size,
-                             protocol,
-                             data)
+def pack_records(headers, has_ports, record_format="compact", payload=False):
+    """
+    Packet records for all headers at once: version 2 (compact), numbered
+    like the forwarder numbers them and with a zeroed payload only if asked
+    for, or the version 1 binary_packet_t. Timestamps and sequence numbers
+    are filled in as the records are sent.
+    """
+    if record_format == "compact":
+        flags = FLAG_SEQUENCE | (FLAG_PAYLOAD if payload else 0)
+        records = np.zeros(len(headers), dtype=compact_dtype(flags))
+        records["magic"] = RECORD_MAGIC
+        records["version"] = RECORD_VERSION
+        records["flags"] = np.where(has_ports, flags | FLAG_PORTS, flags)
+    else:
+        records = np.zeros(len(headers), dtype=PACKET_DTYPE)
+    for name in HEADER_DTYPE.names:
+        if name in records.dtype.names:
+            records[name] = headers[name]
+    return records
 
-        return packet
-    except Exception as e:
-        print(f"Error creating packet: {e}")
-        return None
+class TokenBucket:
+    """
+    Lets out rate records per second on average, at most burst at a time.
+    A rate of 0 lets everything out at once. Tokens build up to two bursts,
+    so time overslept in one wait is made up in the next.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = 0.0
+        self.last = time.monotonic()
+
+    def take(self, wanted):
+        """Wait until up to wanted records may go out, and return how many."""
+        wanted = min(wanted, self.burst)
+        if not self.rate:
+            return wanted
+        while True:
+            now = time.monotonic()
+            self.tokens = min(2 * self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= wanted:
+                self.tokens -= wanted
+                return wanted
+            time.sleep((wanted - self.tokens) / self.rate)
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def replay(fd, records, bucket, limit=None, loop=False, timestamp_log=None):
+    """Write records to fd as fast as the bucket allows. Returns how many were written."""
+    raw = records.view(np.uint8)
+    size = records.dtype.itemsize
+    sequenced = "sequence" in records.dtype.names
+    written = position = 0
+    while limit is None or written < limit:
+        wanted = len(records) - position
+        if limit is not None:
+            wanted = min(wanted, limit - written)
+        count = bucket.take(wanted)
+        batch = records[position:position + count]
+        batch["timestamp"] = int(time.time())
+        if sequenced:
+            batch["sequence"] = np.arange(written, written + count) & 0xFFFFFFFF
+        try:
+            write_all(fd, raw[position * size:(position + count) * size])
+        except BrokenPipeError:
+            print("\nAnalyzer process has closed the pipe. Exiting...")
+            break
+        except IOError as e:
+            print(f"\nPipe error: {e}")
+            break
+
+        if timestamp_log:
+            entries = np.empty(count, dtype=SEND_LOG_DTYPE)
+            entries["source_ip"] = batch["source_ip"]
+            entries["dest_ip"] = batch["dest_ip"]
+            entries["time"] = time.monotonic()
+            entries.tofile(timestamp_log)
+        written += count
+        position += count
+        if position == len(records):
+            if not loop:
+                break
+            print("Reached end of file. Restarting...")
+            position = 0
+    return written
+
+def open_pipe():
+    """Open the pipe for writing, which waits for the analyzer to open it for reading."""
+    start_time = time.time()
+    while True:
+        try:
+            return os.open(PIPE_NAME, os.O_WRONLY)
+        except FileNotFoundError:
+            if time.time() - start_time > MAX_WAIT_TIME:
+                print(f"Analyzer did not connect within {MAX_WAIT_TIME} seconds. Exiting...")
+                return None
+            print("Waiting for analyzer to connect...")
+            time.sleep(1)
 
 def cleanup():
     """Clean up pipes."""
     try:
-        if os.path.exists(PIPE_NAME):
+        if CREATED_PIPE and os.path.exists(PIPE_NAME):
             os.unlink(PIPE_NAME)
     except Exception as e:
         print(f"Cleanup error: {e}")
@@ -65,64 +192,76 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 def main():
+    global PIPE_NAME, CREATED_PIPE
     parser = argparse.ArgumentParser(description="Feed test data through named pipe for packet analysis testing.")
-    parser.add_argument("input_file", help="Path to input CSV file containing packet data")
-    parser.add_argument("--delay", type=float, default=0.1, help="Delay between packets in seconds (default: 0.1)")
+    parser.add_argument("input_file", help="Path to a headerless conn.log CSV or a pcap capture to replay")
+    parser.add_argument("--pps", type=float, default=DEFAULT_PPS,
+                        help=f"Packets per second to replay at, 0 for as fast as the analyzer reads "
+                             f"(default: {DEFAULT_PPS:.0f})")
+    parser.add_argument("--delay", type=float, help="Delay between packets in seconds, the same as --pps 1/DELAY")
+    parser.add_argument("--batch", type=int, default=MAX_BATCH,
+                        help=f"Most records written at once (default: {MAX_BATCH})")
     parser.add_argument("--loop", action="store_true", help="Continuously loop through the input file")
+    parser.add_argument("--format", choices=RECORD_FORMATS, default="compact",
+                        help="Packet record format: compact version 2 records, or the old 1515-byte "
+                             "binary_packet_t (default: compact)")
+    parser.add_argument("--payload", action="store_true",
+                        help="Append a zeroed 1500-byte payload to every compact record")
+    parser.add_argument("--pipe", default=PIPE_NAME,
+                        help=f"FIFO to write packet records to; reused if it exists (default: {PIPE_NAME})")
+    parser.add_argument("--limit", type=int, help="Stop after writing this many records")
+    parser.add_argument("--timestamp-log",
+                        help="Append the addresses and monotonic send time of every record to this file")
     args = parser.parse_args()
+    if args.payload and args.format != "compact":
+        parser.error("--payload needs --format compact; legacy records always carry one")
+    if args.delay:
+        args.pps = 1 / args.delay
 
+    PIPE_NAME = args.pipe
     signal.signal(signal.SIGINT, signal_handler)
 
-    # Clean up any existing pipes
-    cleanup()
-
-    # Create the pipe
-    try:
+    # Create the pipe, unless an analyzer is already waiting on it
+    if os.path.exists(PIPE_NAME):
+        print(f"Pipe already exists: {PIPE_NAME}")
+    else:
         os.mkfifo(PIPE_NAME)
+        CREATED_PIPE = True
         print(f"Created pipe: {PIPE_NAME}")
-    except FileExistsError:
-        print(f"Pipe already exists: {PIPE_NAME}")
-
-    print("Starting data feed...")
-    time.sleep(1)  # Give the analyzer a moment to prepare
 
     try:
-        start_time = time.time()
-        while True:
-            try:
-                print("Opening pipe for writing...")
-                with open(PIPE_NAME, 'wb') as pipe:
-                    print(f"Reading data from {args.input_file}...")
-
-                    for chunk in pd.read_csv(args.input_file, header=None, chunksize=1000):
-                        for _, row in chunk.iterrows():
-                            packet = create_binary_packet(row)
-                            if packet:
-                                try:
-                                    pipe.write(packet)
-                                    pipe.flush()
-                                    time.sleep(args.delay)
-                                except BrokenPipeError:
-                                    print("\nAnalyzer process has closed the pipe. Exiting...")
-                                    return
-                                except IOError as e:
-                                    print(f"\nPipe error: {e}")
-                                    return
-
-                    if not args.loop:
-                        break
-                    print("Reached end of file. Restarting...")
-
-            except FileNotFoundError:
-                if time.time() - start_time > MAX_WAIT_TIME:
-                    print(f"Analyzer did not connect within {MAX_WAIT_TIME} seconds. Exiting...")
-                    return
-                print("Waiting for analyzer to connect...")
-                time.sleep(1)
-                continue
+        print(f"Reading data from {args.input_file}...")
+        if is_pcap(args.input_file):
+            headers, has_ports = pcap_headers(args.input_file, args.limit)
+        else:
+            headers, has_ports = csv_headers(args.input_file, args.limit)
+        records = pack_records(headers, has_ports, args.format, args.payload)
+        if not len(records):
+            print("No packets to replay")
+            return
+
+        burst = max(1, min(args.batch, int(args.pps * BURST_TIME))) if args.pps else args.batch
+        bucket = TokenBucket(args.pps, burst)
+        print(f"Starting data feed of {len(records)} records at "
+              f"{f'{args.pps:,.0f} pps' if args.pps else 'full speed'}...")
+
+        print("Opening pipe for writing...")
+        fd = open_pipe()
+        if fd is None:
+            return
+        timestamp_log = open(args.timestamp_log, "ab") if args.timestamp_log else None
+        start = time.monotonic()
+        try:
+            written = replay(fd, records, bucket, args.limit, args.loop, timestamp_log)
+        finally:
+            os.close(fd)
+            if timestamp_log:
+                timestamp_log.close()
+        elapsed = time.monotonic() - start
+        print(f"Wrote {written} records in {elapsed:.2f} s ({written / max(elapsed, 1e-9):,.0f} pps)")
 
     finally:
         cleanup()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
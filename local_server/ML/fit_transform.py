@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Fit the feature transform read by feature_transform.py from labeled Zeek
+conn.log files, without running main.ipynb.
+
+Takes the raw conn.log.labeled files main.ipynb trains on, or the
+headerless CSVs it converts them to. Files are read in chunks and the
+scaler and category vocabularies are fitted incrementally, so the
+training logs never have to fit in memory at once. The result matches
+fitting fit_feature_transform() on all rows together.
+"""
+import io
+import argparse
+import numpy as np
+import pandas as pd
+
+from feature_transform import FeatureTransform, REQUIRED_FEATURES, clean_frame, transform_path_for
+
+CHUNK_ROWS = 1_000_000
+
+
+def conn_log_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    DataFrames of up to chunk_rows rows in conn.log column layout. Raw Zeek
+    logs are converted the way main.ipynb converts them: comment lines
+    dropped, tabs and the three-space label separators turned into commas.
+    """
+    with open(path, "r") as log:
+        first = log.readline()
+        log.seek(0)
+        if not first.startswith("#"):
+            yield from pd.read_csv(log, header=None, low_memory=False, chunksize=chunk_rows)
+            return
+
+        lines = []
+        for line in log:
+            if line.startswith("#"):
+                continue
+            lines.append(line.replace("\t", ",").replace("   ", ","))
+            if len(lines) == chunk_rows:
+                yield pd.read_csv(io.StringIO("".join(lines)), header=None, low_memory=False)
+                lines = []
+        if lines:
+            yield pd.read_csv(io.StringIO("".join(lines)), header=None, low_memory=False)
+
+
+def fit_feature_transform_chunks(chunks, n_features=REQUIRED_FEATURES):
+    """fit_feature_transform() over an iterable of DataFrames, one at a time."""
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    vocabularies = None
+    rows = 0
+    for data in chunks:
+        numeric, categorical = clean_frame(data)
+        scaler.partial_fit(numeric)
+        if vocabularies is None:
+            vocabularies = [set() for _ in range(categorical.shape[1])]
+        for vocabulary, column in zip(vocabularies, categorical.T):
+            vocabulary.update(np.unique(column).tolist())
+        rows += len(data)
+    if not rows:
+        raise ValueError("No rows to fit the feature transform on")
+
+    # OneHotEncoder orders each vocabulary the same way
+    transform = FeatureTransform(scaler.mean_, scaler.scale_, [sorted(vocabulary) for vocabulary in vocabularies],
+                                 n_features=n_features)
+    return transform, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the feature transform on labeled conn.log training data.")
+    parser.add_argument("logs", nargs="+", help="conn.log.labeled files, or the headerless CSVs made from them.")
+    parser.add_argument("--model", type=str, default="best_packet_classifier.keras",
+                        help="Model the transform belongs to; it is written next to it "
+                             "(default: best_packet_classifier.keras).")
+    parser.add_argument("--output", type=str, help="Path of the transform to write (default: next to the model).")
+    args = parser.parse_args()
+
+    chunks = (chunk for path in args.logs for chunk in conn_log_chunks(path))
+    transform, rows = fit_feature_transform_chunks(chunks)
+    output_path = args.output or transform_path_for(args.model)
+    transform.save(output_path)
+    print(f"Fitted the feature transform on {rows} rows from {len(args.logs)} files, saved to {output_path}")
+    print(f"Layout: {transform.layout}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import numpy as np
+from featurizer import Featurizer
+
+DEFAULT_WINDOW = 5.0
+DEFAULT_IDLE_TIMEOUT = 30.0
+# About 200 bytes per flow with the index, so the default stays under 4 MB
+DEFAULT_MAX_FLOWS = 16384
+EVICT_FRACTION = 8  # on overflow, evict 1/8 of the table at once
+
+FLOW_DTYPE = np.dtype([
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("source_port", "=u2"),
+    ("dest_port", "=u2"),
+    ("protocol", "u1"),
+    ("first_seen", "=f8"),
+    ("last_seen", "=f8"),
+    ("last_scored", "=f8"),
+    ("orig_pkts", "=u4"),
+    ("orig_bytes", "=u8"),
+    ("resp_pkts", "=u4"),
+    ("resp_bytes", "=u8"),
+    ("size_min", "=u2"),
+    ("size_max", "=u2"),
+    ("scored_pkts", "=u4"),
+])
+
+KEY_DTYPE = np.dtype([
+    ("low_ip", "=u4"),
+    ("high_ip", "=u4"),
+    ("low_port", "=u2"),
+    ("high_port", "=u2"),
+    ("protocol", "u1"),
+])
+
+
+class FlowFeaturizer(Featurizer):
+    """
+    Featurizer for flow rows from a FlowTable.
+
+    Fills the conn.log columns the model was trained on with the flow's
+    statistics: duration, orig_bytes, resp_bytes, missed_bytes, orig_pkts and
+    orig_ip_bytes. A flow seen mid-stream has Zeek's "OTH" connection state.
+    """
+
+    CONN_STATE = "OTH"
+
+    def _numeric_columns(self, flows, numeric):
+        numeric[:, 0] = flows["last_seen"] - flows["first_seen"]
+        numeric[:, 1] = flows["orig_bytes"]
+        numeric[:, 2] = flows["resp_bytes"]
+        numeric[:, 3] = 0
+        numeric[:, 4] = flows["orig_pkts"]
+        numeric[:, 5] = flows["orig_bytes"]
+
+
+def _ports(packets, name):
+    if name in packets.dtype.names:
+        return packets[name]
+    return np.zeros(len(packets), dtype=np.uint16)
+
+
+class FlowTable:
+    """
+    Running statistics per flow, so flows are scored instead of packets.
+
+    Flows are keyed by 5-tuple in either direction. The endpoint that sent
+    the first packet seen is the originator. A flow is scored as soon as
+    it appears and then at most once per window, while it keeps receiving
+    packets. Its statistics accumulate from the first packet, the same way
+    conn.log reports them. Flows idle for idle_timeout seconds are dropped.
+    When the table is full, the flows idle the longest are dropped first.
+    Flows with packets that have not been scored yet are scored once more
+    on their way out.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, idle_timeout=DEFAULT_IDLE_TIMEOUT, max_flows=DEFAULT_MAX_FLOWS):
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self.packets = 0
+        self.flows_scored = 0
+        self.flows_seen = 0
+        self.idle_evictions = 0
+        self.overflow_evictions = 0
+        self.untracked_packets = 0
+        self._flows = np.zeros(max_flows, dtype=FLOW_DTYPE)
+        self._in_use = np.zeros(max_flows, dtype=bool)
+        self._keys = [None] * max_flows
+        self._slots = {}  # key -> row in _flows
+        self._free = list(range(max_flows - 1, -1, -1))
+        self._evicted = []  # flows dropped for room that still need a verdict
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _packet_keys(self, packets):
+        src = packets["source_ip"].view("=u4").reshape(-1)
+        dst = packets["dest_ip"].view("=u4").reshape(-1)
+        src_port = _ports(packets, "source_port")
+        dst_port = _ports(packets, "dest_port")
+        swap = (src > dst) | ((src == dst) & (src_port > dst_port))
+
+        keys = np.empty(len(packets), dtype=KEY_DTYPE)
+        keys["low_ip"] = np.where(swap, dst, src)
+        keys["high_ip"] = np.where(swap, src, dst)
+        keys["low_port"] = np.where(swap, dst_port, src_port)
+        keys["high_port"] = np.where(swap, src_port, dst_port)
+        keys["protocol"] = packets["protocol"]
+        return keys.view(f"V{KEY_DTYPE.itemsize}")
+
+    def _release(self, slots):
+        for slot in slots.tolist():
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+            self._free.append(slot)
+        self._in_use[slots] = False
+
+    def _make_room(self, now):
+        """
+        Drop the flows idle the longest. Those with packets not scored yet
+        are queued for one last verdict. Flows that started at now are never
+        dropped. Returns False if nothing could be dropped.
+        """
+        used = np.flatnonzero(self._in_use & (self._flows["last_seen"] < now))
+        if not len(used):
+            return False
+        count = max(1, len(used) // EVICT_FRACTION)
+        oldest = used[np.argpartition(self._flows["last_seen"][used], count - 1)[:count]]
+        pending = oldest[self._pending(oldest)]
+        if len(pending):
+            self._evicted.append(self._flows[pending].copy())
+        self.overflow_evictions += count
+        self._release(oldest)
+        return True
+
+    def _pending(self, slots):
+        flows = self._flows[slots]
+        return flows["orig_pkts"] + flows["resp_pkts"] > flows["scored_pkts"]
+
+    def add(self, packets, now):
+        """Account packets that arrived at time now (seconds)."""
+        if not len(packets):
+            return
+        self.packets += len(packets)
+        keys, first, inverse = np.unique(self._packet_keys(packets), return_index=True, return_inverse=True)
+
+        unique_slots = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys.tolist()):
+            slot = self._slots.get(key)
+            if slot is None:
+                if not self._free and not self._make_room(now):
+                    unique_slots[i] = -1
+                    continue
+                slot = self._free.pop()
+                self._slots[key] = slot
+                self._keys[slot] = key
+                self._in_use[slot] = True
+                self._start_flow(slot, packets[first[i]], now)
+            else:
+                # Seen now, so _make_room() for a later key in this batch cannot take its slot
+                self._flows["last_seen"][slot] = now
+            unique_slots[i] = slot
+        slots = unique_slots[inverse.reshape(-1)]
+        if (slots < 0).any():
+            # More new flows in one batch than the whole table holds
+            tracked = slots >= 0
+            self.untracked_packets += int((~tracked).sum())
+            packets, slots = packets[tracked], slots[tracked]
+
+        flows = self._flows
+        sizes = packets["packet_size"]
+        is_orig = ((packets["source_ip"].view("=u4").reshape(-1) == flows["source_ip"][slots].view("=u4").reshape(-1))
+                   & (_ports(packets, "source_port") == flows["source_port"][slots]))
+        orig, resp = slots[is_orig], slots[~is_orig]
+        np.add.at(flows["orig_pkts"], orig, 1)
+        np.add.at(flows["orig_bytes"], orig, sizes[is_orig])
+        np.add.at(flows["resp_pkts"], resp, 1)
+        np.add.at(flows["resp_bytes"], resp, sizes[~is_orig])
+        np.minimum.at(flows["size_min"], slots, sizes)
+        np.maximum.at(flows["size_max"], slots, sizes)
+        flows["last_seen"][slots] = now
+
+    def _start_flow(self, slot, packet, now):
+        flow = self._flows[slot:slot + 1]
+        flow.fill(0)
+        flow["source_ip"] = packet["source_ip"]
+        flow["dest_ip"] = packet["dest_ip"]
+        flow["source_port"] = packet["source_port"] if "source_port" in packet.dtype.names else 0
+        flow["dest_port"] = packet["dest_port"] if "dest_port" in packet.dtype.names else 0
+        flow["protocol"] = packet["protocol"]
+        flow["first_seen"] = now
+        flow["last_seen"] = now
+        flow["last_scored"] = -np.inf  # new flows are due right away
+        flow["size_min"] = np.iinfo(np.uint16).max
+        self.flows_seen += 1
+
+    def collect(self, now):
+        """
+        Flows due for a verdict at time now, as a FLOW_DTYPE array.
+
+        Marks them as scored and drops flows that have gone idle.
+        """
+        used = np.flatnonzero(self._in_use)
+        flows = self._flows
+        pending = self._pending(used)
+        idle = now - flows["last_seen"][used] >= self.idle_timeout
+        due = used[pending & (idle | (now - flows["last_scored"][used] >= self.window))]
+
+        flows["scored_pkts"][due] = flows["orig_pkts"][due] + flows["resp_pkts"][due]
+        flows["last_scored"][due] = now
+        collected = [flows[due]] + self._evicted
+        self._evicted = []
+
+        self.idle_evictions += int(idle.sum())
+        self._release(used[idle])
+
+        collected = np.concatenate(collected) if len(collected) > 1 else collected[0]
+        self.flows_scored += len(collected)
+        return collected
+
+    def timeout(self):
+        """Seconds until collect() may have something new, for the select loop."""
+        return min(self.window, self.idle_timeout) / 4
+
+    def print_report(self):
+        saved = 1 - self.flows_scored / self.packets if self.packets else 0.0
+        print(f"\nFlow table: {len(self)}/{self.max_flows} flows, {self.flows_seen} seen, "
+              f"{self.idle_evictions} idle and {self.overflow_evictions} overflow evictions")
+        if self.untracked_packets:
+            print(f"  {self.untracked_packets} packets not scored because the table was full")
+        print(f"  {self.packets} packets scored as {self.flows_scored} flow verdicts "
+              f"({saved:.1%} less inference than per-packet mode)")
@@ -0,0 +1,60 @@
+import time
+import numpy as np
+import tensorflow as tf
+from latency import LatencyTracker, DEFAULT_BUCKETS
+
+
+class InferenceEngine:
+    """
+    Run a Keras model through compiled functions with fixed input shapes.
+
+    One concrete function is traced per bucket size, optionally with XLA,
+    and warmed up before the first real batch arrives. Per-bucket batch
+    latencies are kept for reporting.
+    """
+
+    def __init__(self, model, n_features, buckets=DEFAULT_BUCKETS, jit_compile=False):
+        self.n_features = n_features
+        self.buckets = tuple(sorted(buckets))
+        self.jit_compile = jit_compile
+
+        function = tf.function(lambda x: model(x, training=False), jit_compile=jit_compile)
+        self._functions = {}
+        self._inputs = {}
+        self.latency = LatencyTracker(self.buckets)
+        for size in self.buckets:
+            self._functions[size] = function.get_concrete_function(
+                tf.TensorSpec((size, n_features), tf.float32)
+            )
+            self._inputs[size] = np.zeros((size, n_features), dtype=np.float32)
+
+    def warm_up(self, rounds=3):
+        """Run every bucket a few times so graph building happens now, not on live traffic."""
+        start = time.perf_counter()
+        for size in self.buckets:
+            for _ in range(rounds):
+                self._functions[size](tf.constant(self._inputs[size]))
+        return time.perf_counter() - start
+
+    def _run(self, features):
+        count = len(features)
+        size = self.latency.bucket_for(count)
+        padded = self._inputs[size]
+        padded[:count] = features
+        padded[count:] = 0
+
+        start = time.perf_counter()
+        output = self._functions[size](tf.constant(padded)).numpy()
+        self.latency.record(size, time.perf_counter() - start)
+
+        return output[:count].reshape(-1)
+
+    def predict(self, features):
+        """Confidence per row of features, as a 1-D float32 array."""
+        largest = self.buckets[-1]
+        if len(features) <= largest:
+            return self._run(features)
+        return np.concatenate([
+            self._run(features[start:start + largest])
+            for start in range(0, len(features), largest)
+        ])
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Preprocess the NSL-KDD training set once and keep the result on disk.
+
+The scaled, one-hot encoded feature matrix, the labels and the fitted PCA
+are written as .npy files to a directory named after a hash of the source
+file and the preprocessing parameters, so a cache is reused only for the
+data and settings it was built from. Retraining opens the arrays as
+memory maps and streams batches from them with tf.data, so a
+hyperparameter sweep never parses or scales the CSV again.
+"""
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+CACHE_VERSION = 1  # bump whenever preprocess() changes what it produces
+PCA_COMPONENTS = 20
+BATCH_SIZE = 32  # Keras' default, which test.py trained with
+READ_BATCHES = 64  # batches gathered from the memory maps at once
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+HASH_BLOCK_SIZE = 1 << 20
+
+KDD_COLUMNS = [
+    'duration', 'protocol_type', 'service', 'flag', 'src_bytes', 'dst_bytes', 'land', 'wrong_fragment', 'urgent',
+    'hot', 'num_failed_logins', 'logged_in', 'num_compromised', 'root_shell', 'su_attempted', 'num_root',
+    'num_file_creations', 'num_shells', 'num_access_files', 'num_outbound_cmds', 'is_host_login', 'is_guest_login',
+    'count', 'srv_count', 'serror_rate', 'srv_serror_rate', 'rerror_rate', 'srv_rerror_rate', 'same_srv_rate',
+    'diff_srv_rate', 'srv_diff_host_rate', 'dst_host_count', 'dst_host_srv_count', 'dst_host_same_srv_rate',
+    'dst_host_diff_srv_rate', 'dst_host_same_src_port_rate', 'dst_host_srv_diff_host_rate', 'dst_host_serror_rate',
+    'dst_host_srv_serror_rate', 'dst_host_rerror_rate', 'dst_host_srv_rerror_rate', 'outcome', 'level']
+
+CATEGORICAL_COLUMNS = ['is_host_login', 'protocol_type', 'service', 'flag', 'land', 'logged_in', 'is_guest_login',
+                       'level', 'outcome']
+
+
+def scale(df_num, cols):
+    """RobustScaler fitted on df_num, as a DataFrame with columns cols."""
+    import pandas as pd
+    from sklearn.preprocessing import RobustScaler
+
+    return pd.DataFrame(RobustScaler().fit_transform(df_num), columns=cols)
+
+
+def preprocess(dataframe):
+    """Scale the numeric columns, binarize the outcome and one-hot encode protocol, service and flag."""
+    import pandas as pd
+
+    df_num = dataframe.drop(CATEGORICAL_COLUMNS, axis=1)
+    num_cols = df_num.columns
+    scaled_df = scale(df_num, num_cols)
+    dataframe.drop(labels=num_cols, axis="columns", inplace=True)
+    dataframe[num_cols] = scaled_df[num_cols]
+
+    dataframe['outcome'] = (dataframe['outcome'] != "normal").astype(int)
+
+    return pd.get_dummies(dataframe, columns=['protocol_type', 'service', 'flag'])
+
+
+class PcaProjection:
+    """The transform() of a fitted, unwhitened sklearn PCA, from its mean and components."""
+
+    def __init__(self, mean, components):
+        self.mean = mean
+        self.components = components
+
+    def transform(self, x):
+        return (np.asarray(x, dtype=self.components.dtype) - self.mean) @ self.components.T
+
+
+class KddCache:
+    """The arrays of one cache directory, opened as read-only memory maps."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as meta:
+            self.meta = json.load(meta)
+        self.feature_columns = self.meta["feature_columns"]
+        self.features = np.load(os.path.join(path, "features.npy"), mmap_mode="r")
+        self.labels = np.load(os.path.join(path, "labels.npy"), mmap_mode="r")
+        self.levels = np.load(os.path.join(path, "levels.npy"), mmap_mode="r")
+        with np.load(os.path.join(path, "pca.npz")) as pca:
+            self.pca = PcaProjection(pca["mean"], pca["components"])
+
+    def split(self, test_size=TEST_SIZE, seed=SPLIT_SEED):
+        """Train and test row indices, the same rows train_test_split() picks from the arrays themselves."""
+        from sklearn.model_selection import train_test_split
+
+        return train_test_split(np.arange(len(self.labels)), test_size=test_size, random_state=seed)
+
+    def dataset(self, indices, batch_size=BATCH_SIZE, shuffle=False, seed=None):
+        """
+        A tf.data pipeline of (features, labels) batches for the given rows,
+        read from the memory maps READ_BATCHES batches at a time as they are
+        needed, and prefetched while the model trains on the ones before.
+        """
+        import tensorflow as tf
+
+        features, labels = self.features, self.labels
+
+        def gather(block):
+            rows = np.sort(block)  # read the memory map front to back
+            order = np.argsort(np.argsort(block))  # then put the rows back in shuffled order
+            return np.asarray(features[rows])[order], np.asarray(labels[rows])[order]
+
+        def load(batch):
+            x, y = tf.numpy_function(gather, [batch], (tf.float32, tf.int64))
+            x.set_shape((None, features.shape[1]))
+            y.set_shape((None,))
+            return x, y
+
+        dataset = tf.data.Dataset.from_tensor_slices(np.asarray(indices, dtype=np.int64))
+        if shuffle:
+            dataset = dataset.shuffle(len(indices), seed=seed, reshuffle_each_iteration=True)
+        dataset = dataset.batch(batch_size * READ_BATCHES).map(load, num_parallel_calls=tf.data.AUTOTUNE)
+        dataset = dataset.flat_map(lambda x, y: tf.data.Dataset.from_tensor_slices((x, y)).batch(batch_size))
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def cache_key(source, pca_components=PCA_COMPONENTS):
+    """Hash of the source file's contents and of everything that shapes what preprocessing makes of it."""
+    digest = hashlib.sha256()
+    with open(source, "rb") as data:
+        for block in iter(lambda: data.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    params = {"version": CACHE_VERSION, "columns": KDD_COLUMNS, "pca_components": pca_components}
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def cache_dir_for(source):
+    return os.path.join(os.path.dirname(os.path.abspath(source)), "cache")
+
+
+def build_cache(source, path, pca_components=PCA_COMPONENTS):
+    """Read and preprocess the source CSV and write its arrays to path."""
+    import pandas as pd
+    from sklearn.decomposition import PCA
+
+    data_train = pd.read_csv(source)
+    data_train.columns = KDD_COLUMNS
+    scaled_train = preprocess(data_train)
+    feature_frame = scaled_train.drop(['outcome', 'level'], axis=1)
+    x = feature_frame.values.astype('float32')
+    y = scaled_train['outcome'].values.astype(np.int64)
+    pca = PCA(n_components=pca_components).fit(x)
+
+    os.makedirs(path)
+    np.save(os.path.join(path, "features.npy"), x)
+    np.save(os.path.join(path, "labels.npy"), y)
+    np.save(os.path.join(path, "levels.npy"), scaled_train['level'].values.astype(np.int64))
+    np.savez(os.path.join(path, "pca.npz"), mean=pca.mean_.astype(np.float32),
+             components=pca.components_.astype(np.float32))
+    with open(os.path.join(path, "meta.json"), "w") as meta:
+        json.dump({"version": CACHE_VERSION, "source": os.path.abspath(source), "rows": len(y),
+                   "pca_components": pca_components, "feature_columns": list(feature_frame.columns)}, meta)
+
+
+def load_kdd_cache(source, cache_dir=None, pca_components=PCA_COMPONENTS, rebuild=False):
+    """
+    The cache for source, built first if there is none for this file and
+    these parameters yet. A new cache is written under a temporary name
+    and renamed into place, so a cache that exists is complete.
+    """
+    cache_dir = cache_dir or cache_dir_for(source)
+    path = os.path.join(cache_dir, f"kdd-v{CACHE_VERSION}-{cache_key(source, pca_components)[:16]}")
+    if rebuild and os.path.exists(path):
+        shutil.rmtree(path)
+    if not os.path.exists(path):
+        print(f"Preprocessing {source} into {path}...")
+        temporary = f"{path}.tmp-{os.getpid()}"
+        try:
+            build_cache(source, temporary, pca_components)
+            os.rename(temporary, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            # Another process finished the same cache first
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+    return KddCache(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess the NSL-KDD training set into an on-disk cache.")
+    parser.add_argument("source", type=str, help="Path to KDDTrain+.txt.")
+    parser.add_argument("--cache-dir", type=str, help="Directory for caches (default: cache/ next to the source).")
+    parser.add_argument("--pca-components", type=int, default=PCA_COMPONENTS,
+                        help=f"Components of the PCA fitted on the features (default: {PCA_COMPONENTS}).")
+    parser.add_argument("--rebuild", action="store_true", help="Preprocess again even if the cache exists.")
+    args = parser.parse_args()
+
+    cache = load_kdd_cache(args.source, args.cache_dir, args.pca_components, args.rebuild)
+    print(f"{cache.path}: {cache.features.shape[0]} rows x {cache.features.shape[1]} features, "
+          f"{int(np.sum(cache.labels))} attacks")
+
+
+if __name__ == "__main__":
+    main()
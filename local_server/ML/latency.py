@@ -0,0 +1,40 @@
+from collections import deque
+import numpy as np
+
+LATENCY_WINDOW = 1000
+# Batch sizes that latency is reported for. The Keras engine also pads every
+# batch up to one of these so that it only ever runs a few traced graphs.
+DEFAULT_BUCKETS = (1, 8, 32, 128)
+
+
+class LatencyTracker:
+    """Recent batch latencies per batch-size bucket, for p50/p99 reporting."""
+
+    def __init__(self, buckets, window=LATENCY_WINDOW):
+        self.buckets = tuple(buckets)
+        self._latencies = {size: deque(maxlen=window) for size in self.buckets}
+
+    def bucket_for(self, count):
+        """Smallest bucket that holds count rows, or the largest bucket."""
+        for size in self.buckets:
+            if count <= size:
+                return size
+        return self.buckets[-1]
+
+    def record(self, bucket, seconds):
+        self._latencies[bucket].append(seconds)
+
+    def report(self):
+        """(bucket, batches, p50 ms, p99 ms) for every bucket that has seen traffic."""
+        report = []
+        for size in self.buckets:
+            latencies = self._latencies[size]
+            if latencies:
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                report.append((size, len(latencies), p50, p99))
+        return report
+
+    def print_report(self):
+        print("\nBatch latency per bucket:")
+        for size, batches, p50, p99 in self.report():
+            print(f"  bucket {size:>4}: {batches:>5} batches  p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
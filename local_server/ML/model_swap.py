@@ -0,0 +1,249 @@
+import os
+import time
+import threading
+from collections import deque
+import numpy as np
+from featurizer import Featurizer
+from packet_ring import HEADER_DTYPE, copy_headers
+
+MODEL_CHECK_INTERVAL = 5.0
+SETTLE_TIME = 2.0  # a model file must be this old before it is loaded, so it is never read half-written
+CANARY_SIZE = 128
+CANARY_REFRESH_INTERVAL = 10.0
+CANARY_ROUNDS = 5
+LATENCY_WINDOW = 200  # batches the latency budget is checked over
+LATENCY_CHECK_EVERY = 50
+
+
+def synthetic_canary(count=CANARY_SIZE):
+    """Packet headers to validate a model on before any traffic has been seen."""
+    records = np.zeros(count, dtype=HEADER_DTYPE)
+    index = np.arange(count)
+    records["packet_size"] = 64 + index * 97 % 1437
+    records["protocol"] = np.array([6, 17, 1])[index % 3]
+    return records
+
+
+def check_confidences(confidences, count):
+    """Why a model's output for count canary records is unusable, or None if it is fine."""
+    confidences = np.asarray(confidences)
+    if confidences.shape != (count,):
+        return f"returned shape {confidences.shape} for {count} records"
+    if not np.isfinite(confidences).all():
+        return "returned NaN or infinite confidences"
+    if confidences.min() < 0 or confidences.max() > 1:
+        return f"returned confidences outside [0, 1] ({confidences.min():.3g} to {confidences.max():.3g})"
+    return None
+
+
+class ModelVersion:
+    """A loaded, warmed-up model with the feature transform it was trained with."""
+
+    def __init__(self, path, mtime, engine, transform):
+        self.path = path
+        self.mtime = mtime
+        self.engine = engine
+        self.transform = transform
+
+    @property
+    def key(self):
+        return self.path, self.mtime
+
+
+class ModelSwapper:
+    """
+    Follow the newest model in a directory without stopping the analyzer.
+
+    The directory is scanned every MODEL_CHECK_INTERVAL seconds for the most
+    recently modified file ending in suffix. A new one is loaded, warmed up
+    and validated on a canary batch in a background thread, with its own
+    transform if one sits next to it: the confidences must have the right
+    shape and lie in [0, 1], and with a latency budget, the canary batch
+    must score within it. poll(), called between batches, then makes it the
+    active version, so no batch is ever scored by half of each.
+
+    The swapper stands in for the engine: predict() runs the active version,
+    and featurizer() builds featurizers that follow its transform. The
+    version it replaced is kept, and it is switched back to if the new one
+    raises or its p99 batch latency exceeds the budget over the last
+    LATENCY_WINDOW batches. A version that was rejected or rolled back is
+    not loaded again unless its file changes.
+
+    Copy new models in under another name and rename them into place.
+    Single-threaded use only: predict(), featurizer() and poll() must be
+    called from the same thread.
+    """
+
+    def __init__(self, directory, suffix, load_engine, load_transform, engine, transform, path,
+                 latency_budget=None):
+        self.directory = directory
+        self.suffix = suffix
+        self.load_engine = load_engine
+        self.load_transform = load_transform
+        self.latency_budget = latency_budget
+        self.active = ModelVersion(os.path.realpath(path), _mtime(path), engine, transform)
+        self.previous = None
+        self.on_switch = None  # called after every switch, e.g. to clear cached verdicts
+        self.swaps = 0
+        self.rollbacks = 0
+        self.rejected = 0
+        self._rejected = set()
+        self._loader = None
+        self._ready = None
+        self._next_check = 0.0
+        self._canary = None
+        self._canary_time = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batches = 0
+
+    # The engine interface, for the active version
+    @property
+    def buckets(self):
+        return self.active.engine.buckets
+
+    @property
+    def latency(self):
+        return self.active.engine.latency
+
+    def warm_up(self):
+        return self.active.engine.warm_up()
+
+    def predict(self, features):
+        start = time.perf_counter()
+        try:
+            confidences = self.active.engine.predict(features)
+        except Exception as e:
+            if self.previous is not None:
+                self._roll_back(f"failed ({e})")
+            raise
+        if self.previous is not None and self.latency_budget is not None:
+            self._latencies.append(time.perf_counter() - start)
+            self._batches += 1
+            if self._batches % LATENCY_CHECK_EVERY == 0 and len(self._latencies) == LATENCY_WINDOW:
+                p99 = np.percentile(self._latencies, 99)
+                if p99 > self.latency_budget:
+                    self._roll_back(f"p99 batch latency {p99 * 1000:.2f} ms is over the budget of "
+                                    f"{self.latency_budget * 1000:.2f} ms")
+        return confidences
+
+    def featurizer(self, capacity, featurizer_class=Featurizer):
+        """A featurizer that uses the active version's transform."""
+        return VersionFeaturizer(self, capacity, featurizer_class)
+
+    def observe(self, records):
+        """Keep a copy of some recent packets to validate the next version on."""
+        now = time.monotonic()
+        if len(records) and now - self._canary_time >= CANARY_REFRESH_INTERVAL:
+            self._canary = copy_headers(records[:CANARY_SIZE])
+            self._canary_time = now
+
+    def poll(self, now=None):
+        """Switch to a validated new version and look for newer ones. Returns True on a switch."""
+        now = time.monotonic() if now is None else now
+        ready, self._ready = self._ready, None
+        if ready is not None:
+            print(f"\nSwitching from model {self.active.path} to {ready.path}")
+            self._activate(ready, self.active)
+            self.swaps += 1
+
+        if now >= self._next_check and (self._loader is None or not self._loader.is_alive()):
+            self._next_check = now + MODEL_CHECK_INTERVAL
+            candidate = self._newest()
+            if candidate is not None:
+                self._loader = threading.Thread(target=self._load, args=candidate, name="model loader", daemon=True)
+                self._loader.start()
+        return ready is not None
+
+    def stats(self):
+        return {"model_swaps": self.swaps, "model_rollbacks": self.rollbacks, "models_rejected": self.rejected}
+
+    def _newest(self):
+        """(path, mtime) of the newest settled model file, if it is one we have not seen."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.name.endswith(self.suffix) and entry.is_file()]
+        except FileNotFoundError:
+            return None
+        if not entries:
+            return None
+        newest = max(entries, key=lambda entry: entry.stat().st_mtime_ns)
+        key = os.path.realpath(newest.path), newest.stat().st_mtime_ns
+        if key == self.active.key or key in self._rejected:
+            return None
+        if time.time() - key[1] / 1e9 < SETTLE_TIME:
+            return None
+        return key
+
+    def _load(self, path, mtime):
+        """Background thread: load, warm up and validate a version, then hand it to poll()."""
+        start = time.perf_counter()
+        try:
+            engine = self.load_engine(path)
+            engine.warm_up()
+            version = ModelVersion(path, mtime, engine, self.load_transform(path))
+            problem = self._validate(version)
+        except Exception as e:
+            problem = f"could not be loaded: {e}"
+        if problem is not None:
+            print(f"\nRejected model {path}: {problem}")
+            self._rejected.add((path, mtime))
+            self.rejected += 1
+            return
+        print(f"\nLoaded and validated model {path} in {time.perf_counter() - start:.2f} s")
+        self._ready = version
+
+    def _validate(self, version):
+        """Why version should not be switched to, or None."""
+        canary = self._canary if self._canary is not None else synthetic_canary()
+        features = Featurizer(len(canary), transform=version.transform)(canary)
+        if features.shape[1] != version.engine.n_features:
+            return f"expects {version.engine.n_features} features, its transform makes {features.shape[1]}"
+        elapsed = []
+        for _ in range(CANARY_ROUNDS):
+            start = time.perf_counter()
+            confidences = version.engine.predict(features)
+            elapsed.append(time.perf_counter() - start)
+        problem = check_confidences(confidences, len(canary))
+        if problem is None and self.latency_budget is not None and min(elapsed) > self.latency_budget:
+            problem = (f"scored the canary batch in {min(elapsed) * 1000:.2f} ms, over the budget of "
+                       f"{self.latency_budget * 1000:.2f} ms")
+        return problem
+
+    def _roll_back(self, reason):
+        print(f"\nModel {self.active.path} {reason}, rolling back to {self.previous.path}")
+        self._rejected.add(self.active.key)
+        self._activate(self.previous, None)
+        self.rollbacks += 1
+
+    def _activate(self, version, previous):
+        self.active = version
+        self.previous = previous
+        self._latencies.clear()
+        self._batches = 0
+        if self.on_switch is not None:
+            self.on_switch()
+
+
+class VersionFeaturizer:
+    """Featurizer that follows the active version's transform, rebuilt whenever the version changes."""
+
+    def __init__(self, models, capacity, featurizer_class=Featurizer):
+        self.models = models
+        self.capacity = capacity
+        self.featurizer_class = featurizer_class
+        self._version = None
+        self._featurizer = None
+
+    def __call__(self, records):
+        version = self.models.active
+        if version is not self._version:
+            self._featurizer = self.featurizer_class(self.capacity, transform=version.transform)
+            self._version = version
+        return self._featurizer(records)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,88 @@
+import os
+import time
+import numpy as np
+from latency import LatencyTracker, DEFAULT_BUCKETS
+
+NUMPY_MODEL_VERSION = 1
+NUMPY_MODEL_SUFFIX = ".npz"
+
+
+def _sigmoid(x):
+    # 0.5 * (1 + tanh(x / 2)) does not overflow for large negative x
+    x *= 0.5
+    np.tanh(x, out=x)
+    x += 1.0
+    x *= 0.5
+    return x
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "sigmoid": _sigmoid,
+    "tanh": lambda x: np.tanh(x, out=x),
+}
+
+
+class NumpyModel:
+    """
+    Forward pass of an exported Dense classifier using only NumPy.
+
+    The weights come from export_numpy.py, which folds BatchNormalization into
+    the Dense layers and drops Dropout, so inference is one matmul, bias add
+    and activation per layer. Exposes the same predict/warm_up/latency
+    interface as inference.InferenceEngine.
+    """
+
+    def __init__(self, kernels, biases, activations, buckets=DEFAULT_BUCKETS):
+        self.kernels = [np.ascontiguousarray(k, dtype=np.float32) for k in kernels]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = [ACTIVATIONS[name] for name in activations]
+        self.n_features = self.kernels[0].shape[0]
+        self.buckets = tuple(sorted(buckets))
+        self.latency = LatencyTracker(self.buckets)
+
+    def forward(self, features):
+        x = np.asarray(features, dtype=np.float32)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = x @ kernel
+            x += bias
+            x = activation(x)
+        return x
+
+    def warm_up(self, rounds=3):
+        start = time.perf_counter()
+        for size in self.buckets:
+            for _ in range(rounds):
+                self.forward(np.zeros((size, self.n_features), dtype=np.float32))
+        return time.perf_counter() - start
+
+    def predict(self, features):
+        """Confidence per row of features, as a 1-D float32 array."""
+        start = time.perf_counter()
+        output = self.forward(features).reshape(-1)
+        self.latency.record(self.latency.bucket_for(len(features)), time.perf_counter() - start)
+        return output
+
+
+def numpy_model_path_for(model_path):
+    """Path of the exported weights that belong next to a Keras model file."""
+    return os.path.splitext(model_path)[0] + NUMPY_MODEL_SUFFIX
+
+
+def load_weights(path):
+    """(kernels, biases, activation names) from an exported .npz."""
+    with np.load(path) as weights:
+        version = int(weights["version"])
+        if version != NUMPY_MODEL_VERSION:
+            raise ValueError(f"Unsupported model version {version} in {path}")
+
+        activations = [str(name) for name in weights["activations"]]
+        kernels = [weights[f"kernel_{i}"] for i in range(len(activations))]
+        biases = [weights[f"bias_{i}"] for i in range(len(activations))]
+    return kernels, biases, activations
+
+
+def load_numpy_model(path, buckets=DEFAULT_BUCKETS):
+    kernels, biases, activations = load_weights(path)
+    return NumpyModel(kernels, biases, activations, buckets)
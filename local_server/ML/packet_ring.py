@@ -0,0 +1,289 @@
+import os
+import errno
+import struct
+import numpy as np
+from numpy.lib import recfunctions
+
+# Version 1 records: binary_packet_t as the forwarder used to write it,
+# still accepted from older feeders
+PACKET_FORMAT = "=L4s4sHB1500s"
+RECORD_SIZE = struct.calcsize(PACKET_FORMAT)
+PAYLOAD_SIZE = 1500
+
+PACKET_DTYPE = np.dtype([
+    ("timestamp", "=u4"),
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("packet_size", "=u2"),
+    ("protocol", "u1"),
+    ("data", "u1", (PAYLOAD_SIZE,)),
+])
+
+assert PACKET_DTYPE.itemsize == RECORD_SIZE
+
+# Version 2 records: must match packet_record_t in forwarder/passthrough.c.
+# Every record starts with the magic and version and is little-endian
+# throughout. The sequence number and payload are only there if the flags
+# say so.
+RECORD_MAGIC = b"NS"
+RECORD_VERSION = 2
+RECORD_PREFIX = RECORD_MAGIC + bytes([RECORD_VERSION])
+FLAG_PORTS = 0x01     # source_port, dest_port and tcp_flags are filled in
+FLAG_PAYLOAD = 0x02   # PAYLOAD_SIZE bytes of the packet follow the header
+FLAG_SEQUENCE = 0x04  # a sequence number follows the header, before any payload
+KNOWN_FLAGS = FLAG_PORTS | FLAG_PAYLOAD | FLAG_SEQUENCE
+LAYOUT_FLAGS = FLAG_PAYLOAD | FLAG_SEQUENCE  # the flags that change the record size
+COMPACT_FORMAT = "<2sBBL4s4sHBBHH"
+COMPACT_SIZE = struct.calcsize(COMPACT_FORMAT)
+
+COMPACT_DTYPE = np.dtype([
+    ("magic", "S2"),
+    ("version", "u1"),
+    ("flags", "u1"),
+    ("timestamp", "<u4"),
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("packet_size", "<u2"),
+    ("protocol", "u1"),
+    ("tcp_flags", "u1"),
+    ("source_port", "<u2"),
+    ("dest_port", "<u2"),
+])
+
+# One dtype per layout, so that dtypes can be compared by identity
+_COMPACT_DTYPES = {
+    flags: np.dtype(COMPACT_DTYPE.descr
+                    + ([("sequence", "<u4")] if flags & FLAG_SEQUENCE else [])
+                    + ([("data", "u1", (PAYLOAD_SIZE,))] if flags & FLAG_PAYLOAD else []))
+    for flags in (0, FLAG_PAYLOAD, FLAG_SEQUENCE, FLAG_PAYLOAD | FLAG_SEQUENCE)
+}
+_COMPACT_DTYPES[0] = COMPACT_DTYPE
+COMPACT_PAYLOAD_DTYPE = _COMPACT_DTYPES[FLAG_PAYLOAD]
+SEQUENCED_DTYPE = _COMPACT_DTYPES[FLAG_SEQUENCE]
+
+assert COMPACT_DTYPE.itemsize == COMPACT_SIZE
+MAX_RECORD_SIZE = max(RECORD_SIZE, *(dtype.itemsize for dtype in _COMPACT_DTYPES.values()))
+
+# The prefix as it reads in the timestamp of a version 1 record, flags masked out
+_PREFIX_WORD = int(np.frombuffer(RECORD_PREFIX + b"\0", dtype="=u4")[0])
+_PREFIX_MASK = int(np.frombuffer(b"\xff" * len(RECORD_PREFIX) + b"\0", dtype="=u4")[0])
+
+# What the featurizer, cache and flow table read, in either version
+HEADER_FIELDS = ["timestamp", "source_ip", "dest_ip", "packet_size", "protocol",
+                 "tcp_flags", "source_port", "dest_port"]
+HEADER_DTYPE = np.dtype([(name, COMPACT_DTYPE.fields[name][0]) for name in HEADER_FIELDS])
+
+
+def compact_dtype(flags):
+    """The dtype of a version 2 record with these flags."""
+    return _COMPACT_DTYPES[flags & LAYOUT_FLAGS]
+
+
+def record_dtype(prefix):
+    """
+    The dtype of the record whose first bytes are prefix, or None if they do
+    not start a version 2 record. Version 1 records have no prefix to go by.
+    """
+    if len(prefix) < len(RECORD_PREFIX) + 1 or bytes(prefix[:len(RECORD_PREFIX)]) != RECORD_PREFIX:
+        return None
+    flags = prefix[len(RECORD_PREFIX)]
+    if flags & ~KNOWN_FLAGS:
+        return None
+    return compact_dtype(flags)
+
+
+def dtype_for_size(size):
+    """The record dtype with this itemsize, for transports with fixed-size slots."""
+    for dtype in (*_COMPACT_DTYPES.values(), PACKET_DTYPE):
+        if dtype.itemsize == size:
+            return dtype
+    return None
+
+
+def copy_headers(records):
+    """Copy the header fields of records out of the ring into a compact array."""
+    if records.dtype.names[:1] == ("magic",):
+        return recfunctions.repack_fields(records[HEADER_FIELDS])
+    # Version 1 records have no ports or flags
+    headers = np.zeros(len(records), dtype=HEADER_DTYPE)
+    for name in HEADER_FIELDS:
+        if name in records.dtype.names:
+            headers[name] = records[name]
+    return headers
+
+DEFAULT_CAPACITY = 4096
+
+
+class PacketRing:
+    """
+    Preallocated buffer of packet records filled with large reads from a pipe.
+
+    Records are handed out as NumPy views over the buffer, so nothing is
+    copied between the read and the consumer. A view stays valid until it is
+    given back with release(): the buffer is only compacted while no record
+    is held, so fill() never moves bytes under a view. With records held and
+    the end of the buffer reached, fill() reports the buffer as full instead.
+
+    The record format is taken from the stream: version 2 records announce
+    themselves with their prefix, anything else is read as version 1. The
+    prefix of every version 2 record is checked, and bytes that do not
+    belong to a record, e.g. left behind by a writer that died mid-record,
+    are skipped up to the next prefix. When the writer switches formats, the
+    ring switches too, once the records before the switch are released.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.dtype = None
+        self.skipped_bytes = 0
+        self._buffer = bytearray(capacity * MAX_RECORD_SIZE)
+        self._view = memoryview(self._buffer)
+        self._records = None
+        self._size = MAX_RECORD_SIZE
+        self._released = 0  # start of records still held by the consumer
+        self._head = 0      # start of records not yet taken
+        self._checked = 0   # end of the records known to be in the current format
+        self._tail = 0      # end of the bytes read so far
+
+    def __len__(self):
+        return (self._checked - self._head) // self._size
+
+    def _compact(self):
+        """Move unread bytes to the front of the buffer, unless records are held."""
+        if self._released == 0 or self._released != self._head:
+            return
+        size = self._tail - self._released
+        if size:
+            self._buffer[:size] = self._buffer[self._released:self._tail]
+        self._head -= self._released
+        self._checked -= self._released
+        self._tail = size
+        self._released = 0
+
+    def _reset_if_empty(self):
+        if self._released == self._tail:
+            self._released = self._head = self._checked = self._tail = 0
+
+    def _switch(self, dtype):
+        """Read records as dtype from _checked on; only called with nothing held."""
+        self._compact()
+        self.dtype = dtype
+        self._size = dtype.itemsize
+        self._records = np.frombuffer(self._buffer, dtype=dtype, count=len(self._buffer) // self._size)
+        version = "version 2" if dtype is not PACKET_DTYPE else "version 1"
+        print(f"\nReading {version} packet records of {self._size} bytes")
+
+    def _drop(self, end):
+        """Remove the bytes from _checked to end, closing the gap."""
+        skipped = end - self._checked
+        self._buffer[self._checked:self._tail - skipped] = self._buffer[end:self._tail]
+        self._tail -= skipped
+        self.skipped_bytes += skipped
+
+    def _skip_garbage(self):
+        """Drop the bytes at _checked up to the next record prefix. Returns False if more bytes are needed."""
+        found = self._buffer.find(RECORD_PREFIX, self._checked + 1, self._tail)
+        if found == -1:
+            # Keep what could be the start of a prefix split across reads
+            found = max(self._checked, self._tail - len(RECORD_PREFIX) + 1)
+        if found == self._checked:
+            return False
+        self._drop(found)
+        return True
+
+    def _check(self):
+        """Extend the checked records over what has been read so far."""
+        while self._tail - self._checked > len(RECORD_PREFIX):
+            dtype = record_dtype(self._view[self._checked:self._checked + len(RECORD_PREFIX) + 1])
+            if dtype is None and self.dtype in (None, PACKET_DTYPE):
+                dtype = PACKET_DTYPE
+            if dtype is None:
+                if not self._skip_garbage():
+                    return
+                continue
+            if dtype is not self.dtype:
+                if self._released != self._checked:
+                    return
+                self._switch(dtype)
+
+            count = (self._tail - self._checked) // self._size
+            if not count:
+                return
+            start = self._checked // self._size
+            records = self._records[start:start + count]
+            if dtype is PACKET_DTYPE:
+                # Stop where a version 2 writer took over
+                bad = np.flatnonzero(records["timestamp"][1:] & _PREFIX_MASK == _PREFIX_WORD) + 1
+            else:
+                flags = records["flags"]
+                bad = np.flatnonzero((records["magic"] != RECORD_MAGIC) | (records["version"] != RECORD_VERSION)
+                                     | (flags & (0xFF ^ KNOWN_FLAGS) != 0) | (flags & LAYOUT_FLAGS != flags[0] & LAYOUT_FLAGS))
+            truncated = -1
+            if len(bad):
+                count = int(bad[0])
+                if dtype is not PACKET_DTYPE:
+                    # A prefix inside the last good record means it was cut short
+                    last = self._checked + (count - 1) * self._size
+                    truncated = self._buffer.find(RECORD_PREFIX, last + 1, last + self._size)
+                    if truncated != -1:
+                        count -= 1
+            self._checked += count * self._size
+            if truncated != -1:
+                self._drop(truncated)
+                continue
+            if self._tail - self._checked < self._size:
+                return
+
+    def is_full(self):
+        """True if fill() has no room left until held records are given back."""
+        if self._released == self._head:
+            return self._tail - self._released == len(self._buffer)
+        return self._tail == len(self._buffer)
+
+    def fill(self, fd):
+        """
+        Read as much as fits from fd into the buffer.
+
+        Returns the number of bytes read, 0 on end of file and None when the
+        pipe has nothing to offer right now or the buffer is full.
+        """
+        if len(self._buffer) - self._tail < MAX_RECORD_SIZE:
+            self._compact()
+        if self._tail == len(self._buffer):
+            return None
+
+        try:
+            count = os.readv(fd, [self._view[self._tail:]])
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            if e.errno in (errno.EINTR, errno.EAGAIN):
+                return None
+            raise
+
+        self._tail += count
+        self._check()
+        return count
+
+    def take(self, max_records=None):
+        """Hand out up to max_records complete records as a view."""
+        count = len(self)
+        if max_records is not None:
+            count = min(count, max_records)
+        start = self._head // self._size
+        self._head += count * self._size
+        return self._records[start:start + count]
+
+    def release(self, records):
+        """Give back records obtained from take(), oldest first."""
+        self._released += len(records) * self._size
+        self._reset_if_empty()
+        if self._released == self._checked:
+            # A format switch may be waiting for everything before it
+            self._check()
+
+    def discard_partial(self):
+        """Drop the bytes of an incomplete record, e.g. after the writer went away."""
+        self._check()
+        self._tail = self._checked
+        self._reset_if_empty()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Score a pcap capture offline with the features the live analyzer computes.
+
+The capture is parsed in bulk by pcap_reader.read_pcap(), optionally in
+parallel chunks, and every IPv4 packet goes through featurizer.Featurizer,
+the same code the analyzer runs on the forwarder's packet records, so a
+capture scores as it would have live without tshark or pyshark.
+"""
+import os
+import time
+import argparse
+import numpy as np
+
+from featurizer import Featurizer
+from feature_transform import load_feature_transform, transform_path_for
+from pcap_reader import read_pcap
+
+FEATURE_BATCH = 1 << 16  # packets featurized at once, so memory stays flat on large captures
+
+
+def packet_features(packets, transform=None, batch=FEATURE_BATCH):
+    """
+    The float32 feature matrix for PCAP_PACKET_DTYPE packets. Without a
+    transform the numeric columns are standardized per batch, as the
+    analyzer does per batch of records.
+    """
+    featurizer = Featurizer(min(batch, max(len(packets), 1)), transform=transform)
+    features = np.empty((len(packets), featurizer.n_features), dtype=np.float32)
+    for start in range(0, len(packets), batch):
+        features[start:start + batch] = featurizer(packets[start:start + batch])
+    return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the packets of a pcap capture with the analyzer's features.")
+    parser.add_argument("capture", type=str, help="Path to a classic pcap capture.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("output", type=str, help="Path to save the output CSV file.")
+    parser.add_argument("--numpy-model", type=str,
+                        help="Path to the exported .npz weights, run with NumPy (default: next to the model).")
+    parser.add_argument("--transform", type=str, help="Path to the fitted feature transform (default: next to the model).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes parsing the capture in chunks, 0 for none (default: one per CPU).")
+    args = parser.parse_args()
+
+    from numpy_model import load_numpy_model, numpy_model_path_for
+    import pandas as pd
+
+    start = time.monotonic()
+    packets, frames = read_pcap(args.capture, args.workers if args.workers > 1 else 0)
+    print(f"Read {len(packets)} IPv4 packets out of {frames} frames in {time.monotonic() - start:.2f} s")
+
+    transform_path = args.transform or transform_path_for(args.model)
+    transform = None
+    if os.path.exists(transform_path):
+        transform = load_feature_transform(transform_path)
+    else:
+        print(f"No feature transform at {transform_path}, scaling every {FEATURE_BATCH} packets by themselves")
+    engine = load_numpy_model(args.numpy_model or numpy_model_path_for(args.model))
+    confidences = engine.predict(packet_features(packets, transform))
+
+    addresses = {}
+    for name in ("source_ip", "dest_ip"):
+        octets = packets[name].astype(str)
+        addresses[name] = [".".join(row) for row in octets.tolist()]
+    pd.DataFrame({
+        "time": packets["time"],
+        "src_ip": addresses["source_ip"],
+        "dest_ip": addresses["dest_ip"],
+        "protocol": packets["protocol"],
+        "confidence": confidences,
+    }).to_csv(args.output, index=False)
+    print(f"Results saved to {args.output} ({len(packets) / (time.monotonic() - start):,.0f} packets/s)")
+
+
+if __name__ == "__main__":
+    main()
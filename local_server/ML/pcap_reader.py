@@ -0,0 +1,197 @@
+import mmap
+import struct
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Classic libpcap files only; pcapng starts with a section header block instead
+PCAP_HEADER_SIZE = 24
+FRAME_HEADER_SIZE = 16
+MICROSECOND_MAGIC = 0xA1B2C3D4
+NANOSECOND_MAGIC = 0xA1B23C4D
+PCAPNG_MAGIC = 0x0A0D0D0A
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+# Where the link-layer header says what it carries, and where the IP header starts
+LINK_LAYERS = {
+    LINKTYPE_NULL: (None, 4),
+    LINKTYPE_ETHERNET: (12, 14),
+    LINKTYPE_RAW: (None, 0),
+    LINKTYPE_LINUX_SLL: (14, 16),
+    LINKTYPE_IPV4: (None, 0),
+}
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+AF_INET = 2
+
+PROTOCOL_TCP = 6
+PROTOCOL_UDP = 17
+
+CHUNK_FRAMES = 1 << 18  # frames parsed per task with read_pcap(workers=...)
+
+# What the forwarder puts in a packet record, plus the capture time and
+# whether the ports and TCP flags could be read
+PCAP_PACKET_DTYPE = np.dtype([
+    ("time", "=f8"),
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("packet_size", "=u2"),
+    ("protocol", "u1"),
+    ("tcp_flags", "u1"),
+    ("source_port", "=u2"),
+    ("dest_port", "=u2"),
+    ("has_ports", "?"),
+])
+
+
+def is_pcap(path):
+    """True if path starts like a classic or pcapng capture file."""
+    with open(path, "rb") as capture:
+        start = capture.read(4)
+    if len(start) < 4:
+        return False
+    return any(struct.unpack(byte_order + "I", start)[0] in (MICROSECOND_MAGIC, NANOSECOND_MAGIC, PCAPNG_MAGIC)
+               for byte_order in "<>")
+
+
+def _read(data, positions, dtype):
+    """The dtype value at each byte position of data; positions past the end read the last bytes instead."""
+    dtype = np.dtype(dtype)
+    positions = np.minimum(positions, len(data) - dtype.itemsize)
+    return data[positions[:, None] + np.arange(dtype.itemsize)].view(dtype).ravel()
+
+
+def _frame_offsets(buffer, size, byte_order):
+    """Offsets of the frame headers; each frame's length says where the next one starts."""
+    captured_length = struct.Struct(byte_order + "I")
+    offsets = []
+    offset = PCAP_HEADER_SIZE
+    while offset + FRAME_HEADER_SIZE <= size:
+        offsets.append(offset)
+        offset += FRAME_HEADER_SIZE + captured_length.unpack_from(buffer, offset + 8)[0]
+    if offset > size:
+        offsets.pop()  # cut short, e.g. by a capture that is still running
+    return np.array(offsets, dtype=np.int64)
+
+
+def _file_header(buffer):
+    """The byte order, magic number and link type of a classic pcap file."""
+    if len(buffer) < PCAP_HEADER_SIZE:
+        raise ValueError("Not a pcap file: too short for the file header")
+    for byte_order in ("<", ">"):
+        magic, = struct.unpack_from(byte_order + "I", buffer, 0)
+        if magic in (MICROSECOND_MAGIC, NANOSECOND_MAGIC):
+            break
+    else:
+        if magic == PCAPNG_MAGIC:
+            raise ValueError("pcapng files are not supported; convert with: editcap -F pcap in.pcapng out.pcap")
+        raise ValueError(f"Not a pcap file: unknown magic {magic:#010x}")
+    link_type = struct.unpack_from(byte_order + "I", buffer, 20)[0] & 0xFFFF
+    if link_type not in LINK_LAYERS:
+        raise ValueError(f"Unsupported pcap link type {link_type}")
+    return byte_order, magic, link_type
+
+
+def parse_frames(buffer, offsets, byte_order, magic, link_type):
+    """The IPv4 packets among the frames whose headers start at offsets, as a PCAP_PACKET_DTYPE array."""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    frames = offsets + FRAME_HEADER_SIZE
+    seconds = _read(data, offsets, byte_order + "u4")
+    fraction = _read(data, offsets + 4, byte_order + "u4")
+    captured = _read(data, offsets + 8, byte_order + "u4").astype(np.int64)
+    original = _read(data, offsets + 12, byte_order + "u4")
+    frame_ends = frames + captured
+
+    type_offset, ip_offset = LINK_LAYERS[link_type]
+    ip = frames + ip_offset
+    if type_offset is not None:
+        ethertype = _read(data, frames + type_offset, ">u2")
+        if link_type == LINKTYPE_ETHERNET:
+            tagged = ethertype == ETHERTYPE_VLAN
+            ethertype[tagged] = _read(data, frames[tagged] + type_offset + 4, ">u2")
+            ip[tagged] += 4
+        is_ipv4 = ethertype == ETHERTYPE_IPV4
+    elif link_type == LINKTYPE_NULL:
+        # The address family is in the byte order of the machine that captured it
+        family = _read(data, frames, "<u4")
+        is_ipv4 = (family == AF_INET) | (family == AF_INET << 24)
+    else:
+        is_ipv4 = np.ones(len(frames), dtype=bool)
+    is_ipv4 &= ip + 20 <= frame_ends
+    is_ipv4 &= data[np.minimum(ip, len(data) - 1)] >> 4 == 4
+
+    ip, frame_ends = ip[is_ipv4], frame_ends[is_ipv4]
+    packets = np.zeros(len(ip), dtype=PCAP_PACKET_DTYPE)
+    scale = 1e-9 if magic == NANOSECOND_MAGIC else 1e-6
+    packets["time"] = seconds[is_ipv4] + fraction[is_ipv4] * scale
+    packets["packet_size"] = np.minimum(original[is_ipv4], 0xFFFF)
+    packets["source_ip"] = data[ip[:, None] + np.arange(12, 16)]
+    packets["dest_ip"] = data[ip[:, None] + np.arange(16, 20)]
+    protocol = data[ip + 9]
+    packets["protocol"] = protocol
+
+    # Ports and TCP flags, from the first fragment of a TCP or UDP packet only
+    transport = ip + (data[ip] & 0x0F).astype(np.int64) * 4
+    first_fragment = _read(data, ip + 6, ">u2") & 0x1FFF == 0
+    tcp = first_fragment & (protocol == PROTOCOL_TCP) & (transport + 20 <= frame_ends)
+    udp = first_fragment & (protocol == PROTOCOL_UDP) & (transport + 8 <= frame_ends)
+    has_ports = tcp | udp
+    packets["has_ports"] = has_ports
+    packets["source_port"] = np.where(has_ports, _read(data, transport, ">u2"), 0)
+    packets["dest_port"] = np.where(has_ports, _read(data, transport + 2, ">u2"), 0)
+    packets["tcp_flags"] = np.where(tcp, data[np.minimum(transport + 13, len(data) - 1)], 0)
+    return packets
+
+
+def parse_pcap(buffer):
+    """
+    The IPv4 packets in a classic pcap file held in buffer, as a
+    PCAP_PACKET_DTYPE array, and how many frames the file holds in all.
+
+    Only walking from one frame header to the next is done per frame; every
+    field is then read for all frames at once. Frames that are not IPv4,
+    or too short for an IP header, are left out.
+    """
+    byte_order, magic, link_type = _file_header(buffer)
+    offsets = _frame_offsets(buffer, len(buffer), byte_order)
+    return parse_frames(buffer, offsets, byte_order, magic, link_type), len(offsets)
+
+
+def _map(capture):
+    return mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _parse_chunk(path, offsets, header):
+    """Pool task: parse_frames() over the worker's own mapping of the file."""
+    with open(path, "rb") as capture, _map(capture) as buffer:
+        return parse_frames(buffer, offsets, *header)
+
+
+def read_pcap(path, workers=0, chunk_frames=CHUNK_FRAMES):
+    """
+    parse_pcap() over a memory-mapped capture file. With workers, the frame
+    headers are still walked here, but the frames are parsed in chunks of
+    chunk_frames by a pool of that many processes, each mapping the file
+    itself, and put back together in file order.
+    """
+    with open(path, "rb") as capture, _map(capture) as buffer:
+        # Every array parse_pcap() returns is a copy, so the mapping can go
+        if workers <= 0:
+            return parse_pcap(buffer)
+        header = _file_header(buffer)
+        offsets = _frame_offsets(buffer, len(buffer), header[0])
+    chunks = [offsets[start:start + chunk_frames] for start in range(0, len(offsets), chunk_frames)]
+    if len(chunks) < 2:
+        return read_pcap(path)
+    # Forked, not spawned, so a calling script without a __main__ guard is
+    # not run again in every worker. Forking a process that has started
+    # threads, e.g. by running TensorFlow, can deadlock: read first, or
+    # leave workers at 0
+    context = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(min(workers, len(chunks)), mp_context=context) as pool:
+        parts = list(pool.map(_parse_chunk, [path] * len(chunks), chunks, [header] * len(chunks)))
+    return np.concatenate(parts), len(offsets)
@@ -0,0 +1,158 @@
+import os
+import errno
+from collections import deque
+
+OUTPUT_BUFFER_LIMIT = 1024 * 1024
+IOV_MAX = 1024
+
+
+class InputPipe:
+    """
+    Non-blocking read end of a FIFO that never reports end of file.
+
+    A write end is held open alongside the read end, so the FIFO stays
+    quiet instead of signalling EOF on every select while the producer is
+    away, and the producer can reconnect at any time. If the FIFO on disk is
+    replaced, replaced() notices and the caller reopens it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self._keepalive_fd = None
+        self._inode = None
+
+    def is_open(self):
+        return self.fd is not None
+
+    def open(self):
+        if not os.path.exists(self.path):
+            return False
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            self._keepalive_fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            print(f"Error opening {self.path}: {e}")
+            self.close()
+            return False
+        self._inode = os.fstat(self.fd).st_ino
+        return True
+
+    def replaced(self):
+        """True if the path no longer points at the FIFO we have open."""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def close(self):
+        for fd in (self.fd, self._keepalive_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.fd = self._keepalive_fd = None
+
+
+class OutputPipe:
+    """
+    Non-blocking write end of a FIFO that buffers instead of dropping.
+
+    Data that cannot be written right away, because the pipe is full or the
+    reader is away, is queued and written when the pipe becomes writable
+    again. Only when more than limit bytes are queued are the oldest queued
+    records dropped, and those are counted, along with the bytes accepted
+    and the most ever queued.
+    """
+
+    def __init__(self, path, limit=OUTPUT_BUFFER_LIMIT):
+        self.path = path
+        self.limit = limit
+        self.fd = None
+        self.accepted_bytes = 0
+        self.dropped_bytes = 0
+        self.high_water_bytes = 0
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._head_written = 0  # bytes of the first queued chunk already in the pipe
+
+    def is_open(self):
+        return self.fd is not None
+
+    def open(self):
+        try:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            return True
+        except OSError as e:
+            # ENXIO: nobody has the FIFO open for reading yet
+            if e.errno not in (errno.ENXIO, errno.ENOENT):
+                print(f"Error opening {self.path}: {e}")
+            return False
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+        self.fd = None
+
+    @property
+    def queued_bytes(self):
+        return self._queued_bytes
+
+    def wants_write(self):
+        return self.fd is not None and self._queued_bytes > 0
+
+    def write(self, data):
+        """Write data now if possible, otherwise queue it. Returns False if data had to be dropped."""
+        self._queue.append(data)
+        self._queued_bytes += len(data)
+        self.accepted_bytes += len(data)
+        self.flush()
+        kept = self._enforce_limit(data)
+        self.high_water_bytes = max(self.high_water_bytes, self._queued_bytes)
+        return kept
+
+    def flush(self):
+        """Write as much queued data as the pipe accepts."""
+        while self.fd is not None and self._queue:
+            chunks = [memoryview(chunk) for chunk in list(self._queue)[:IOV_MAX]]
+            chunks[0] = chunks[0][self._head_written:]
+            try:
+                written = os.writev(self.fd, chunks)
+            except BlockingIOError:
+                return
+            except BrokenPipeError:
+                print(f"\nReader of {self.path} went away, buffering output")
+                self.close()
+                return
+            except OSError as e:
+                if e.errno in (errno.EINTR, errno.EAGAIN):
+                    return
+                raise
+            self._consume(written)
+
+    def _consume(self, written):
+        self._queued_bytes -= written
+        written += self._head_written
+        while self._queue and written >= len(self._queue[0]):
+            written -= len(self._queue.popleft())
+        self._head_written = written
+
+    def _enforce_limit(self, newest):
+        """Drop whole queued chunks, oldest first, until the queue fits the limit."""
+        kept = True
+        # A partly written first chunk has to be finished to keep records aligned
+        first = 1 if self._head_written else 0
+        while self._queued_bytes > self.limit and len(self._queue) > first:
+            if first:
+                chunk = self._queue[1]
+                del self._queue[1]
+            else:
+                chunk = self._queue.popleft()
+            self._queued_bytes -= len(chunk)
+            self.dropped_bytes += len(chunk)
+            kept = kept and chunk is not newest
+        return kept
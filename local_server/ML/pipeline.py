@@ -0,0 +1,154 @@
+import time
+import queue
+import threading
+
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+QUEUE_POLL_INTERVAL = 0.1
+
+
+class StageQueue:
+    """
+    Bounded queue of batches between two pipeline stages.
+
+    When the queue is full, "block" makes the producer wait (backpressure),
+    "drop_oldest" discards the oldest queued batch to make room and
+    "drop_newest" discards the batch being put. Dropped batches and records
+    are counted. Every item is a tuple whose first element holds the batch's
+    records.
+    """
+
+    def __init__(self, name, maxsize, policy="block"):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {policy}")
+        self.name = name
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped_batches = 0
+        self.dropped_records = 0
+        self.high_water = 0
+        self._queue = queue.Queue(maxsize)
+
+    def _dropped(self, item):
+        self.dropped_batches += 1
+        self.dropped_records += len(item[0])
+
+    def put(self, item, stop_event=None):
+        """Queue item according to the drop policy. Returns False if it was dropped."""
+        if self.policy == "block":
+            while True:
+                try:
+                    self._queue.put(item, timeout=QUEUE_POLL_INTERVAL)
+                    break
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+        elif self.policy == "drop_newest":
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self._dropped(item)
+                return False
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self._dropped(self._queue.get_nowait())
+                    except queue.Empty:
+                        pass
+
+        self.high_water = max(self.high_water, self._queue.qsize())
+        return True
+
+    def get(self, timeout):
+        """Next item, or None if nothing arrived within timeout seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self):
+        return self._queue.qsize()
+
+
+class StageCounters:
+    """
+    Records handled and time split into busy (doing the stage's work),
+    blocked (waiting for room downstream) and, implicitly, idle (waiting for
+    input), so that utilization shows which stage limits throughput.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.records = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0
+        self.started_at = time.monotonic()
+
+    def utilization(self):
+        """Fractions of time spent (busy, blocked) since the stage started."""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return self.busy_time / elapsed, self.blocked_time / elapsed
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread that applies work() to every item of its inbox.
+
+    Results other than None go to the outbox. idle_work, if given, runs
+    whenever the inbox stays empty for idle_timeout seconds.
+    """
+
+    def __init__(self, name, work, inbox, outbox=None, stop_event=None, idle_work=None,
+                 idle_timeout=QUEUE_POLL_INTERVAL):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop_event = stop_event or threading.Event()
+        self.idle_work = idle_work
+        self.idle_timeout = idle_timeout
+        self.counters = StageCounters(name)
+
+    def run(self):
+        counters = self.counters
+        counters.started_at = time.monotonic()
+        while not self.stop_event.is_set():
+            item = self.inbox.get(self.idle_timeout)
+            if item is None:
+                if self.idle_work is not None:
+                    self.idle_work()
+                continue
+
+            start = time.monotonic()
+            try:
+                result = self.work(item)
+            except Exception as e:
+                print(f"\nError in {self.name} stage: {e}")
+                counters.errors += 1
+                continue
+            finally:
+                counters.busy_time += time.monotonic() - start
+            counters.batches += 1
+            counters.records += len(item[0])
+
+            if self.outbox is not None and result is not None:
+                start = time.monotonic()
+                self.outbox.put(result, self.stop_event)
+                counters.blocked_time += time.monotonic() - start
+
+
+def print_pipeline_report(counters, queues):
+    print("\nPipeline stages:")
+    for stage in counters:
+        busy, blocked = stage.utilization()
+        print(f"  {stage.name:>10}: {stage.records:>10} records  busy {busy:6.1%}  "
+              f"blocked {blocked:6.1%}  errors {stage.errors}")
+    for stage_queue in queues:
+        print(f"  {stage_queue.name:>10} queue: depth {stage_queue.depth()}/{stage_queue.maxsize} "
+              f"(high water {stage_queue.high_water}, {stage_queue.policy})  "
+              f"dropped {stage_queue.dropped_records} records in {stage_queue.dropped_batches} batches")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Loss and backpressure counters of the forwarder -> ML -> pyscript pipeline.
+
+Every stage keeps monotonic counters and rewrites them, about once a
+second, to a small key=value file named after the stage in STATS_DIR:
+records produced and consumed, records dropped by reason and queue high
+water marks. Run this module to watch them live:
+
+    python pipeline_stats.py              # refresh every second
+    python pipeline_stats.py --once       # totals and rates since each stage started
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+
+STATS_DIR = "/shared/stats"
+STATS_INTERVAL = 1.0
+STALE_AFTER = 10.0  # a stage whose file is older than this is shown as stopped
+REORDER_LIMIT = 1 << 16  # sequence numbers further back than this mean the forwarder restarted
+
+STAGES = ("forwarder", "ml", "pyscript")
+METADATA = ("started", "updated")
+GAUGES = ("output_queued",)
+
+
+def is_gauge(name):
+    """True for counters that are levels rather than running totals."""
+    return name in GAUGES or name.endswith("_high_water")
+
+
+def write_stats(path, counters):
+    """Replace the stats file at path with counters, atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as stats_file:
+        for name, value in counters.items():
+            stats_file.write(f"{name}={value}\n")
+    os.replace(tmp_path, path)
+
+
+def read_stats(path):
+    """The counters in a stats file, or None if there is none."""
+    stats = {}
+    try:
+        with open(path) as stats_file:
+            for line in stats_file:
+                name, _, value = line.strip().partition("=")
+                try:
+                    stats[name] = float(value) if name in METADATA else int(value)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return None
+    return stats
+
+
+class StatsWriter(threading.Thread):
+    """
+    Write the counters returned by collect() to STATS_DIR/<stage> every
+    interval seconds, from a daemon thread, so the analyzer loop does not
+    have to wake up for it.
+    """
+
+    def __init__(self, stage, collect, directory=STATS_DIR, interval=STATS_INTERVAL):
+        super().__init__(name=f"{stage} stats", daemon=True)
+        self.directory = directory
+        self.path = os.path.join(directory, stage)
+        self.collect = collect
+        self.interval = interval
+        self.started = time.time()
+        self._stop_event = threading.Event()
+
+    def write(self):
+        counters = {"started": f"{self.started:.3f}", "updated": f"{time.time():.3f}"}
+        counters.update(self.collect())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_stats(self.path, counters)
+        except OSError as e:
+            print(f"\nError writing {self.path}: {e}")
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop_event.set()
+        self.write()
+
+
+class SequenceTracker:
+    """
+    Count records lost between the forwarder and us from their sequence numbers.
+
+    The forwarder numbers the records it means to send from 0 when it
+    starts, so a record dropped anywhere on the way leaves a gap. Its two
+    capture threads can hand records over slightly out of order, so a record
+    counts as missing while it has not arrived and a higher number has.
+    Records without sequence numbers (older formats) are only counted.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.resets = 0
+        self._lost = 0        # missing before the last reset
+        self._numbered = 0    # records with sequence numbers since the last reset
+        self._first = None    # lowest and highest number seen, unwrapped
+        self._highest = None
+
+    @property
+    def missing(self):
+        if self._highest is None:
+            return self._lost
+        return self._lost + max(0, self._highest - self._first + 1 - self._numbered)
+
+    def reset(self):
+        """Start over, e.g. when the forwarder was restarted."""
+        if self._highest is not None:
+            self._lost = self.missing
+            self.resets += 1
+        self._numbered = 0
+        self._first = self._highest = None
+
+    def update(self, records):
+        self.received += len(records)
+        if not len(records) or "sequence" not in records.dtype.names:
+            return
+        sequences = records["sequence"].astype(np.int64)
+        if self._highest is None:
+            self._first = self._highest = int(sequences[0])
+        # Distance from the highest number seen, across the 2^32 wrap
+        offsets = (sequences - (self._highest & 0xFFFFFFFF) + 2 ** 31) % 2 ** 32 - 2 ** 31
+        if offsets.min() < -REORDER_LIMIT:
+            self.reset()
+            self._first = self._highest = int(sequences[0])
+            offsets = (sequences - self._highest + 2 ** 31) % 2 ** 32 - 2 ** 31
+        base = self._highest
+        self._first = min(self._first, base + int(offsets.min()))
+        self._highest = max(self._highest, base + int(offsets.max()))
+        self._numbered += len(records)
+
+
+# What the CLI derives loss rates from: (label, stage, lost counters, stage, counter they are a share of)
+LOSSES = [
+    ("forwarder, pipe full", "forwarder", ["dropped_pipe_full"], "forwarder", "records"),
+    ("forwarder, pipe error", "forwarder", ["dropped_pipe_error"], "forwarder", "records"),
+    ("forwarder, ring full", "forwarder", ["dropped_ring_full"], "forwarder", "records"),
+    ("forwarder -> ml, any cause", "ml", ["missing"], "forwarder", "records"),
+    ("ml queues and workers", "ml", ["dropped_queue_full", "dropped_worker_restart"], "ml", "consumed"),
+    ("ml -> analysis pipe", "ml", ["dropped_output"], "ml", "emitted"),
+    ("pyscript", "pyscript", ["partial", "errors"], "pyscript", "consumed"),
+]
+
+
+def read_all(directory):
+    return {stage: read_stats(os.path.join(directory, stage)) for stage in STAGES}
+
+
+def deltas(current, previous):
+    """Counter increases since previous, or since the stage started if it restarted in between."""
+    if previous is None or previous.get("started") != current.get("started"):
+        elapsed = current.get("updated", 0) - current.get("started", 0)
+        return {name: value for name, value in current.items() if name not in METADATA}, elapsed
+    elapsed = current["updated"] - previous["updated"]
+    return {name: value - previous.get(name, 0) for name, value in current.items() if name not in METADATA}, elapsed
+
+
+def print_stats(snapshot, previous, now):
+    print(time.strftime("%H:%M:%S"))
+    changes = {}
+    for stage in STAGES:
+        stats = snapshot[stage]
+        if stats is None:
+            print(f"{stage}: no stats yet")
+            continue
+        age = now - stats.get("updated", 0)
+        uptime = stats.get("updated", 0) - stats.get("started", 0)
+        state = f"stopped {age:.0f} s ago" if age > STALE_AFTER else f"up {uptime:.0f} s"
+        print(f"{stage} ({state})")
+        delta, elapsed = deltas(stats, (previous or {}).get(stage))
+        changes[stage] = delta
+        for name, value in stats.items():
+            if name in METADATA:
+                continue
+            if is_gauge(name):
+                print(f"  {name:<24}{value:>14,}")
+            else:
+                rate = delta[name] / elapsed if elapsed > 0 else 0.0
+                print(f"  {name:<24}{value:>14,}{rate:>14,.0f}/s")
+
+    print("loss")
+    for label, stage, counters, total_stage, total in LOSSES:
+        if stage not in changes or total_stage not in changes:
+            continue
+        # missing can shrink while out-of-order records catch up
+        lost = max(0, sum(changes[stage].get(name, 0) for name in counters))
+        share = lost / changes[total_stage][total] if changes[total_stage].get(total) else 0.0
+        print(f"  {label:<24}{share:>14.2%}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show live loss rates of the packet pipeline.")
+    parser.add_argument("--dir", default=STATS_DIR, help=f"Directory of the stats files (default: {STATS_DIR})")
+    parser.add_argument("--interval", type=float, default=STATS_INTERVAL,
+                        help=f"Seconds between refreshes (default: {STATS_INTERVAL:.0f})")
+    parser.add_argument("--once", action="store_true",
+                        help="Print totals and rates since each stage started, then exit")
+    args = parser.parse_args()
+
+    previous = None
+    try:
+        while True:
+            snapshot = read_all(args.dir)
+            print_stats(snapshot, previous, time.time())
+            if args.once:
+                break
+            previous = snapshot
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
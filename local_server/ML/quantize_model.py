@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Quantize the exported classifier to int8 for the analyzer's int8 runtime.
+
+Post-training full-integer quantization with the TFLite converter: weights
+and activations become int8, with the activation ranges calibrated on
+labeled conn.log samples run through the model's fitted feature transform.
+The model's input and output stay float32, so the analyzer feeds it the
+same features as the float runtimes.
+
+The graph is built from the .npz written by export_numpy.py, so it is the
+same folded Dense stack the NumPy runtime runs, with no Keras variables.
+"""
+import argparse
+import os
+import numpy as np
+
+from numpy_model import load_weights, numpy_model_path_for
+from tflite_model import tflite_model_path_for
+from feature_transform import load_feature_transform, transform_path_for
+
+CALIBRATION_SAMPLES = 1000
+LABEL_COLUMN = 21  # "label" in the labeled conn.log layout read by main.ipynb
+
+
+def load_samples(path, transform=None, limit=None, seed=0):
+    """
+    Features and labels (1 for malicious) of up to limit random rows of a
+    headerless labeled conn.log CSV. Without a transform, features are
+    scaled over the sample, as always_cli.preprocess_data() does per batch.
+    """
+    import pandas as pd
+
+    data = pd.read_csv(path, header=None, low_memory=False)
+    if limit is not None and len(data) > limit:
+        data = data.sample(limit, random_state=seed)
+    labels = data.iloc[:, LABEL_COLUMN].astype(str).str.strip().str.lower().str.startswith("malicious")
+
+    if transform is not None:
+        features = transform.transform_frame(data)
+    else:
+        from always_cli import preprocess_data
+        features = preprocess_data(data.reset_index(drop=True)).to_numpy()
+    return np.asarray(features, dtype=np.float32), labels.to_numpy(dtype=np.int32)
+
+
+def quantize(kernels, biases, activations, calibration):
+    """int8 TFLite flatbuffer of a Dense stack, with activation ranges taken from calibration."""
+    import tensorflow as tf
+
+    functions = {"linear": tf.identity, "relu": tf.nn.relu, "sigmoid": tf.sigmoid, "tanh": tf.tanh}
+    layers = [(tf.constant(kernel), tf.constant(bias), functions[name])
+              for kernel, bias, name in zip(kernels, biases, activations)]
+
+    @tf.function(input_signature=[tf.TensorSpec((None, kernels[0].shape[0]), tf.float32)])
+    def forward(x):
+        for kernel, bias, activation in layers:
+            x = activation(tf.matmul(x, kernel) + bias)
+        return x
+
+    def representative_dataset():
+        for row in calibration:
+            yield [row[None, :]]
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([forward.get_concrete_function()], forward)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the exported classifier to int8 for --runtime int8.")
+    parser.add_argument("model", type=str, help="Path to the trained Keras model file.")
+    parser.add_argument("output", type=str, nargs="?",
+                        help="Path of the .tflite to write (default: next to the model).")
+    parser.add_argument("--calibration", type=str, required=True,
+                        help="Headerless labeled conn.log CSV to calibrate activation ranges on.")
+    parser.add_argument("--samples", type=int, default=CALIBRATION_SAMPLES,
+                        help=f"Random rows of the CSV to calibrate on (default: {CALIBRATION_SAMPLES}).")
+    parser.add_argument("--numpy-model", type=str,
+                        help="Path to the exported .npz weights (default: next to the model).")
+    parser.add_argument("--transform", type=str,
+                        help="Path to the fitted feature transform (default: next to the model).")
+    args = parser.parse_args()
+
+    numpy_path = args.numpy_model or numpy_model_path_for(args.model)
+    kernels, biases, activations = load_weights(numpy_path)
+
+    transform_path = args.transform or transform_path_for(args.model)
+    transform = None
+    if os.path.exists(transform_path):
+        transform = load_feature_transform(transform_path)
+    else:
+        print(f"No feature transform at {transform_path}, scaling the calibration samples by themselves")
+    calibration, _ = load_samples(args.calibration, transform, args.samples)
+
+    output_path = args.output or tflite_model_path_for(args.model)
+    flatbuffer = quantize(kernels, biases, activations, calibration)
+    with open(output_path, "wb") as output:
+        output.write(flatbuffer)
+
+    print(f"Quantized {len(kernels)} Dense layers from {numpy_path} ({os.path.getsize(numpy_path) / 1024:.1f} KB) "
+          f"to int8 in {output_path} ({len(flatbuffer) / 1024:.1f} KB), calibrated on {len(calibration)} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,44 @@ import time
 import struct
 import signal
 import errno
+import fcntl
+import select
+import argparse
+from collections import deque
+import numpy as np
 
 PIPE_NAME = "/tmp/analysis_pipe"
 RECORD_SIZE = 12  # 4 bytes src_ip + 4 bytes dst_ip + 4 bytes float confidence
+READ_RECORDS = 4096  # records asked for per read
 RECONNECT_DELAY = 0.1
 READ_TIMEOUT = 0.01
 
+# --monitor: the summary covers the last MONITOR_WINDOW seconds, is redrawn
+# every MONITOR_REFRESH seconds, and the pipe is drained every MONITOR_POLL
+# seconds rather than on every write, so a busy pipe costs few wakeups
+MONITOR_WINDOW = 10
+MONITOR_REFRESH = 1.0
+MONITOR_POLL = 0.05
+MONITOR_TOP = 10
+MONITOR_THRESHOLD = 0.9  # pyscript's mlCaution before it has pulled any settings
+HISTOGRAM_BINS = 10
+HISTOGRAM_WIDTH = 40
+PIPE_BUFFER_SIZE = 1 << 20  # asked for with --monitor, so a poll interval of verdicts fits
+
+VERDICT_DTYPE = np.dtype([
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("confidence", "=f4"),
+])
+
+# --timestamp-log entries: every record as received, followed by when, on
+# the monotonic clock, which is shared by all processes on the host
+RECEIVE_LOG_FORMAT = "=4s4sfd"
+RECEIVE_LOG_DTYPE = np.dtype(VERDICT_DTYPE.descr + [("time", "=f8")])
+
+assert VERDICT_DTYPE.itemsize == RECORD_SIZE
+assert RECEIVE_LOG_DTYPE.itemsize == struct.calcsize(RECEIVE_LOG_FORMAT)
+
 def cleanup():
     """Cleanup function."""
     try:
@@ -28,6 +60,110 @@ def ip_bytes_to_str(ip_bytes):
     """Convert IP address from bytes to string."""
     return '.'.join(str(b) for b in ip_bytes)
 
+def reduce_sources(keys, counts, sums, maxes):
+    """Per-source verdict counts, confidence sums and maxima, with each source once."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return (keys[starts], np.add.reduceat(counts[order], starts), np.add.reduceat(sums[order], starts),
+            np.maximum.reduceat(maxes[order], starts))
+
+def merge_sources(parts):
+    if len(parts) == 1:
+        return parts[0]
+    return reduce_sources(*(np.concatenate(column) for column in zip(*parts)))
+
+class Aggregate:
+    """Verdict count, confidence histogram and per-source confidence for one second."""
+
+    def __init__(self, second):
+        self.second = second
+        self.count = 0
+        self.above = 0
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.sources = []  # reduce_sources() tuples, merged when read
+
+    def add(self, verdicts, threshold):
+        confidence = verdicts["confidence"]
+        self.count += len(confidence)
+        self.above += np.count_nonzero(confidence >= threshold)
+        bins = np.clip((confidence * HISTOGRAM_BINS).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        self.histogram += np.bincount(bins, minlength=HISTOGRAM_BINS)
+        keys = np.ascontiguousarray(verdicts["source_ip"]).view(">u4").ravel()
+        confidence = confidence.astype(np.float64)
+        self.sources.append(reduce_sources(keys, np.ones(len(keys), dtype=np.int64), confidence, confidence))
+
+    def source_totals(self):
+        if not self.sources:
+            return None
+        self.sources = [merge_sources(self.sources)]
+        return self.sources[0]
+
+class Monitor:
+    """
+    Rolling per-second aggregates of the verdicts over the last window
+    seconds, redrawn as a compact summary every refresh seconds.
+    """
+
+    def __init__(self, window=MONITOR_WINDOW, refresh=MONITOR_REFRESH, threshold=MONITOR_THRESHOLD,
+                 top=MONITOR_TOP, top_by="max"):
+        self.window = window
+        self.refresh = refresh
+        self.threshold = threshold
+        self.top = top
+        self.top_by = top_by
+        self.seconds = deque()
+        self.total = 0
+        self.start = time.monotonic()
+        self.next_draw = self.start + refresh
+        self.clear = "\033[H\033[J" if sys.stdout.isatty() else ""
+
+    def add(self, verdicts):
+        second = int(time.monotonic())
+        if not self.seconds or self.seconds[-1].second != second:
+            self.seconds.append(Aggregate(second))
+        self.seconds[-1].add(verdicts, self.threshold)
+        self.total += len(verdicts)
+
+    def tick(self):
+        """Redraw the summary if it is due."""
+        now = time.monotonic()
+        if now >= self.next_draw:
+            self.next_draw = now + self.refresh
+            self.draw(now)
+
+    def draw(self, now):
+        # Only whole seconds are summarized; the one still running is left out
+        current = int(now)
+        while self.seconds and self.seconds[0].second < current - self.window:
+            self.seconds.popleft()
+        seconds = [aggregate for aggregate in self.seconds if aggregate.second < current]
+        count = sum(aggregate.count for aggregate in seconds)
+        above = sum(aggregate.above for aggregate in seconds)
+        histogram = sum((aggregate.histogram for aggregate in seconds), np.zeros(HISTOGRAM_BINS, dtype=np.int64))
+        span = max(1, min(self.window, current - int(self.start)))
+        last = seconds[-1].count if seconds and seconds[-1].second == current - 1 else 0
+
+        lines = [f"Verdicts over the last {span} s: {count:,} ({count / span:,.0f}/s, "
+                 f"{last:,} in the last second), {self.total:,} in all",
+                 f"Confidence >= {self.threshold}: {above:,} ({above / max(count, 1):.2%})",
+                 "Confidence:"]
+        peak = max(histogram.max(), 1)
+        for i, bin_count in enumerate(histogram):
+            bar = "#" * int(round(HISTOGRAM_WIDTH * bin_count / peak))
+            lines.append(f"  {i / HISTOGRAM_BINS:.1f}-{(i + 1) / HISTOGRAM_BINS:.1f} {bar:<{HISTOGRAM_WIDTH}} {bin_count:,}")
+
+        parts = [totals for totals in (aggregate.source_totals() for aggregate in seconds) if totals is not None]
+        lines.append(f"Top {self.top} sources by {self.top_by} confidence:")
+        if parts:
+            keys, counts, sums, maxes = merge_sources(parts)
+            means = sums / counts
+            ranking = maxes if self.top_by == "max" else means
+            for i in np.argsort(-ranking, kind="stable")[:self.top]:
+                source = ip_bytes_to_str(int(keys[i]).to_bytes(4, "big"))
+                lines.append(f"  {source:<15}  max {maxes[i]:.4f}  mean {means[i]:.4f}  verdicts {int(counts[i]):,}")
+        print(self.clear + "\n".join(lines), flush=True)
+
 def connect_to_pipe():
     """Connect to the named pipe."""
     try:
@@ -41,8 +177,8 @@ def connect_to_pipe():
         print(f"Error connecting to pipe: {e}")
         return None
 
-def read_ip_pairs():
-    """Read and display low-confidence IP pairs from the pipe."""
+def read_ip_pairs(timestamp_log=None, quiet=False, monitor=None):
+    """Read and display low-confidence IP pairs from the pipe, or summarize them with a monitor."""
     records_read = 0
     detections_count = 0
     last_detection_time = time.time()
@@ -54,43 +190,66 @@ def read_ip_pairs():
             continue
 
         try:
+            if monitor is not None:
+                try:
+                    fcntl.fcntl(pipe_fd, fcntl.F_SETPIPE_SZ, PIPE_BUFFER_SIZE)
+                except (AttributeError, OSError):
+                    pass  # not Linux, or above /proc/sys/fs/pipe-max-size: keep the default
+            pending = b""  # the start of a record split across reads
             while True:
                 try:
-                    # Try to read exactly one record
-                    data = os.read(pipe_fd, RECORD_SIZE)
+                    if monitor is not None:
+                        monitor.tick()
+                    data = os.read(pipe_fd, RECORD_SIZE * READ_RECORDS)
                     
                     if not data:
                         # No data available, wait a bit
-                        time.sleep(READ_TIMEOUT)
+                        time.sleep(MONITOR_POLL if monitor is not None else READ_TIMEOUT)
                         
                         # Print periodic status if we've seen detections
-                        if detections_count > 0 and time.time() - last_detection_time > 5:
+                        if monitor is None and detections_count > 0 and time.time() - last_detection_time > 5:
                             print(f"\rProcessed {records_read} packets, found {detections_count} low-confidence packets", 
                                   end="", flush=True)
                         continue
                     
-                    if len(data) != RECORD_SIZE:
-                        print(f"Warning: Incomplete record received ({len(data)} bytes)")
-                        continue
+                    received_time = time.monotonic()
+                    data = pending + data
+                    complete = len(data) - len(data) % RECORD_SIZE
+                    pending = data[complete:]
 
-                    # Unpack the binary data
-                    src_ip, dst_ip, confidence = struct.unpack("=4s4sf", data)
-                    
-                    # Convert to readable format
-                    src_ip_str = ip_bytes_to_str(src_ip)
-                    dst_ip_str = ip_bytes_to_str(dst_ip)
-                    
-                    # Print the record with confidence score
-                    current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-                    print(f"[{current_time}] {src_ip_str},{dst_ip_str},{confidence:.4f}")
-                    
-                    records_read += 1
-                    detections_count += 1
+                    verdicts = np.frombuffer(data, dtype=VERDICT_DTYPE, count=complete // RECORD_SIZE)
+                    records_read += len(verdicts)
+                    detections_count += len(verdicts)
+                    if timestamp_log:
+                        entries = np.empty(len(verdicts), dtype=RECEIVE_LOG_DTYPE)
+                        for name in VERDICT_DTYPE.names:
+                            entries[name] = verdicts[name]
+                        entries["time"] = received_time
+                        timestamp_log.write(entries.tobytes())
+                        timestamp_log.flush()
                     last_detection_time = time.time()
 
+                    if monitor is not None:
+                        monitor.add(verdicts)
+                        continue
+                    if quiet:
+                        continue
+                    for src_ip, dst_ip, confidence in verdicts.tolist():
+                        # Convert to readable format
+                        src_ip_str = ip_bytes_to_str(src_ip)
+                        dst_ip_str = ip_bytes_to_str(dst_ip)
+
+                        # Print the record with confidence score
+                        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+                        print(f"[{current_time}] {src_ip_str},{dst_ip_str},{confidence:.4f}")
+
                 except BlockingIOError:
-                    # No data available, wait a bit
-                    time.sleep(READ_TIMEOUT)
+                    if monitor is not None:
+                        # Let verdicts pile up in the pipe and drain them in bulk
+                        time.sleep(MONITOR_POLL)
+                    else:
+                        # No data available, wait until there is, so verdicts are not held back
+                        select.select([pipe_fd], [], [], READ_TIMEOUT)
                 except OSError as e:
                     if e.errno in (errno.EINTR, errno.EAGAIN):
                         time.sleep(READ_TIMEOUT)
@@ -113,22 +272,48 @@ def read_ip_pairs():
                 pass
 
 def main():
+    global PIPE_NAME
+    parser = argparse.ArgumentParser(description="Print the verdicts the analyzer writes to its output pipe.")
+    parser.add_argument("--pipe", default=PIPE_NAME, help=f"FIFO to read verdicts from (default: {PIPE_NAME})")
+    parser.add_argument("--quiet", action="store_true", help="Count verdicts without printing each one")
+    parser.add_argument("--timestamp-log",
+                        help="Append every verdict and its monotonic receive time to this file")
+    parser.add_argument("--monitor", action="store_true",
+                        help="Instead of printing each verdict, redraw a summary of the recent ones")
+    parser.add_argument("--window", type=int, default=MONITOR_WINDOW,
+                        help=f"Seconds of verdicts the --monitor summary covers (default: {MONITOR_WINDOW})")
+    parser.add_argument("--refresh", type=float, default=MONITOR_REFRESH,
+                        help=f"Seconds between --monitor redraws (default: {MONITOR_REFRESH})")
+    parser.add_argument("--threshold", type=float, default=MONITOR_THRESHOLD,
+                        help=f"Confidence --monitor counts verdicts at or above (default: {MONITOR_THRESHOLD})")
+    parser.add_argument("--top", type=int, default=MONITOR_TOP,
+                        help=f"Sources --monitor lists (default: {MONITOR_TOP})")
+    parser.add_argument("--top-by", choices=["max", "mean"], default="max",
+                        help="Rank --monitor sources by their highest or their mean confidence (default: max)")
+    args = parser.parse_args()
+
+    PIPE_NAME = args.pipe
+    monitor = Monitor(args.window, args.refresh, args.threshold, args.top, args.top_by) if args.monitor else None
+
     # Register signal handler
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    timestamp_log = open(args.timestamp_log, "ab") if args.timestamp_log else None
 
     print("Starting low-confidence packet monitor...")
-    print("Monitoring for packets with confidence < 0.95")
-    print("Format: [timestamp] source_ip,destination_ip,confidence")
-    print("-" * 70)
+    if monitor is None:
+        print("Monitoring for packets with confidence < 0.95")
+        print("Format: [timestamp] source_ip,destination_ip,confidence")
+        print("-" * 70)
     
     try:
-        read_ip_pairs()
+        read_ip_pairs(timestamp_log, args.quiet, monitor)
     except KeyboardInterrupt:
         print("\nExiting...")
     finally:
+        if timestamp_log:
+            timestamp_log.close()
         print("\nShutting down...")
-        if 'detections_count' in locals():
-            print(f"Total low-confidence packets detected: {detections_count}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
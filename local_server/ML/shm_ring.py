@@ -0,0 +1,300 @@
+import os
+import mmap
+import time
+import ctypes
+import platform
+import numpy as np
+from packet_ring import COMPACT_DTYPE, dtype_for_size
+
+# Must match shm_ring.h in forwarder/
+RING_PATH = "/shared/packet_ring"
+RING_MAGIC = 0x4E535242  # "NSRB"
+RING_VERSION = 1
+HEADER_SIZE = 4096
+DEFAULT_SLOTS = 4096
+
+# Offsets of the header words, in 4-byte units
+MAGIC, VERSION, SLOT_SIZE, SLOT_COUNT = 0, 1, 2, 3
+HEAD = 64 // 4
+TAIL = 128 // 4
+DROPPED = 192 // 4
+WAITING = 256 // 4
+WAKE_AT = 260 // 4
+
+FUTEX_WAIT = 0
+FUTEX_WAKE = 1
+SYS_FUTEX = {"x86_64": 202, "aarch64": 98, "armv7l": 240, "armv6l": 240}.get(platform.machine())
+POLL_INTERVAL = 0.001  # without futex, how often wait() looks for new records
+
+ATOMIC_ACQUIRE = 2
+ATOMIC_RELEASE = 3
+# Plain loads and stores are already acquire and release on these
+STRONGLY_ORDERED = {"x86_64", "i386", "i686"}
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+def _load_futex():
+    if SYS_FUTEX is None:
+        return None
+    try:
+        syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):
+        return None
+    syscall.restype = ctypes.c_long
+    return syscall
+
+
+_syscall = _load_futex()
+
+
+def _load_atomics():
+    """__atomic_load_4 and __atomic_store_4 from libatomic, or (None, None) if it is not installed."""
+    try:
+        atomic = ctypes.CDLL("libatomic.so.1")
+        load, store = atomic.__atomic_load_4, atomic.__atomic_store_4
+    except (OSError, AttributeError):
+        return None, None
+    load.restype = ctypes.c_uint32
+    load.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    store.restype = None
+    store.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_int]
+    return load, store
+
+
+_atomic_load, _atomic_store = _load_atomics()
+
+
+def load_acquire(counter):
+    """Read a ctypes.c_uint32 in the mapping so that no later read moves before it."""
+    if _atomic_load is None:
+        return counter.value
+    return _atomic_load(ctypes.addressof(counter), ATOMIC_ACQUIRE)
+
+
+def store_release(counter, value):
+    """Write a ctypes.c_uint32 in the mapping so that no earlier read or write moves after it."""
+    if _atomic_store is None:
+        counter.value = value
+    else:
+        _atomic_store(ctypes.addressof(counter), value, ATOMIC_RELEASE)
+
+
+def futex_wait(address, expected, timeout):
+    """Sleep until woken or timeout seconds pass, unless the word at address is no longer expected."""
+    seconds = int(timeout)
+    timespec = _Timespec(seconds, int((timeout - seconds) * 1e9))
+    _syscall(ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_int(FUTEX_WAIT),
+             ctypes.c_uint32(expected), ctypes.byref(timespec), None, ctypes.c_int(0))
+
+
+def futex_wake(address):
+    _syscall(ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_int(FUTEX_WAKE),
+             ctypes.c_int(2 ** 31 - 1), None, None, ctypes.c_int(0))
+
+
+class SharedPacketRing:
+    """
+    Consumer end of the forwarder's shared-memory packet ring.
+
+    The ring is a file of fixed-size slots mapped by both processes; the
+    forwarder advances head as it copies packets in, and release() advances
+    tail to hand slots back. Records are handed out as NumPy views over the
+    mapping, with the same take()/release() interface as PacketRing. Only a
+    batch that wraps around the end of the ring is copied.
+
+    wait() sleeps on the head counter as a futex until the forwarder pushes
+    more records. Where the futex syscall is not available it polls.
+
+    Like shm_ring.h, head is loaded with acquire and tail stored with release
+    ordering, through libatomic, so that on weakly ordered CPUs such as ARM a
+    slot is never read before the forwarder's copy into it is visible, nor
+    handed back before it has been read. Without libatomic that only holds
+    on x86, so elsewhere the ring is not opened.
+    """
+
+    def __init__(self, path=RING_PATH):
+        self.path = path
+        self.dtype = None
+        self._file = None
+        self._map = None
+        self._inode = None
+        self._taken = 0  # records handed out, ahead of tail
+        self._reported_unordered = False
+
+    def is_open(self):
+        return self._map is not None
+
+    def open(self):
+        """Attach to the ring at path. Returns False if there is no valid ring there."""
+        if _atomic_load is None and platform.machine() not in STRONGLY_ORDERED:
+            if not self._reported_unordered and os.path.exists(self.path):
+                print(f"Not reading {self.path}: the shared-memory ring needs libatomic on {platform.machine()}")
+                self._reported_unordered = True
+            return False
+        try:
+            self._file = open(self.path, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error opening {self.path}: {e}")
+            self.close()
+            return False
+
+        self._header = memoryview(self._map)[:HEADER_SIZE].cast("I")
+        header = self._header
+        # The slot size tells which packet record format the forwarder writes
+        self.dtype = dtype_for_size(header[SLOT_SIZE])
+        if (len(self._map) < HEADER_SIZE or header[MAGIC] != RING_MAGIC or header[VERSION] != RING_VERSION
+                or self.dtype is None):
+            print(f"{self.path} is not a version {RING_VERSION} ring of packet records")
+            self.close()
+            return False
+
+        self.slot_count = header[SLOT_COUNT]
+        self._records = np.frombuffer(self._map, dtype=self.dtype, count=self.slot_count, offset=HEADER_SIZE)
+        self._head = ctypes.c_uint32.from_buffer(self._map, HEAD * 4)
+        self._tail = ctypes.c_uint32.from_buffer(self._map, TAIL * 4)
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        # Anything published before we attached is fair game
+        self._taken = header[TAIL]
+        return True
+
+    def __len__(self):
+        return (self._header[HEAD] - self._taken) & 0xFFFFFFFF
+
+    @property
+    def dropped(self):
+        """Records the forwarder dropped because the ring was full."""
+        return self._header[DROPPED]
+
+    def take(self, max_records=None):
+        """Hand out up to max_records records, oldest first."""
+        # Acquire: the slots up to head are read only after head itself
+        count = (load_acquire(self._head) - self._taken) & 0xFFFFFFFF
+        if max_records is not None:
+            count = min(count, max_records)
+        start = self._taken % self.slot_count
+        self._taken = (self._taken + count) & 0xFFFFFFFF
+        end = start + count
+        if end <= self.slot_count:
+            return self._records[start:end]
+        return np.concatenate((self._records[start:], self._records[:end - self.slot_count]))
+
+    def release(self, records):
+        """Give back records obtained from take(), oldest first, so the forwarder can reuse the slots."""
+        # Release: the records are read before the forwarder may overwrite them
+        store_release(self._tail, (self._header[TAIL] + len(records)) & 0xFFFFFFFF)
+
+    def wait(self, timeout, count=1):
+        """
+        Block up to timeout seconds until count records are ready to take.
+        Returns True if they are.
+
+        The forwarder wakes a sleeping consumer only once the count is
+        reached, so waiting for a whole batch costs one wakeup, not one per
+        packet.
+        """
+        count = min(count, self.slot_count)
+        if len(self) >= count or timeout <= 0:
+            return len(self) >= count
+        deadline = time.monotonic() + timeout
+        if _syscall is None:
+            while len(self) < count and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+            return len(self) >= count
+
+        header = self._header
+        header[WAKE_AT] = (self._taken + count) & 0xFFFFFFFF
+        while True:
+            # The producer clears waiting when it wakes us, so set it again for every sleep
+            header[WAITING] = 1
+            head = header[HEAD]
+            remaining = deadline - time.monotonic()
+            if (head - self._taken) & 0xFFFFFFFF >= count or remaining <= 0:
+                break
+            # The kernel only sleeps if head is still what we saw, so a push in between is never missed
+            futex_wait(ctypes.addressof(self._head), head, remaining)
+        header[WAITING] = 0
+        return len(self) >= count
+
+    def replaced(self):
+        """True if the path no longer points at the ring we have mapped."""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def close(self):
+        self._header = self._records = self._head = self._tail = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # records taken are still in use; the mapping goes with the last of them
+        if self._file is not None:
+            self._file.close()
+        self._map = self._file = None
+
+
+class SharedRingWriter:
+    """
+    Producer end of a ring, the Python counterpart of shm_ring.h.
+
+    For benchmarks and tests that stand in for the forwarder. Single
+    producer only.
+    """
+
+    def __init__(self, path=RING_PATH, slot_count=DEFAULT_SLOTS, dtype=COMPACT_DTYPE):
+        if slot_count & (slot_count - 1):
+            raise ValueError("slot_count must be a power of two")
+        self.path = path
+        self.slot_count = slot_count
+        self.record_size = dtype.itemsize
+        size = HEADER_SIZE + self.record_size * slot_count
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w+b") as ring_file:
+            ring_file.truncate(size)
+            self._map = mmap.mmap(ring_file.fileno(), size)
+        self._header = memoryview(self._map)[:HEADER_SIZE].cast("I")
+        # Raw bytes: copying structured records field by field is several times slower
+        self._slots = np.frombuffer(self._map, dtype=np.uint8, offset=HEADER_SIZE)
+        self._head = ctypes.c_uint32.from_buffer(self._map, HEAD * 4)
+        self._tail = ctypes.c_uint32.from_buffer(self._map, TAIL * 4)
+        self._header[VERSION] = RING_VERSION
+        self._header[SLOT_SIZE] = self.record_size
+        self._header[SLOT_COUNT] = slot_count
+        self._header[MAGIC] = RING_MAGIC
+        os.replace(tmp_path, path)
+
+    def push(self, records):
+        """Copy as many records as fit into the ring and count the rest as dropped. Returns the number pushed."""
+        if records.dtype.itemsize != self.record_size:
+            raise ValueError(f"records of {records.dtype.itemsize} bytes do not fit slots of {self.record_size}")
+        header = self._header
+        head = header[HEAD]
+        free = self.slot_count - ((head - load_acquire(self._tail)) & 0xFFFFFFFF)
+        count = min(len(records), free)
+        data = np.ascontiguousarray(records[:count]).view(np.uint8)
+        start = head % self.slot_count * self.record_size
+        first = min(len(data), len(self._slots) - start)
+        self._slots[start:start + first] = data[:first]
+        if first < len(data):
+            self._slots[:len(data) - first] = data[first:]
+        store_release(self._head, (head + count) & 0xFFFFFFFF)
+        if count < len(records):
+            header[DROPPED] = (header[DROPPED] + len(records) - count) & 0xFFFFFFFF
+
+        # Unlike shm_ring.h there is no fence or atomic exchange here, so a
+        # wakeup can come as late as the consumer's wait() timeout
+        wanted = (header[WAKE_AT] - head - count) & 0xFFFFFFFF
+        if header[WAITING] and (wanted == 0 or wanted >= 2 ** 31) and _syscall is not None:
+            header[WAITING] = 0
+            futex_wake(ctypes.addressof(self._head))
+        return count
+
+    def close(self):
+        self._header = self._slots = self._head = self._tail = None
+        self._map.close()
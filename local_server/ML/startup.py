@@ -0,0 +1,57 @@
+import time
+import threading
+
+# Documented in local_server/README.md: from the analyzer starting to its
+# first verdict, with the forwarder already sending packets
+FIRST_VERDICT_TARGET = {"numpy": 1.0, "int8": 8.0, "keras": 8.0}
+FIRST_VERDICT = "first verdict"
+
+
+class StartupProfile:
+    """
+    When each step of the analyzer's startup was reached, for --startup-profile.
+
+    Times are from started, taken before the analyzer's own imports. Each
+    step is printed the first time it is marked; later marks are ignored.
+    """
+
+    def __init__(self, started, target=None):
+        self.started = started
+        self.target = target
+        self.steps = {}
+
+    def mark(self, step):
+        if step in self.steps:
+            return
+        elapsed = time.perf_counter() - self.started
+        self.steps[step] = elapsed
+        print(f"\n[startup] {elapsed * 1000:8.1f} ms  {step}")
+        if step == FIRST_VERDICT and self.target is not None:
+            verdict = "within" if elapsed <= self.target else "over"
+            print(f"[startup] first verdict after {elapsed:.2f} s, {verdict} the {self.target:.1f} s target")
+
+
+class BackgroundLoad(threading.Thread):
+    """Run load() in a daemon thread; result() waits for it and re-raises anything it raised."""
+
+    def __init__(self, load, name="model loader"):
+        super().__init__(name=name, daemon=True)
+        self._load = load
+        self._result = None
+        self._error = None
+        self.start()
+
+    def run(self):
+        try:
+            self._result = self._load()
+        except BaseException as e:
+            self._error = e
+
+    def done(self):
+        return not self.is_alive()
+
+    def result(self):
+        self.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
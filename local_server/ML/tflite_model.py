@@ -0,0 +1,94 @@
+import os
+import time
+import numpy as np
+from latency import LatencyTracker, DEFAULT_BUCKETS
+
+TFLITE_MODEL_SUFFIX = ".tflite"
+
+
+def load_interpreter_class():
+    """The TFLite Interpreter from the lightest package installed: LiteRT, tflite-runtime, then TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteEngine:
+    """
+    Run a TFLite model with float32 input and output, such as the int8
+    variant written by quantize_model.py.
+
+    One interpreter is allocated per bucket size and every batch is padded
+    up to its bucket, as in InferenceEngine, so tensors are never resized
+    on live traffic. Exposes the same predict/warm_up/latency interface.
+    """
+
+    def __init__(self, model_content, buckets=DEFAULT_BUCKETS):
+        Interpreter = load_interpreter_class()
+        self.buckets = tuple(sorted(buckets))
+        self.latency = LatencyTracker(self.buckets)
+        self._interpreters = {}
+        self._inputs = {}
+        for size in self.buckets:
+            interpreter = Interpreter(model_content=model_content)
+            input_details = interpreter.get_input_details()[0]
+            if input_details["dtype"] != np.float32:
+                raise ValueError(f"Expected a float32 model input, got {np.dtype(input_details['dtype']).name}")
+            self.n_features = int(input_details["shape"][-1])
+            interpreter.resize_tensor_input(input_details["index"], [size, self.n_features])
+            interpreter.allocate_tensors()
+            output_index = interpreter.get_output_details()[0]["index"]
+            self._interpreters[size] = (interpreter, input_details["index"], output_index)
+            self._inputs[size] = np.zeros((size, self.n_features), dtype=np.float32)
+
+    def _invoke(self, size, features):
+        interpreter, input_index, output_index = self._interpreters[size]
+        interpreter.set_tensor(input_index, features)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)
+
+    def warm_up(self, rounds=3):
+        start = time.perf_counter()
+        for size in self.buckets:
+            for _ in range(rounds):
+                self._invoke(size, self._inputs[size])
+        return time.perf_counter() - start
+
+    def _run(self, features):
+        count = len(features)
+        size = self.latency.bucket_for(count)
+        padded = self._inputs[size]
+        padded[:count] = features
+        padded[count:] = 0
+
+        start = time.perf_counter()
+        output = self._invoke(size, padded)
+        self.latency.record(size, time.perf_counter() - start)
+
+        return output[:count].reshape(-1)
+
+    def predict(self, features):
+        """Confidence per row of features, as a 1-D float32 array."""
+        largest = self.buckets[-1]
+        if len(features) <= largest:
+            return self._run(features)
+        return np.concatenate([
+            self._run(features[start:start + largest])
+            for start in range(0, len(features), largest)
+        ])
+
+
+def tflite_model_path_for(model_path):
+    """Path of the quantized model that belongs next to a Keras model file."""
+    return os.path.splitext(model_path)[0] + TFLITE_MODEL_SUFFIX
+
+
+def load_tflite_model(path, buckets=DEFAULT_BUCKETS):
+    with open(path, "rb") as model_file:
+        return TFLiteEngine(model_file.read(), buckets)
@@ -0,0 +1,117 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# About 250 bytes per entry, so the default stays around 4 MB
+DEFAULT_CACHE_SIZE = 16384
+DEFAULT_CACHE_TTL = 30.0
+SIZE_BUCKET = 64  # bytes of packet size that share a verdict
+
+KEY_DTYPE = np.dtype([
+    ("source_ip", "u1", (4,)),
+    ("dest_ip", "u1", (4,)),
+    ("protocol", "u1"),
+    ("size_bucket", "=u2"),
+])
+
+
+class VerdictCache:
+    """
+    Recent verdicts per (src_ip, dst_ip, protocol, size bucket).
+
+    Entries expire ttl seconds after they were scored, and the least
+    recently used entry is evicted once capacity is reached. Lookups and
+    stores may come from different threads.
+
+    The features of a packet depend only on its size and protocol when a
+    fitted FeatureTransform is used, so a hit returns the verdict the model
+    would give, up to the size bucket. Without one, features are scaled per
+    batch and a cached verdict is only an approximation, which is why
+    always_cli.py only turns the cache on by default with a transform.
+    """
+
+    def __init__(self, capacity=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, size_bucket=SIZE_BUCKET):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.size_bucket = size_bucket
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._entries = OrderedDict()  # key -> (confidence, expiry time)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self, packets):
+        """One hashable key per packet."""
+        keys = np.empty(len(packets), dtype=KEY_DTYPE)
+        keys["source_ip"] = packets["source_ip"]
+        keys["dest_ip"] = packets["dest_ip"]
+        keys["protocol"] = packets["protocol"]
+        keys["size_bucket"] = packets["packet_size"] // self.size_bucket
+        return keys.view(f"V{KEY_DTYPE.itemsize}").tolist()
+
+    def lookup(self, packets, now=None):
+        """
+        Cached confidence per packet.
+
+        Returns the confidences, with NaN where there was no fresh entry, the
+        indices of those misses and the keys to pass to store().
+        """
+        now = time.monotonic() if now is None else now
+        keys = self.keys(packets)
+        confidences = np.full(len(keys), np.nan, dtype=np.float32)
+        missing = []
+        entries = self._entries
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = entries.get(key)
+                if entry is not None:
+                    if entry[1] > now:
+                        entries.move_to_end(key)
+                        confidences[i] = entry[0]
+                        continue
+                    del entries[key]
+                    self.expired += 1
+                missing.append(i)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return confidences, np.array(missing, dtype=np.intp), keys
+
+    def store(self, keys, indices, confidences, now=None):
+        """Remember the confidences scored for keys[indices]."""
+        expiry = (time.monotonic() if now is None else now) + self.ttl
+        entries = self._entries
+        with self._lock:
+            for i, confidence in zip(indices.tolist(), confidences.tolist()):
+                key = keys[i]
+                entries[key] = (confidence, expiry)
+                entries.move_to_end(key)
+            while len(entries) > self.capacity:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Forget every verdict, e.g. when the model that scored them is replaced."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    def print_report(self, label="Verdict cache"):
+        stats = self.stats()
+        print(f"\n{label}: {stats['entries']}/{self.capacity} entries, {stats['hits']} hits, "
+              f"{stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+              f"{stats['evictions']} evicted, {stats['expired']} expired")
@@ -0,0 +1,231 @@
+import os
+import time
+import signal
+import multiprocessing
+from collections import deque
+import numpy as np
+from packet_ring import HEADER_DTYPE
+
+# Batches a worker may hold before the dispatcher waits for it. At the
+# default batch size this keeps both pipes of a worker below the kernel pipe
+# buffer, so neither side can block the other in a send.
+MAX_IN_FLIGHT = 16
+RESTART_DELAY = 1.0
+SHUTDOWN_TIMEOUT = 5.0
+LATENCY_WINDOW = 1000
+# One BLAS thread per worker, the workers are the parallelism
+WORKER_ENVIRONMENT = {"OMP_NUM_THREADS": "1", "OPENBLAS_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+
+
+def shard_for(packets, count):
+    """
+    Worker index per packet, from a hash of its address pair.
+
+    The hash is symmetric, so both directions of a flow go to the same worker.
+    """
+    src = packets["source_ip"].view("<u4").reshape(-1)
+    dst = packets["dest_ip"].view("<u4").reshape(-1)
+    mixed = (src ^ dst).astype(np.uint64) * np.uint64(0x9E3779B1)
+    return ((mixed >> np.uint64(16)) % np.uint64(count)).astype(np.intp)
+
+
+def worker_main(index, requests, replies, options):
+    """Score header batches from requests and send the packed verdicts back."""
+    # The supervisor owns shutdown; a Ctrl-C reaches the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from always_cli import load_engine, load_transform, load_cache, score_packets, pack_verdicts, LATENCY_REPORT_INTERVAL
+    from featurizer import Featurizer
+    from feature_transform import transform_path_for
+
+    engine = load_engine(options)
+    transform = load_transform(options.transform or transform_path_for(options.model))
+    featurizer = Featurizer(options.max_batch, transform=transform)
+    # Flows are sharded by address pair, so each worker caches its own flows
+    cache = load_cache(options, transform)
+    engine.warm_up()
+    replies.send_bytes(b"")  # ready
+    last_report_time = time.time()
+
+    while True:
+        try:
+            data = requests.recv_bytes()
+        except EOFError:
+            break
+        if not data:
+            break
+        packets = np.frombuffer(data, dtype=HEADER_DTYPE)
+        replies.send_bytes(pack_verdicts(packets, score_packets(engine, featurizer, packets, cache)))
+
+        if cache is not None and time.time() - last_report_time > LATENCY_REPORT_INTERVAL:
+            cache.print_report(f"Worker {index} verdict cache")
+            last_report_time = time.time()
+
+
+class Worker:
+    """One inference process and the batches it has not answered yet."""
+
+    def __init__(self, index, context, options):
+        self.index = index
+        self.in_flight = deque()  # (records, oldest arrival) per batch sent
+        self.records = 0
+        self.restarts = 0
+        self.ready = False
+        self._context = context
+        self._options = options
+        self.process = None
+
+    def start(self):
+        # Pipe(duplex=False) returns the receiving end first
+        requests_recv, requests_send = self._context.Pipe(duplex=False)
+        replies_recv, replies_send = self._context.Pipe(duplex=False)
+        self.process = self._context.Process(
+            target=worker_main, name=f"inference-{self.index}",
+            args=(self.index, requests_recv, replies_send, self._options), daemon=True,
+        )
+        self.process.start()
+        # Keep only our ends, so a dead worker shows up as EOF
+        requests_recv.close()
+        replies_send.close()
+        self.requests = requests_send
+        self.replies = replies_recv
+        self.ready = False
+        self.started_at = time.monotonic()
+
+    def close(self):
+        for connection in (self.requests, self.replies):
+            connection.close()
+
+
+class WorkerPool:
+    """
+    Inference worker processes fed with header batches sharded by flow.
+
+    Each worker loads its own model. dispatch() splits a batch by
+    shard_for() and sends every worker its part; verdicts come back through
+    receive() and are passed to on_verdicts as packed bytes, in order per
+    worker. A worker that dies is restarted after RESTART_DELAY, and the
+    records it still held are counted as lost.
+    """
+
+    def __init__(self, count, options, on_verdicts):
+        self.count = count
+        self.on_verdicts = on_verdicts
+        self.lost_records = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        for name, value in WORKER_ENVIRONMENT.items():
+            os.environ.setdefault(name, value)
+        # Workers load TensorFlow; never fork a process that may have it loaded
+        context = multiprocessing.get_context("spawn")
+        self.workers = [Worker(i, context, options) for i in range(count)]
+
+    def start(self, timeout=None):
+        """Start every worker and wait until each has its model loaded."""
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            self._wait_ready(worker, timeout)
+
+    def _wait_ready(self, worker, timeout=None):
+        if worker.replies.poll(timeout):
+            try:
+                worker.replies.recv_bytes()
+                worker.ready = True
+            except EOFError:
+                pass
+        return worker.ready
+
+    def connections(self):
+        """(worker, reply connection) pairs to watch for readability."""
+        return [(worker, worker.replies) for worker in self.workers]
+
+    def in_flight(self):
+        """Batches sent to the workers and not answered yet."""
+        return sum(len(worker.in_flight) for worker in self.workers)
+
+    def dispatch(self, packets, oldest):
+        """Send each worker its share of packets. oldest is the batch's first arrival time."""
+        if self.count == 1:
+            shards = [packets]
+        else:
+            owners = shard_for(packets, self.count)
+            order = np.argsort(owners, kind="stable")
+            bounds = np.searchsorted(owners[order], np.arange(self.count + 1))
+            shards = [packets[order[bounds[i]:bounds[i + 1]]] for i in range(self.count)]
+
+        for worker, shard in zip(self.workers, shards):
+            if not len(shard):
+                continue
+            while len(worker.in_flight) >= MAX_IN_FLIGHT:
+                if not self.receive(worker, timeout=RESTART_DELAY):
+                    break
+            if not worker.ready:
+                self.lost_records += len(shard)
+                continue
+            try:
+                worker.requests.send_bytes(np.ascontiguousarray(shard, dtype=HEADER_DTYPE).tobytes())
+            except (BrokenPipeError, OSError):
+                self._crashed(worker)
+                self.lost_records += len(shard)
+                continue
+            worker.in_flight.append((len(shard), oldest))
+
+    def receive(self, worker, timeout=0.0):
+        """Hand over every reply the worker has ready. Returns False if it is dead."""
+        while worker.replies.poll(timeout):
+            try:
+                data = worker.replies.recv_bytes()
+            except (EOFError, OSError):
+                self._crashed(worker)
+                return False
+            if not worker.ready:
+                worker.ready = True
+                continue
+            records, oldest = worker.in_flight.popleft()
+            worker.records += records
+            self._latencies.append(time.monotonic() - oldest)
+            self.on_verdicts(data)
+            timeout = 0.0
+        return True
+
+    def _crashed(self, worker):
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join()
+        lost = sum(records for records, _ in worker.in_flight)
+        print(f"\nInference worker {worker.index} exited with code {worker.process.exitcode}, "
+              f"lost {lost} records. Restarting...")
+        self.lost_records += lost
+        worker.in_flight.clear()
+        worker.close()
+
+        # Keep a worker that dies on start-up from spinning
+        time.sleep(max(0.0, worker.started_at + RESTART_DELAY - time.monotonic()))
+        worker.restarts += 1
+        worker.start()
+
+    def stop(self, timeout=SHUTDOWN_TIMEOUT):
+        """Ask every worker to finish, then terminate those that do not."""
+        for worker in self.workers:
+            try:
+                worker.requests.send_bytes(b"")
+            except (BrokenPipeError, OSError):
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+            worker.close()
+
+    def print_report(self):
+        print(f"\nInference workers: {self.count}")
+        for worker in self.workers:
+            print(f"  worker {worker.index}: {worker.records:>10} records  "
+                  f"in flight {len(worker.in_flight):>2} batches  restarts {worker.restarts}")
+        if self._latencies:
+            p50, p99 = np.percentile(self._latencies, [50, 99]) * 1000
+            print(f"  verdict latency p50 {p50:.1f} ms p99 {p99:.1f} ms")
+        if self.lost_records:
+            print(f"  lost {self.lost_records} records to worker restarts")
@@ -23,6 +23,9 @@
 #include <sys/inotify.h>
 #include <glib.h> 
 #include <arpa/inet.h>
+#include <endian.h>
+#include <netinet/udp.h>
+#include "shm_ring.h"
 
 // Constants & Macros
 #define SNAP_LEN 1518
@@ -31,17 +34,42 @@
 #define IP_STR_LEN 16
 #define BATCH_SIZE 32
 #define PIPE_PATH "/shared/packet_log_pipe"
+#define RING_PATH "/shared/packet_ring"
+#define RING_SLOTS 4096  // power of two
 #define BUFFER_SIZE 256
+#define STATS_DIR "/shared/stats"
+#define STATS_PATH STATS_DIR "/forwarder"  // read by local_server/ML/pipeline_stats.py
+#define STATS_INTERVAL_MS 1000
+
+// Packet record format, must match local_server/ML/packet_ring.py
+#define RECORD_MAGIC "NS"
+#define RECORD_VERSION 2
+#define RECORD_FLAG_PORTS 0x01    // src_port, dst_port and tcp_flags are filled in
+#define RECORD_FLAG_PAYLOAD 0x02  // PAYLOAD_SIZE bytes of the packet follow the header
+#define RECORD_FLAG_SEQUENCE 0x04 // sequence is filled in
+#define PAYLOAD_SIZE 1500
 
 // Struct Definitions
+// Multi-byte fields are little-endian whatever the host byte order
 typedef struct __attribute__((packed)) {
+    char magic[2];
+    uint8_t version;
+    uint8_t flags;
     uint32_t timestamp;
     uint8_t src_ip[4];
     uint8_t dst_ip[4];
     uint16_t packet_size;
     uint8_t protocol;
-    uint8_t data[1500];
-} binary_packet_t;
+    uint8_t tcp_flags;
+    uint16_t src_port;
+    uint16_t dst_port;
+    uint32_t sequence;  // counts every record meant for the analyzer, so it can tell what it missed
+} packet_record_t;
+
+typedef struct __attribute__((packed)) {
+    packet_record_t header;
+    uint8_t data[PAYLOAD_SIZE];
+} packet_record_payload_t;
 
 typedef struct {
     pcap_t *source_handle;
@@ -49,6 +77,18 @@ typedef struct {
     int mtu;
 } forwarder_args_t;
 
+// Monotonic counters, written to STATS_PATH by write_stats()
+typedef struct {
+    uint64_t captured;            // packets seen by the forwarding threads
+    uint64_t blocked;             // blacklisted
+    uint64_t sampled_out;         // not sent to the analyzer because of mlPercentage
+    uint64_t records;             // records meant for the analyzer, numbered by sequence
+    uint64_t dropped_pipe_full;   // the analyzer did not keep up with the FIFO
+    uint64_t dropped_pipe_error;  // no FIFO, or another write error
+    uint64_t dropped_ring_full;   // the analyzer did not keep up with the shared-memory ring
+    uint64_t queue_high_water;    // most records waiting for the analyzer
+} forwarder_stats_t;
+
 // Global Variables
 GHashTable *blacklist_set; 
 char *blacklist_file_path;
@@ -59,6 +99,12 @@ time_t last_settings_modified_time = 0;
 int mlPercentage = 100;
 FILE *log_file;
 int pipe_fd = -1;
+shm_ring_t packet_ring;
+int use_ring = 0;
+int include_payload = 0;  // PACKET_PAYLOAD=1 appends the packet bytes to every record
+size_t record_size = sizeof(packet_record_t);
+forwarder_stats_t stats;
+time_t started_at;
 
 // not sure if this is needed or used
 volatile int keep_running = 1;
@@ -79,6 +125,8 @@ void *forward_packets(void *args);
 int get_interface_mtu(const char *interface_name);
 void optimize_interface(const char *interface_name);
 void init_pipe_and_log();
+void write_stats();
+void *report_stats(void *arg);
 
 // Function to calculate checksum
 unsigned short checksum(void *b, int len) {
@@ -307,27 +355,69 @@ void *monitor_files(void *arg) {
 // Function to send packet data to a pipe
 void packet_to_pipe(const u_char *packet, int packet_len) {
     struct ip *ip_hdr = (struct ip *)(packet + 14);
-    binary_packet_t binary_packet;
-
-    // Zero out the structure
-    memset(&binary_packet, 0, sizeof(binary_packet_t));
-
-    // Fill structure with network byte order
-    binary_packet.timestamp = htonl((uint32_t)time(NULL));
-    memcpy(binary_packet.src_ip, &(ip_hdr->ip_src), 4);
-    memcpy(binary_packet.dst_ip, &(ip_hdr->ip_dst), 4);
-    binary_packet.packet_size = htons((uint16_t)packet_len);
-    binary_packet.protocol = ip_hdr->ip_p;
-
-    // Copy packet data (limited to 1500 bytes)
-    size_t data_len = packet_len > sizeof(binary_packet.data) ?
-                      sizeof(binary_packet.data) : packet_len;
-    memcpy(binary_packet.data, packet, data_len);
-
-    // Write to pipe with error handling
-    if (pipe_fd != -1) {
-        ssize_t written = write(pipe_fd, &binary_packet, sizeof(binary_packet_t));
-        if (written != sizeof(binary_packet_t)) {
+    packet_record_payload_t record;
+    packet_record_t *header = &record.header;
+
+    // Zero out the record
+    memset(&record, 0, record_size);
+
+    memcpy(header->magic, RECORD_MAGIC, 2);
+    header->version = RECORD_VERSION;
+    header->flags = RECORD_FLAG_SEQUENCE;
+    header->sequence = htole32((uint32_t)__atomic_fetch_add(&stats.records, 1, __ATOMIC_RELAXED));
+    header->timestamp = htole32((uint32_t)time(NULL));
+    memcpy(header->src_ip, &(ip_hdr->ip_src), 4);
+    memcpy(header->dst_ip, &(ip_hdr->ip_dst), 4);
+    header->packet_size = htole16((uint16_t)packet_len);
+    header->protocol = ip_hdr->ip_p;
+
+    // Ports and TCP flags, from the first fragment of a TCP or UDP packet only
+    size_t l4_offset = 14 + ip_hdr->ip_hl * 4;
+    const u_char *l4 = packet + l4_offset;
+    int first_fragment = (ntohs(ip_hdr->ip_off) & IP_OFFMASK) == 0;
+    if (first_fragment && ip_hdr->ip_p == IPPROTO_TCP && packet_len >= (int)(l4_offset + sizeof(struct tcphdr))) {
+        const struct tcphdr *tcp_hdr = (const struct tcphdr *)l4;
+        header->src_port = htole16(ntohs(tcp_hdr->source));
+        header->dst_port = htole16(ntohs(tcp_hdr->dest));
+        header->tcp_flags = tcp_hdr->th_flags;
+        header->flags |= RECORD_FLAG_PORTS;
+    } else if (first_fragment && ip_hdr->ip_p == IPPROTO_UDP && packet_len >= (int)(l4_offset + sizeof(struct udphdr))) {
+        const struct udphdr *udp_hdr = (const struct udphdr *)l4;
+        header->src_port = htole16(ntohs(udp_hdr->source));
+        header->dst_port = htole16(ntohs(udp_hdr->dest));
+        header->flags |= RECORD_FLAG_PORTS;
+    }
+
+    if (include_payload) {
+        // Copy packet data (limited to 1500 bytes)
+        size_t data_len = packet_len > PAYLOAD_SIZE ? PAYLOAD_SIZE : packet_len;
+        memcpy(record.data, packet, data_len);
+        header->flags |= RECORD_FLAG_PAYLOAD;
+    }
+
+    if (use_ring) {
+        // A full ring is counted, not logged per packet
+        if (shm_ring_push(&packet_ring, &record, record_size) == -1) {
+            __atomic_fetch_add(&stats.dropped_ring_full, 1, __ATOMIC_RELAXED);
+        }
+        return;
+    }
+
+    if (pipe_fd == -1) {
+        __atomic_fetch_add(&stats.dropped_pipe_error, 1, __ATOMIC_RELAXED);
+        return;
+    }
+
+    // Write to pipe with error handling; records are far below PIPE_BUF, so
+    // the two forwarding threads never interleave within a record
+    ssize_t written = write(pipe_fd, &record, record_size);
+    if (written != (ssize_t)record_size) {
+        int error = errno;
+        if (written == -1 && error == EAGAIN) {
+            // The analyzer is behind; counted, not logged per packet
+            __atomic_fetch_add(&stats.dropped_pipe_full, 1, __ATOMIC_RELAXED);
+        } else {
+            __atomic_fetch_add(&stats.dropped_pipe_error, 1, __ATOMIC_RELAXED);
             char timestamp[64];
             time_t now = time(NULL);
             struct tm *tm_info = localtime(&now);
@@ -336,12 +426,60 @@ void packet_to_pipe(const u_char *packet, int packet_len) {
             strftime(timestamp, sizeof(timestamp), "%Y-%m-%d %H:%M:%S", tm_info);
 
             // Log the error with the timestamp
-            printf(log_file, "[%s] Pipe write error: %s\n", timestamp, strerror(errno));
+            fprintf(log_file, "[%s] Pipe write error: %s\n", timestamp, strerror(error));
             fflush(log_file);
         }
     }
 }
 
+// Replace STATS_PATH with the current counters
+void write_stats() {
+    char tmp_path[PATH_MAX];
+    snprintf(tmp_path, sizeof(tmp_path), "%s.tmp", STATS_PATH);
+    FILE *file = fopen(tmp_path, "w");
+    if (!file) {
+        return;
+    }
+
+    struct timespec now;
+    clock_gettime(CLOCK_REALTIME, &now);
+    fprintf(file, "started=%ld\n", (long)started_at);
+    fprintf(file, "updated=%ld.%03ld\n", (long)now.tv_sec, now.tv_nsec / 1000000);
+    fprintf(file, "captured=%lu\n", (unsigned long)__atomic_load_n(&stats.captured, __ATOMIC_RELAXED));
+    fprintf(file, "blocked=%lu\n", (unsigned long)__atomic_load_n(&stats.blocked, __ATOMIC_RELAXED));
+    fprintf(file, "sampled_out=%lu\n", (unsigned long)__atomic_load_n(&stats.sampled_out, __ATOMIC_RELAXED));
+    fprintf(file, "records=%lu\n", (unsigned long)__atomic_load_n(&stats.records, __ATOMIC_RELAXED));
+    fprintf(file, "dropped_pipe_full=%lu\n", (unsigned long)__atomic_load_n(&stats.dropped_pipe_full, __ATOMIC_RELAXED));
+    fprintf(file, "dropped_pipe_error=%lu\n", (unsigned long)__atomic_load_n(&stats.dropped_pipe_error, __ATOMIC_RELAXED));
+    fprintf(file, "dropped_ring_full=%lu\n", (unsigned long)__atomic_load_n(&stats.dropped_ring_full, __ATOMIC_RELAXED));
+    fprintf(file, "queue_high_water=%lu\n", (unsigned long)stats.queue_high_water);
+    fclose(file);
+    rename(tmp_path, STATS_PATH);
+}
+
+// Write the counters every STATS_INTERVAL_MS, sampling how full the transport is
+void *report_stats(void *arg) {
+    while (keep_running) {
+        uint64_t waiting = 0;
+        if (use_ring) {
+            waiting = __atomic_load_n(&packet_ring.header->head, __ATOMIC_RELAXED) -
+                      __atomic_load_n(&packet_ring.header->tail, __ATOMIC_RELAXED);
+        } else if (pipe_fd != -1) {
+            int bytes = 0;
+            if (ioctl(pipe_fd, FIONREAD, &bytes) == 0) {
+                waiting = bytes / record_size;
+            }
+        }
+        if (waiting > stats.queue_high_water) {
+            stats.queue_high_water = waiting;
+        }
+        write_stats();
+        usleep(STATS_INTERVAL_MS * 1000);
+    }
+    write_stats();
+    return NULL;
+}
+
 // Forward packets between interfaces, filtering by blacklist
 void *forward_packets(void *args) {
     forwarder_args_t *forward_args = (forwarder_args_t *)args;
@@ -356,6 +494,7 @@ void *forward_packets(void *args) {
         if (packet == NULL) {
             continue;
         }
+        __atomic_fetch_add(&stats.captured, 1, __ATOMIC_RELAXED);
 
         // Parse IP header
         struct ip *ip_hdr = (struct ip *)(packet + 14);
@@ -370,6 +509,7 @@ void *forward_packets(void *args) {
             }
             fprintf(log_file, "Blocked packet: SRC=%s DST=%s\n", src_ip, dst_ip);
             fflush(log_file);
+            __atomic_fetch_add(&stats.blocked, 1, __ATOMIC_RELAXED);
             continue;
         }
 
@@ -377,6 +517,8 @@ void *forward_packets(void *args) {
         double random_value = (double)rand() / RAND_MAX * 100;
         if (random_value < mlPercentage) {
             packet_to_pipe(packet, header.len);
+        } else {
+            __atomic_fetch_add(&stats.sampled_out, 1, __ATOMIC_RELAXED);
         }
 
         // Forward the packet
@@ -439,6 +581,38 @@ void init_pipe_and_log() {
         exit(EXIT_FAILURE);
     }
 
+    started_at = time(NULL);
+    if (mkdir(STATS_DIR, 0755) == -1 && errno != EEXIST) {
+        fprintf(log_file, "Error creating stats directory '%s': %s\n", STATS_DIR, strerror(errno));
+        fflush(log_file);
+    }
+
+    const char *payload = getenv("PACKET_PAYLOAD");
+    if (payload != NULL && strcmp(payload, "1") == 0) {
+        include_payload = 1;
+        record_size = sizeof(packet_record_payload_t);
+    }
+    fprintf(log_file, "Packet records are version %d, %zu bytes%s\n", RECORD_VERSION, record_size,
+            include_payload ? " with payload" : "");
+
+    // PACKET_TRANSPORT=shm selects the shared-memory ring; the FIFO is the default and the fallback
+    const char *transport = getenv("PACKET_TRANSPORT");
+    if (transport != NULL && strcmp(transport, "shm") == 0) {
+        if (shm_ring_create(&packet_ring, RING_PATH, record_size, RING_SLOTS) == 0) {
+            use_ring = 1;
+            fprintf(log_file, "Writing packets to shared-memory ring '%s' (%d slots)\n", RING_PATH, RING_SLOTS);
+            fflush(log_file);
+            // Readers attach to whichever transport exists, so retire the FIFO
+            unlink(PIPE_PATH);
+            return;
+        }
+        fprintf(log_file, "Error creating shared-memory ring '%s': %s, falling back to '%s'\n",
+                RING_PATH, strerror(errno), PIPE_PATH);
+        fflush(log_file);
+    }
+    // Keep a stale ring from an earlier run from being mistaken for a live one
+    unlink(RING_PATH);
+
     // Create the named pipe and handle potential errors
     if (mkfifo(PIPE_PATH, 0666) == -1) {
         if (errno != EEXIST) {
@@ -542,22 +716,25 @@ int main(int argc, char *argv[]) {
     fflush(log_file);
 
     // Create threads for packet forwarding and blacklist monitoring
-    pthread_t thread1, thread2, monitor_thread;
+    pthread_t thread1, thread2, monitor_thread, stats_thread;
     forwarder_args_t forward1 = {handle1, handle2, mtu2};
     forwarder_args_t forward2 = {handle2, handle1, mtu1};
 
     pthread_create(&thread1, NULL, forward_packets, (void *)&forward1);
     pthread_create(&thread2, NULL, forward_packets, (void *)&forward2);
     pthread_create(&monitor_thread, NULL, monitor_files, NULL);
+    pthread_create(&stats_thread, NULL, report_stats, NULL);
 
     // Wait for threads to finish (if necessary)
     pthread_join(thread1, NULL);
     pthread_join(thread2, NULL);
     pthread_join(monitor_thread, NULL);
+    pthread_join(stats_thread, NULL);
 
     // Cleanup
     fclose(log_file);
     close(pipe_fd);
+    shm_ring_close(&packet_ring);
     pcap_close(handle1);
     pcap_close(handle2);
 
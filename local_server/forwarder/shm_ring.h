@@ -0,0 +1,129 @@
+// Shared-memory ring of fixed-size packet records, read by local_server/ML/shm_ring.py
+//
+// Layout of the mapped file (native byte order, each counter on its own cache line):
+//   0    magic, version, slot_size, slot_count
+//   64   head      records published by the producer (wraps at 2^32), the futex the consumer sleeps on
+//   128  tail      records released by the consumer (wraps at 2^32)
+//   192  dropped   records refused because the ring was full
+//   256  waiting   set by the consumer before it sleeps, cleared by whoever wakes it
+//   260  wake_at   head value the sleeping consumer wants to be woken at
+//   4096 slot_count slots of slot_size bytes
+#ifndef SHM_RING_H
+#define SHM_RING_H
+
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <limits.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <pthread.h>
+#include <sys/mman.h>
+#include <sys/syscall.h>
+#include <linux/futex.h>
+
+#define SHM_RING_MAGIC 0x4E535242u  // "NSRB"
+#define SHM_RING_VERSION 1
+#define SHM_RING_HEADER_SIZE 4096
+
+typedef struct {
+    uint32_t magic;
+    uint32_t version;
+    uint32_t slot_size;
+    uint32_t slot_count;
+    uint8_t pad0[48];
+    uint32_t head;
+    uint8_t pad1[60];
+    uint32_t tail;
+    uint8_t pad2[60];
+    uint32_t dropped;
+    uint8_t pad3[60];
+    uint32_t waiting;
+    uint32_t wake_at;
+} shm_ring_header_t;
+
+typedef struct {
+    shm_ring_header_t *header;
+    uint8_t *slots;
+    size_t map_size;
+    // Both forwarding threads produce; the lock keeps the ring single-producer
+    pthread_mutex_t lock;
+} shm_ring_t;
+
+// Create the ring file at path, replacing any old one. slot_count must be a power of two.
+static int shm_ring_create(shm_ring_t *ring, const char *path, uint32_t slot_size, uint32_t slot_count) {
+    char tmp_path[PATH_MAX];
+    snprintf(tmp_path, sizeof(tmp_path), "%s.tmp", path);
+
+    int fd = open(tmp_path, O_RDWR | O_CREAT | O_TRUNC, 0666);
+    if (fd == -1) {
+        return -1;
+    }
+    size_t map_size = SHM_RING_HEADER_SIZE + (size_t)slot_size * slot_count;
+    if (ftruncate(fd, map_size) == -1) {
+        close(fd);
+        unlink(tmp_path);
+        return -1;
+    }
+    void *map = mmap(NULL, map_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+    close(fd);
+    if (map == MAP_FAILED) {
+        unlink(tmp_path);
+        return -1;
+    }
+
+    ring->header = (shm_ring_header_t *)map;
+    ring->slots = (uint8_t *)map + SHM_RING_HEADER_SIZE;
+    ring->map_size = map_size;
+    pthread_mutex_init(&ring->lock, NULL);
+
+    ring->header->version = SHM_RING_VERSION;
+    ring->header->slot_size = slot_size;
+    ring->header->slot_count = slot_count;
+    __atomic_store_n(&ring->header->magic, SHM_RING_MAGIC, __ATOMIC_RELEASE);
+
+    // Readers only ever see a fully initialised ring
+    if (rename(tmp_path, path) == -1) {
+        munmap(map, map_size);
+        unlink(tmp_path);
+        return -1;
+    }
+    return 0;
+}
+
+// Copy one record into the ring. Returns 0, or -1 if the ring was full and the record was dropped.
+static int shm_ring_push(shm_ring_t *ring, const void *record, uint32_t size) {
+    shm_ring_header_t *header = ring->header;
+
+    pthread_mutex_lock(&ring->lock);
+    uint32_t head = header->head;
+    uint32_t tail = __atomic_load_n(&header->tail, __ATOMIC_ACQUIRE);
+    if (head - tail >= header->slot_count) {
+        pthread_mutex_unlock(&ring->lock);
+        __atomic_fetch_add(&header->dropped, 1, __ATOMIC_RELAXED);
+        return -1;
+    }
+    uint8_t *slot = ring->slots + (size_t)(head & (header->slot_count - 1)) * header->slot_size;
+    memcpy(slot, record, size < header->slot_size ? size : header->slot_size);
+    __atomic_store_n(&header->head, head + 1, __ATOMIC_RELEASE);
+    pthread_mutex_unlock(&ring->lock);
+
+    // Wake the consumer once per sleep, when it has the records it asked for.
+    // The fence orders the head store before the check.
+    __atomic_thread_fence(__ATOMIC_SEQ_CST);
+    if (__atomic_load_n(&header->waiting, __ATOMIC_RELAXED) &&
+        (int32_t)(head + 1 - __atomic_load_n(&header->wake_at, __ATOMIC_RELAXED)) >= 0 &&
+        __atomic_exchange_n(&header->waiting, 0, __ATOMIC_SEQ_CST)) {
+        syscall(SYS_futex, &header->head, FUTEX_WAKE, INT_MAX, NULL, NULL, 0);
+    }
+    return 0;
+}
+
+static void shm_ring_close(shm_ring_t *ring) {
+    if (ring->header) {
+        munmap(ring->header, ring->map_size);
+        ring->header = NULL;
+    }
+}
+
+#endif
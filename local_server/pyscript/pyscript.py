@@ -14,9 +14,25 @@ PIPE_NAME = "/shared/analysis_pipe"
 FORMAT = "=4s4sf"
 BLACKLIST_PATH = Path('/shared/blacklist.txt')
 SETTINGS_PATH = Path('/shared/settings.txt')
+# Read by local_server/ML/pipeline_stats.py
+STATS_DIR = "/shared/stats"
+STATS_PATH = os.path.join(STATS_DIR, "pyscript")
+STATS_INTERVAL = 1.0
 
 ml_confidence_threshold = 0.9
 
+# Monotonic counters of the verdict reader
+stats = {
+    "consumed": 0,          # verdicts read from the pipe
+    "partial": 0,           # incomplete verdicts left when the writer went away
+    "errors": 0,            # verdicts lost to an error while handling them
+    "below_threshold": 0,
+    "exempt": 0,
+    "posted": 0,
+    "post_failed": 0,
+}
+started_at = time.time()
+
 # Ensure the log directory exists
 log_dir = "/shared/service_manager_logs"
 os.makedirs(log_dir, exist_ok=True)
@@ -128,6 +144,23 @@ def pull_all(CENTRALTOKEN):
 def ip_bytes_to_string(ip_bytes):
     return '.'.join(str(b) for b in ip_bytes)
 
+def write_stats():
+    counters = {"started": f"{started_at:.3f}", "updated": f"{time.time():.3f}", **stats}
+    tmp_path = STATS_PATH + ".tmp"
+    try:
+        os.makedirs(STATS_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as file:
+            for key, value in counters.items():
+                file.write(f"{key}={value}\n")
+        os.replace(tmp_path, STATS_PATH)
+    except OSError as e:
+        logging.error(f"Failed to write {STATS_PATH}: {e}")
+
+def report_stats():
+    while True:
+        write_stats()
+        time.sleep(STATS_INTERVAL)
+
 def read_from_pipe():
     url = "https://netsparrow.viktorkirk.com/packet_capture/"
     headers = {
@@ -140,14 +173,22 @@ def read_from_pipe():
         logging.info("Waiting for pipe to be created...")
         time.sleep(1)
 
-    logging.info(f"Opening pipe: {PIPE_NAME}")
-    with open(PIPE_NAME, 'rb') as pipe:
+    while True:
+        # Opening blocks until the analyzer has the pipe open for writing
+        logging.info(f"Opening pipe: {PIPE_NAME}")
+        pipe = open(PIPE_NAME, 'rb')
         while True:
             try:
                 # Read one record worth of bytes
                 raw_data = pipe.read(struct.calcsize(FORMAT))
-                if not raw_data:
-                    continue
+                if len(raw_data) < struct.calcsize(FORMAT):
+                    # End of file: the writer went away, possibly mid-record
+                    if raw_data:
+                        stats["partial"] += 1
+                        logging.error(f"Incomplete verdict of {len(raw_data)} bytes at end of pipe")
+                    pipe.close()
+                    break
+                stats["consumed"] += 1
 
                 # Unpack the binary data
                 source_ip, dest_ip, confidence = struct.unpack(FORMAT, raw_data)
@@ -175,17 +216,20 @@ def read_from_pipe():
 
                     if any(current_ip in exempt_range for exempt_range in exempt_ranges):
                         #logging.info(f"Exempt IP: {data['ip']}")
+                        stats["exempt"] += 1
                         continue
 
                     else:
                         logging.info(f"Pushing to blacklist: {current_ip} with confidence: {confidence}")
                         try:
                             response = requests.post(url, headers=headers, json=data)
+                            stats["posted" if response.ok else "post_failed"] += 1
                             logging.info(f"Response status code: {response.status_code}")
                             # Optionally log response body if needed
                             logging.info(f"Response body: {response.json()}")
 
                         except requests.exceptions.RequestException as e:
+                            stats["post_failed"] += 1
                             logging.error(f"Failed to push to blacklist: {e}")
 
                         except ValueError as e:  # For JSON decode errors
@@ -193,17 +237,22 @@ def read_from_pipe():
 
                         finally:
                             logging.info("--x--" * 10)
+                else:
+                    stats["below_threshold"] += 1
 
-            except Exception as e:
-                logging.error(f"Error reading from pipe: {e}")
+            except Exception:
+                stats["errors"] += 1
+                logging.exception("Error handling a verdict from the pipe")
                 time.sleep(0.5)
 
 if __name__ == "__main__":
     pipe_thread = threading.Thread(target=read_from_pipe, daemon=True)
     communication_thread = threading.Thread(target=pull_all, args=(CENTRALTOKEN,), daemon=True)
+    stats_thread = threading.Thread(target=report_stats, daemon=True)
 
     pipe_thread.start()
     communication_thread.start()
+    stats_thread.start()
 
     try:
         while True: